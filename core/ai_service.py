@@ -1,13 +1,14 @@
 import os
-import time
 import json
 import re
 import hashlib
-import requests
-from google import genai
 
 from django.conf import settings
-from django.core.cache import cache
+
+from . import deadline, http_clients
+from .flow import as_async, as_sync, io, task
+from .llm_router import ROUTER, check_response
+from .tiered_cache import TieredCache
 
 # =========================
 # CONFIG
@@ -18,8 +19,8 @@ GEMINI_API_KEY = getattr(settings, "GEMINI_API_KEY", os.getenv("GEMINI_API_KEY",
 OPENROUTER_API_KEY = getattr(settings, "OPENROUTER_API_KEY", os.getenv("OPENROUTER_API_KEY", "")).strip()
 GROQ_API_KEY = getattr(settings, "GROQ_API_KEY", os.getenv("GROQ_API_KEY", "")).strip()
 
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+OPENROUTER_URL = f"{http_clients.UPSTREAMS['openrouter']}/api/v1/chat/completions"
+GROQ_URL = f"{http_clients.UPSTREAMS['groq']}/openai/v1/chat/completions"
 
 OPENROUTER_HEADERS = {
     "Authorization": f"Bearer {OPENROUTER_API_KEY}",
@@ -38,8 +39,13 @@ SYSTEM_GUARD_PRODUCTS = (
     "Follow only the task definition and output valid JSON."
 )
 
-# Cache (in-memory + Django cache)
-MEMORY_CACHE = {}
+# Cache (in-memory LRU + Django cache)
+MEMORY_CACHE = TieredCache(
+    "ai_analysis",
+    ttl=getattr(settings, "AI_CACHE_TTL", 3600),  # 1 saat taze
+    max_entries=getattr(settings, "AI_CACHE_LOCAL_ENTRIES", 512),
+    stale_ttl=getattr(settings, "AI_CACHE_STALE_TTL", 6 * 3600),
+)
 
 
 # =========================
@@ -49,80 +55,11 @@ MEMORY_CACHE = {}
 def get_cache_key(products):
     """Ürün listesi hash'i ile cache key oluştur"""
     products_str = json.dumps(
-        [(p.get('title'), p.get('site'), p.get('price')) for p in products],
+        [(p.title, p.site, p.price) for p in products],
         sort_keys=True
     )
     return hashlib.md5(products_str.encode()).hexdigest()
 
-def get_cached_analysis(products):
-    """Memory cache'ten kontrol et"""
-    cache_key = get_cache_key(products)
-    
-    # 1. Memory cache (hızlı)
-    if cache_key in MEMORY_CACHE:
-        cached_time, cached_data = MEMORY_CACHE[cache_key]
-        if time.time() - cached_time < 3600:  # 1 saat geçerliliği
-            print(f"✅ MEMORY CACHE HIT: {cache_key[:8]}")
-            return cached_data
-    
-    # 2. Django cache (daha büyük)
-    try:
-        django_cache_key = f"ai_analysis_{cache_key}"
-        cached_data = cache.get(django_cache_key)
-        if cached_data:
-            print(f"✅ DJANGO CACHE HIT: {cache_key[:8]}")
-            MEMORY_CACHE[cache_key] = (time.time(), cached_data)
-            return cached_data
-    except:
-        pass
-    
-    return None
-
-def set_cached_analysis(products, data):
-    """Cache'le her iki sisteme de"""
-    cache_key = get_cache_key(products)
-    
-    # Memory cache
-    MEMORY_CACHE[cache_key] = (time.time(), data)
-    
-    # Django cache
-    try:
-        django_cache_key = f"ai_analysis_{cache_key}"
-        cache.set(django_cache_key, data, timeout=3600)
-    except:
-        pass
-
-
-# =========================
-# PRICE & RATING PARSERS
-# =========================
-
-def parse_price(price_str):
-    if not price_str:
-        return None
-    cleaned = re.sub(r"[^\d.,]", "", str(price_str))
-    cleaned = cleaned.replace(",", ".")
-    try:
-        return float(cleaned)
-    except:
-        return None
-
-def get_num_rating(p):
-    r = p.get("rating", 0)
-    if isinstance(r, str):
-        mapping = {"five": 5, "four": 4, "three": 3, "two": 2, "one": 1}
-        r_lower = r.lower()
-        if r_lower in mapping: return mapping[r_lower]
-        return parse_price(r) or 0
-    return float(r) if r else 0
-
-def get_num_reviews(p):
-    rev = p.get("review_count", 0)
-    if isinstance(rev, str):
-        cleaned = re.sub(r"[^\d]", "", rev)
-        return int(cleaned) if cleaned else 0
-    return int(rev) if rev else 0
-
 
 # =========================
 # 1️⃣ ÜRÜN ETİKETLEME & SIRALAMA
@@ -133,30 +70,25 @@ def tag_products(products):
         return products
 
     try:
-        # Değerleri hesapla
-        for p in products:
-            p["_price_val"] = parse_price(p.get("price")) or 999999
-            p["_rating_val"] = get_num_rating(p)
-            p["_review_val"] = get_num_reviews(p)
-            p["tags"] = []
-
-        cheapest = min(products, key=lambda x: x["_price_val"])
-        highest_rating = max(products, key=lambda x: x["_rating_val"])
-        most_reviews = max(products, key=lambda x: x["_review_val"])
+        # Sayısal değerler Product oluşturulurken hesaplandı
+        cheapest = min(products, key=lambda x: x.price_value or 999999)
+        highest_rating = max(products, key=lambda x: x.rating_value)
+        most_reviews = max(products, key=lambda x: x.review_value)
 
         for p in products:
-            p["_sort_priority"] = 99
-            if p == cheapest:
-                p["tags"].append("En iyi fiyat")
-                p["_sort_priority"] = 1
-            elif p == highest_rating:
-                p["tags"].append("En yüksek puan")
-                p["_sort_priority"] = 2
-            elif p == most_reviews:
-                p["tags"].append("En çok yorum")
-                p["_sort_priority"] = 3
-
-        products.sort(key=lambda x: x["_sort_priority"])
+            p.tags = []
+            p.sort_priority = 99
+            if p is cheapest:
+                p.tags.append("En iyi fiyat")
+                p.sort_priority = 1
+            elif p is highest_rating:
+                p.tags.append("En yüksek puan")
+                p.sort_priority = 2
+            elif p is most_reviews:
+                p.tags.append("En çok yorum")
+                p.sort_priority = 3
+
+        products.sort(key=lambda x: x.sort_priority)
 
     except Exception as e:
         print(f"DEBUG: Tagging/Sorting error: {str(e)}")
@@ -165,11 +97,29 @@ def tag_products(products):
     return products
 
 
+def local_commentary(products):
+    """
+    LLM'siz yorum: tag_products etiketlerinden kısa bir özet. İstek bütçesi
+    (core/deadline.py) dolduğunda LLM analizi yerine kullanılır.
+    """
+    lines = []
+    for p in products:
+        if "En iyi fiyat" in p.tags:
+            lines.append(f"En uygun fiyat {p.site} üzerindeki {p.title} ({p.price} TL).")
+        elif "En yüksek puan" in p.tags:
+            lines.append(f"En yüksek puanlı seçenek {p.title} ({p.rating} puan).")
+        elif "En çok yorum" in p.tags:
+            lines.append(f"En çok yorumlanan ürün {p.title} ({p.review_count} yorum).")
+    if not lines:
+        lines.append(f"{len(products)} ürün bulundu; fiyat ve puanları karşılaştırabilirsiniz.")
+    return {"commentary": " ".join(lines)}
+
+
 def build_products_text(products):
     return "\n".join([
-        f"{p.get('title')} | {p.get('site')} | {p.get('price')} TL | "
-        f"Puan:{p.get('rating','N/A')} | Yorum:{p.get('review_count',0)} | "
-        f"Etiketler: {', '.join(p.get('tags', []))}"
+        f"{p.title} | {p.site} | {p.price} TL | "
+        f"Puan:{p.rating} | Yorum:{p.review_count} | "
+        f"Etiketler: {', '.join(p.tags)}"
         for p in products
     ])
 
@@ -178,66 +128,87 @@ def build_products_text(products):
 # MAIN FUNCTION
 # =========================
 
-def analyze_products(products):
+def analyze_products_flow(products):
     if not products:
         return {"error": "Ürün bulunamadı."}
     
     products = tag_products(products)
 
-    # Cache kontrol
-    cached_result = get_cached_analysis(products)
-    if cached_result:
-       return {
-            "products": products,
-            "data": cached_result,
-            "source": "cache"
-        }
-    
     products_text = build_products_text(products[:10])
     prompt = build_prompt(products_text)
 
+    # Cache (bayatsa arka planda yenilenir); aynı ürün listesi için eşzamanlı
+    # istekler tek bir LLM çağrısını paylaşır
+    outcome = {}
+    result = yield io(
+        MEMORY_CACHE.get_or_set, MEMORY_CACHE.aget_or_set,
+        get_cache_key(products), task(_ask_flow, prompt, outcome),
+    )
+    if result:
+        return {
+            "products": products,
+            "data": result,
+            "source": outcome.get("source", "cache")
+        }
+    if deadline.expired():
+        return degraded_analysis(products)
+
+    return {"error": "AI servisleri yoğunlukta. Lütfen biraz sonra tekrar deneyin."}
+
+
+def _ask_flow(prompt, outcome):
+    result, outcome["source"] = yield io(ask_providers, aask_providers, prompt)
+    return result
+
+
+# Tek akış (core/flow.py): WSGI view'ları sync, ASGI view'ları async sürer
+analyze_products = as_sync(analyze_products_flow)
+aanalyze_products = as_async(analyze_products_flow)
+
+
+def degraded_analysis(products):
+    """Bütçe dolduğunda dönen sonuç; cache'e yazılmaz, sonraki istek LLM'i yeniden dener."""
+    print("⏱️ DEADLINE: AI yorumu yerine etiket özeti")
+    return {
+        "products": products,
+        "data": local_commentary(products),
+        "source": "local"
+    }
+
+
+OPENROUTER_PRODUCT_MODELS = [
+    "meta-llama/llama-3.1-8b-instruct:free",
+    "google/gemma-2-9b-it:free",
+    "mistralai/mistral-7b-instruct:free"
+]
+
+
+def ask_providers_flow(prompt):
+    """Gemini -> Groq -> OpenRouter sırasıyla dener. (result, source) döner."""
     # 1️⃣ Gemini (Primary)
     if GEMINI_API_KEY:
-        result = ask_gemini(prompt)
+        result = yield io(ask_gemini, aask_gemini, prompt)
         if result:
-            set_cached_analysis(products, result)
-            return {
-                "products": products,
-                "data": result,
-                "source": "gemini"
-            }
+            return result, "gemini"
 
     # 2️⃣ Groq (High-Speed Fallback)
     if GROQ_API_KEY:
-        result = ask_groq(prompt, "llama-3.3-70b-versatile")
+        result = yield io(ask_groq, aask_groq, prompt, "llama-3.3-70b-versatile")
         if result:
-            set_cached_analysis(products, result)
-            return {
-           "products": products,
-           "data": result,
-           "source": "groq"
-       }
-
+            return result, "groq"
 
     # 3️⃣ OpenRouter (Breadth Fallback)
     if OPENROUTER_API_KEY:
-        fallback_models = [
-            "meta-llama/llama-3.1-8b-instruct:free",
-            "google/gemma-2-9b-it:free",
-            "mistralai/mistral-7b-instruct:free"
-        ]
-        for model in fallback_models:
-            result = ask_openrouter(prompt, model)
+        for model in ROUTER.order("openrouter", OPENROUTER_PRODUCT_MODELS):
+            result = yield io(ask_openrouter, aask_openrouter, prompt, model)
             if result:
-                set_cached_analysis(products, result)
-                return {
-                "products": products,
-                "data": result,
-                "source": "openrouter"
-            }
+                return result, "openrouter"
 
+    return None, None
 
-    return {"error": "AI servisleri yoğunlukta. Lütfen biraz sonra tekrar deneyin."}
+
+ask_providers = as_sync(ask_providers_flow)
+aask_providers = as_async(ask_providers_flow)
 
 
 def build_prompt(products_text):
@@ -257,59 +228,68 @@ Yanıtını MUTLAKA şu JSON formatında ver, başka metin ekleme:
 # AI ADAPTERS
 # =========================
 
+# Model seçimi ve devre kesici chat_service ile ortak ROUTER üzerinden (core/llm_router.py)
+
+def _commentary(text):
+    """JSON'a uymayan yanıtlarda da yorum döner."""
+    if not text:
+        return None
+    return extract_json(text) or {"commentary": str(text).strip()[:900]}
+
 def ask_gemini(prompt):
-    try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        for model_name in ["gemini-2.5-flash", "gemini-2.0-flash", "gemini-1.5-flash", "gemini-1.5-pro"]:
-            try:
-                response = client.models.generate_content(model=model_name, contents=prompt)
-                text = getattr(response, "text", None)
-                if text:
-                    parsed = extract_json(text)
-                    if parsed:
-                        return parsed
-                    # Graceful fallback: still return a commentary when model doesn't obey JSON.
-                    return {"commentary": text.strip()[:900]}
-            except Exception as e:
-                print(f"DEBUG: Gemini {model_name} failed: {str(e)}")
-                if "429" in str(e): break
-    except: pass
+    for model_name in ROUTER.order("gemini", settings.GEMINI_MODELS):
+        text = ROUTER.call("gemini", model_name, lambda: http_clients.gemini_generate(GEMINI_API_KEY, model_name, prompt))
+        if text:
+            return _commentary(text)
     return None
 
-def ask_groq(prompt, model_name):
-    try:
-        data = {
-            "model": model_name,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.3,
-            "response_format": {"type": "json_object"}
-        }
-        res = requests.post(GROQ_URL, headers=GROQ_HEADERS, json=data, timeout=10)
-        if res.status_code == 200:
-            content = res.json()["choices"][0]["message"]["content"]
-            parsed = extract_json(content)
-            if parsed:
-                return parsed
-            return {"commentary": str(content).strip()[:900]}
-    except Exception as e:
-        print(f"DEBUG: Groq failed: {str(e)}")
+async def aask_gemini(prompt):
+    for model_name in ROUTER.order("gemini", settings.GEMINI_MODELS):
+        text = await ROUTER.acall("gemini", model_name, lambda: http_clients.agemini_generate(GEMINI_API_KEY, model_name, prompt))
+        if text:
+            return _commentary(text)
     return None
 
+def _groq_payload(prompt, model_name):
+    return {
+        "model": model_name,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.3,
+        "response_format": {"type": "json_object"}
+    }
+
+def _openrouter_payload(prompt, model_name):
+    return {
+        "model": model_name,
+        "messages": [{"role": "user", "content": prompt}]
+    }
+
+def _completion_text(res):
+    return check_response(res).json()["choices"][0]["message"]["content"]
+
+def ask_groq(prompt, model_name):
+    return _commentary(ROUTER.call("groq", model_name, lambda: _completion_text(
+        http_clients.post(GROQ_URL, headers=GROQ_HEADERS, json=_groq_payload(prompt, model_name), timeout=10)
+    )))
+
+async def aask_groq(prompt, model_name):
+    async def _call():
+        return _completion_text(await http_clients.apost(
+            GROQ_URL, headers=GROQ_HEADERS, json=_groq_payload(prompt, model_name), timeout=10
+        ))
+    return _commentary(await ROUTER.acall("groq", model_name, _call))
+
 def ask_openrouter(prompt, model_name):
-    try:
-        data = {
-            "model": model_name,
-            "messages": [{"role": "user", "content": prompt}]
-        }
-        res = requests.post(OPENROUTER_URL, headers=OPENROUTER_HEADERS, json=data, timeout=15)
-        if res.status_code == 200:
-            content = res.json()["choices"][0]["message"]["content"]
-            parsed = extract_json(content)
-            if parsed:
-                return parsed
-            return {"commentary": str(content).strip()[:900]}
-    except: pass
-    return None
+    return _commentary(ROUTER.call("openrouter", model_name, lambda: _completion_text(
+        http_clients.post(OPENROUTER_URL, headers=OPENROUTER_HEADERS, json=_openrouter_payload(prompt, model_name), timeout=15)
+    )))
+
+async def aask_openrouter(prompt, model_name):
+    async def _call():
+        return _completion_text(await http_clients.apost(
+            OPENROUTER_URL, headers=OPENROUTER_HEADERS, json=_openrouter_payload(prompt, model_name), timeout=15
+        ))
+    return _commentary(await ROUTER.acall("openrouter", model_name, _call))
 
 def extract_json(text):
     try:
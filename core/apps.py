@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        if getattr(settings, "HTTP_PREWARM", False):
+            from . import http_clients, replay
+            if replay.mode() == "off":
+                http_clients.prewarm()
@@ -0,0 +1,370 @@
+"""
+Benchmark yardımcıları: kayıtlı SerpAPI payload'ını yükler ve sentetik
+olarak büyütür. Yönetim komutları (bench_dedupe, bench_pipeline) bunları kullanır.
+"""
+
+import difflib
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from .products import Product
+from .utils import normalize_title
+
+
+DEFAULT_PAYLOAD = Path(settings.BASE_DIR) / "raw_serp_deep_analysis.json"
+
+_VARIANTS = [
+    "128 GB", "256 GB", "512 GB", "Siyah", "Mavi", "Pembe", "Yeşil", "Beyaz",
+    "Apple Türkiye Garantili", "Distribütör Garantili", "İthalatçı Garantili",
+    "Yenilenmiş", "Teşhir", "Kılıf Hediyeli", "Şarj Aleti Dahil", "2 Yıl Garanti",
+]
+_LINES = [
+    "Samsung Galaxy S24", "Samsung Galaxy A55", "Xiaomi Redmi Note 13 Pro", "Xiaomi 14T",
+    "Google Pixel 8a", "Huawei Nova 12", "Oppo Reno 11", "Realme C67", "Honor Magic 6 Lite",
+    "Apple MacBook Air M3", "Lenovo IdeaPad Slim 5", "Asus Vivobook 15", "HP Victus 16",
+    "Sony WH-1000XM5 Kulaklık", "JBL Tune 520BT Kulaklık", "Apple AirPods Pro 2",
+    "Adidas Nizza Platform Ayakkabı", "Nike Air Force 1 Ayakkabı", "Puma Smash V2 Sneaker",
+    "Philips Airfryer XXL", "Dyson V15 Detect Süpürge", "Arzum Okka Minio Kahve Makinesi",
+]
+_SITES = ["trendyol.com", "hepsiburada.com", "amazon.com.tr", "n11.com", "boyner.com.tr", "MediaMarkt", "Teknosa"]
+
+
+def load_serp_payload(path=None):
+    with open(path or DEFAULT_PAYLOAD, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def synthetic_offers(count, seed=42, payload=None):
+    """
+    Kayıtlı payload başlıklarından ve farklı ürün serilerinden `count` adet
+    sentetik teklif üretir: ~%50'si var olan bir ürünün başka mağazadaki
+    kopyası ya da küçük ekli varyantı, kalanı farklı seri/model/renk
+    kombinasyonlarıyla gerçekten farklı ürünlerdir.
+    """
+    rng = random.Random(seed)
+    payload = payload or load_serp_payload()
+    base = [p for p in payload.get("shopping_results", []) if p.get("title")]
+    titles = []
+    offers = []
+    for i in range(count):
+        src = base[i % len(base)]
+        roll = rng.random()
+        if titles and roll < 0.3:
+            title = rng.choice(titles)
+        elif titles and roll < 0.5:
+            title = f"{rng.choice(titles)} {rng.choice(_VARIANTS)}"
+        elif roll < 0.6:
+            title = src["title"]
+        else:
+            series = rng.choice(_LINES + [src["title"]])
+            title = " ".join([
+                series,
+                f"{rng.choice(['', 'Pro ', 'Plus ', 'Lite ', 'Max '])}{rng.randint(1, 40)}".strip(),
+                *rng.sample(_VARIANTS, 2),
+                f"{rng.choice('ABCDEFGHKMNPRSTX')}{rng.randint(100, 9999)}",
+            ])
+        titles.append(title)
+        offers.append({
+            "id": f"bench_{i}",
+            "title": title,
+            "price": src.get("price") or f"{rng.randint(100, 90000)},00 TL",
+            "rating": src.get("rating") or round(rng.uniform(1, 5), 1),
+            "review_count": src.get("reviews") or rng.randint(0, 5000),
+            "site": rng.choice(_SITES),
+        })
+    return offers
+
+
+def legacy_deduplicate_products_v2(products, similarity_threshold=0.84):
+    """Önceki O(n²) dedupe; sadece karşılaştırma/regresyon için referans."""
+    unique = []
+
+    for product in products:
+        title = normalize_title(product.get("title", ""))
+        if not title:
+            continue
+        is_duplicate = False
+        for u in unique:
+            u_title = normalize_title(u.get("title", ""))
+            if not u_title:
+                continue
+
+            tokens_a = set(title.split())
+            tokens_b = set(u_title.split())
+            if tokens_a and tokens_b:
+                overlap = len(tokens_a & tokens_b) / max(1, len(tokens_a | tokens_b))
+                if overlap < 0.55:
+                    continue
+
+            sm = difflib.SequenceMatcher(None, title, u_title)
+            if sm.ratio() >= similarity_threshold:
+                is_duplicate = True
+                break
+
+        if not is_duplicate:
+            unique.append(product)
+
+    return unique
+
+
+# -------------------------
+# PIPELINE STAGES
+# -------------------------
+
+# 1000 teklif için aşama başına medyan bütçesi (ms); boyutla doğrusal ölçeklenir.
+# Ölçülen değerlerin ~3 katı: yavaş makinede gürültüye değil gerçek regresyona takılsın.
+STAGE_BUDGETS_MS = {
+    "normalize_title": 30,
+    "is_relevant_title": 45,
+    "deduplicate_products_v2": 500,
+    "rank_products": 5,
+    "tag_products": 2,
+    "get_cache_key": 3,
+    "build_products_text": 3,
+    "render_result_block": 400,
+}
+
+
+def synthetic_products(count, seed=42, payload=None):
+    """synthetic_offers'ın Product karşılığı (site rengi, görsel, link dahil)."""
+    payload = payload or load_serp_payload()
+    images = [p.get("thumbnail") for p in payload.get("shopping_results", []) if p.get("thumbnail")] or [None]
+    products = []
+    for i, offer in enumerate(synthetic_offers(count, seed=seed, payload=payload)):
+        image = images[i % len(images)]
+        products.append(Product(
+            image=image,
+            images=[image] if image else [],
+            brand=offer["site"],
+            link=f"https://{offer['site']}/p/{i}",
+            **offer,
+        ))
+    return products
+
+
+def pipeline_stages(count, seed=42, query="iphone 15"):
+    """
+    [(ad, çalıştır), ...]: her aşama tek başına ölçülür; girdileri (bir önceki
+    aşamanın çıktısı) burada, zamanlama dışında bir kez hazırlanır.
+    """
+    from django.template.loader import render_to_string
+
+    from .ai_service import build_products_text, get_cache_key, tag_products
+    from .utils import _is_relevant_title, deduplicate_products_v2, rank_products
+    from .views import session_products
+
+    products = synthetic_products(count, seed=seed)
+    titles = [p.title for p in products]
+    unique = deduplicate_products_v2(products)
+    ranked = rank_products(list(unique), query)
+    tagged = tag_products(list(ranked))
+    context = {
+        "flight_block": False,
+        "new_messages": [
+            {"role": "user", "content": query},
+            {
+                "role": "assistant",
+                "content": f'"{query}" için {len(tagged)} ürün buldum:',
+                "products": session_products(tagged),
+                "ai_summary": {"data": {"commentary": "Benchmark yorumu."}, "source": "cache"},
+            },
+        ],
+    }
+
+    return [
+        ("normalize_title", lambda: [normalize_title(t) for t in titles]),
+        ("is_relevant_title", lambda: [_is_relevant_title(t, query) for t in titles]),
+        ("deduplicate_products_v2", lambda: deduplicate_products_v2(products)),
+        ("rank_products", lambda: rank_products(list(unique), query)),
+        ("tag_products", lambda: tag_products(list(ranked))),
+        ("get_cache_key", lambda: get_cache_key(tagged)),
+        ("build_products_text", lambda: build_products_text(tagged)),
+        ("render_result_block", lambda: render_to_string("partials/result_block.html", context)),
+    ]
+
+
+def time_stage(fn, repeat=5):
+    """Tek aşamanın süreleri (ms): bir ısınma turu + `repeat` ölçüm."""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+# -------------------------
+# CONVERSATION STORE
+# -------------------------
+
+def conversation_turn_costs(turns, products_per_turn=20, seed=42):
+    """
+    Aynı sohbeti `turns` tur boyunca iki şekilde büyütür; her tur bir isteğin
+    yükle + kullanıcı/asistan mesajını ekle + kaydet maliyetidir (ms):
+
+      legacy_ms     - tüm geçmiş db session'ında (eski yöntem)
+      store_load_ms - ChatHistory.load (en fazla CHAT_HISTORY_LIMIT mesaj)
+      store_save_ms - ChatHistory.save (yalnızca o turun mesajları)
+
+    Veritabanına yazılanlar sonda geri alınır.
+    """
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.db import transaction
+
+    from .conversations import ChatHistory
+    from .views import session_products
+
+    products = session_products(synthetic_products(turns * products_per_turn, seed=seed))
+    turn_messages = [
+        [
+            {"role": "user", "content": f"ürün {turn}"},
+            {
+                "role": "assistant",
+                "content": f"{products_per_turn} ürün buldum:",
+                "products": products[turn * products_per_turn:(turn + 1) * products_per_turn],
+                "ai_summary": {"data": {"commentary": "Benchmark yorumu."}, "source": "cache"},
+            },
+        ]
+        for turn in range(turns)
+    ]
+    costs = {"legacy_ms": [], "store_load_ms": [], "store_save_ms": []}
+
+    # İki yöntem ayrı geçişlerde ölçülür; biri diğerinin büyüyen satırlarından etkilenmesin
+    with transaction.atomic():
+        legacy_session = SessionStore()
+        legacy_session.create()
+        for messages in turn_messages:
+            started = time.perf_counter()
+            session = SessionStore(session_key=legacy_session.session_key)
+            history = session.get("chat_history", [])
+            history.extend(messages)
+            session["chat_history"] = history
+            session.save()
+            costs["legacy_ms"].append((time.perf_counter() - started) * 1000)
+        transaction.set_rollback(True)
+
+    with transaction.atomic():
+        store_session = {}
+        for messages in turn_messages:
+            started = time.perf_counter()
+            chat_history = ChatHistory.load(store_session)
+            loaded = time.perf_counter()
+            chat_history.extend(messages)
+            chat_history.save()
+            costs["store_load_ms"].append((loaded - started) * 1000)
+            costs["store_save_ms"].append((time.perf_counter() - loaded) * 1000)
+        transaction.set_rollback(True)
+
+    return {name: [round(v, 3) for v in values] for name, values in costs.items()}
+
+
+# -------------------------
+# FLIGHT INTENT
+# -------------------------
+
+FLIGHT_INTENT_CORPUS = Path(__file__).resolve().parent / "data" / "flight_intent_corpus.jsonl"
+
+_LEGACY_FLIGHT_KEYWORDS = {
+    'tr': ['uçuş', 'bilet', 'uçak',  'seyahat', 'havayolu', 'gidiş', 'biniş'],
+    'en': ['flight', 'ticket', 'airplane', 'plane', 'fly', 'airport', 'airline', 'trip', 'travel'],
+}
+
+_LEGACY_CITIES = {
+    'istanbul': ['ist', 'iow'], 'ankara': ['ank', 'esr'], 'izmir': ['izm', 'adb'],
+    'antalya': ['ant', 'gny'], 'adana': ['adp', 'gwj'], 'bursa': ['yeg'], 'gaziantep': ['gno'],
+    'bodrum': ['bjv'], 'alanya': ['acy'], 'erzurum': ['erz'], 'kayseri': ['kay'],
+    'konya': ['kya'], 'trabzon': ['trz'],
+}
+
+
+def legacy_detect_flight_intent(query):
+    """Gazetteer öncesi detect_flight_intent (karşılaştırma için; her çağrıda regex kurar)."""
+    import re
+
+    if not query or not isinstance(query, str):
+        return {'is_flight': False, 'confidence': 0.0, 'reason': 'empty'}
+    query_lower = query.lower().strip()
+    city_code_pattern = r'\b([a-z]{3})\s+([a-z]{3})\b'
+    if re.search(city_code_pattern, query_lower):
+        return {'is_flight': True, 'confidence': 0.9, 'reason': 'city_code_pattern'}
+    for keyword in _LEGACY_FLIGHT_KEYWORDS['tr'] + _LEGACY_FLIGHT_KEYWORDS['en']:
+        if keyword in query_lower:
+            return {'is_flight': True, 'confidence': 0.8, 'reason': f'keyword: {keyword}'}
+    cities_pattern = '|'.join(list(_LEGACY_CITIES.keys()))
+    if re.search(rf'\b({cities_pattern})\b.*\b({cities_pattern})\b', query_lower):
+        return {'is_flight': True, 'confidence': 0.85, 'reason': 'city_names'}
+    if re.search(r'\b(?:to|den|dan|\'dan|from)\b', query_lower):
+        if re.search(rf'\b({cities_pattern})\b', query_lower):
+            return {'is_flight': True, 'confidence': 0.7, 'reason': 'city_with_direction'}
+    return {'is_flight': False, 'confidence': 0.0, 'reason': 'no_flight_markers'}
+
+
+def load_intent_corpus(path=None):
+    """[{"text", "is_flight", "lang"}, ...] (JSON Lines)."""
+    lines = Path(path or FLIGHT_INTENT_CORPUS).read_text(encoding="utf-8").splitlines()
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+def _routed(result):
+    # core.views.is_flight_message ile aynı karar: uçuş formuna yönlendirilir mi?
+    return result['is_flight'] and result['confidence'] > 0.7
+
+
+def _scores(pairs):
+    tp = sum(1 for expected, got in pairs if expected and got)
+    fp = sum(1 for expected, got in pairs if not expected and got)
+    fn = sum(1 for expected, got in pairs if expected and not got)
+    tn = len(pairs) - tp - fp - fn
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4),
+        "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+    }
+
+
+def evaluate_flight_intent(rows, detect, repeat=20):
+    """
+    Etiketli korpus üzerinde precision/recall (genel ve dil bazında), yanlış
+    sınıflanan örnekler ve çağrı başına gecikme (µs; korpus `repeat` kez).
+    """
+    predictions = [_routed(detect(row["text"])) for row in rows]
+    pairs = [(row["is_flight"], got) for row, got in zip(rows, predictions)]
+
+    samples = []
+    for _ in range(repeat):
+        for row in rows:
+            started = time.perf_counter_ns()
+            detect(row["text"])
+            samples.append((time.perf_counter_ns() - started) / 1000)
+    cuts = statistics.quantiles(samples, n=100)
+
+    by_lang = {}
+    for lang in sorted({row.get("lang", "") for row in rows}):
+        by_lang[lang] = _scores([p for p, row in zip(pairs, rows) if row.get("lang", "") == lang])
+
+    return {
+        **_scores(pairs),
+        "by_lang": by_lang,
+        "errors": [
+            {"text": row["text"], "expected": row["is_flight"], "got": got}
+            for row, got in zip(rows, predictions) if got != row["is_flight"]
+        ],
+        "latency_us": {
+            "mean": round(statistics.fmean(samples), 2),
+            "p50": round(cuts[49], 2),
+            "p95": round(cuts[94], 2),
+            "p99": round(cuts[98], 2),
+        },
+    }
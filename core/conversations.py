@@ -0,0 +1,314 @@
+"""
+Sohbet geçmişi deposu.
+
+Geçmiş eskiden tamamıyla session'daydı: her turda tüm mesajlar, ürün
+dict'leri ve AI özetleri yeniden serialize edilip yazılıyordu, yani her tur
+bir öncekinden pahalıydı. Artık:
+
+  - session'da yalnızca conversation_id tutulur;
+  - her mesaj bir Message satırıdır; ürünler paylaşılan Offer kayıtlarına
+    (başlık/mağaza/link/fiyat hash'i) referansla saklanır; sonuç setine özgü
+    alanlar (id, tags) Offer'a değil mesajın kendisine yazılır;
+  - bir tur yalnızca kendi yeni/değişen mesajlarını yazar;
+  - settings.CHAT_HISTORY_LIMIT'ten eski mesajlar yüklenmez ve silinir.
+
+ChatHistory bir list'tir; view yardımcıları (append_ajax_reply vb.) ve
+şablonlar eskisi gibi mesaj dict'leriyle çalışır:
+
+    chat_history = ChatHistory.load(request.session)
+    chat_history.append({"role": "user", "content": "iphone"})
+    chat_history.save()
+
+"Yeni sohbet" eski Conversation'ı mesajlarıyla siler (reset); session'ı
+düşmüş eski sohbetler ve artık referans verilmeyen Offer'lar prune() /
+`manage.py prune_conversations` ile temizlenir.
+
+Var olan bir mesaj yerinde değiştirilirse changed(message) ile işaretlenir.
+Uçuş sonuçları gibi mesaj dışı durum Conversation.state'te (state,
+update_state, pop_state) tutulur.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Conversation, Message, Offer
+
+
+SESSION_KEY = "conversation_id"
+# Eski sürümün session'a yazdığı anahtarlar; ilk yüklemede temizlenir
+LEGACY_SESSION_KEYS = ("chat_history", "flight_results", "flight_form_data", "show_flight_section", "flight_scroll")
+
+PRODUCT_FIELDS = {"products": "product_keys", "compare_products": "compare_keys"}
+# Offer anahtarı yalnızca teklifi tanımlayan alanlardan üretilir; id her
+# aramada rastgele (serp_{i}_{rastgele}), etiketler sonuç setine göre değişir.
+OFFER_KEY_FIELDS = ("title", "site", "link", "price")
+# Sonuç setine özgü alanlar: paylaşılan Offer.data'ya girmez, mesajda
+# (Message.extra[OFFER_EXTRA_KEY][alan]) ürün sırasıyla tutulur
+OFFER_MESSAGE_FIELDS = ("id", "tags")
+OFFER_EXTRA_KEY = "_offer_fields"
+
+
+def history_limit():
+    return getattr(settings, "CHAT_HISTORY_LIMIT", 50)
+
+
+def offer_key(data):
+    """Aynı mağazadaki aynı başlık/link/fiyat hangi aramadan gelirse gelsin tek Offer'dır."""
+    canonical = json.dumps([data.get(name) for name in OFFER_KEY_FIELDS], ensure_ascii=False, default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def _split_offer(data):
+    """Ürün dict'i -> (paylaşılan Offer.data, mesaja özgü alanlar)."""
+    shared = {k: v for k, v in data.items() if k not in OFFER_MESSAGE_FIELDS}
+    local = {k: data[k] for k in OFFER_MESSAGE_FIELDS if k in data}
+    return shared, local
+
+
+def _message_dict(row, offers):
+    extra = dict(row.extra)
+    offer_fields = extra.pop(OFFER_EXTRA_KEY, {})
+    message = {"role": row.role, "content": row.content, **extra}
+    for name, field in PRODUCT_FIELDS.items():
+        keys = getattr(row, field)
+        if keys:
+            local = offer_fields.get(name) or [{}] * len(keys)
+            message[name] = [{**offers[key], **fields} for key, fields in zip(keys, local) if key in offers]
+    return message
+
+
+class ChatHistory(list):
+    def __init__(self, session, conversation=None, messages=(), pks=(), next_position=0):
+        super().__init__(messages)
+        self.session = session
+        self.conversation = conversation
+        self.state = dict(conversation.state) if conversation else {}
+        self._pks = {id(m): pk for m, pk in zip(self, pks)}  # id(mesaj dict) -> Message.pk
+        self._next_position = next_position
+        self._new = []
+        self._changed = []
+        self._state_changed = False
+
+    # -------------------------
+    # LOAD
+    # -------------------------
+    @classmethod
+    def load(cls, session):
+        for key in LEGACY_SESSION_KEYS:
+            session.pop(key, None)
+        return cls._load(session, session.get(SESSION_KEY))
+
+    @classmethod
+    async def aload(cls, session):
+        for key in LEGACY_SESSION_KEYS:
+            await session.apop(key, None)
+        return await sync_to_async(cls._load)(session, await session.aget(SESSION_KEY))
+
+    @classmethod
+    def _load(cls, session, conversation_id):
+        conversation = None
+        if conversation_id:
+            try:
+                conversation = Conversation.objects.filter(pk=conversation_id).first()
+            except (ValueError, ValidationError):
+                conversation = None
+        if conversation is None:
+            return cls(session)
+
+        rows = list(Message.objects.filter(conversation=conversation).order_by("-position", "-id")[:history_limit()])
+        rows.reverse()
+        keys = {key for row in rows for field in PRODUCT_FIELDS.values() for key in getattr(row, field)}
+        offers = {key: offer.data for key, offer in Offer.objects.in_bulk(list(keys)).items()} if keys else {}
+        return cls(
+            session,
+            conversation,
+            messages=[_message_dict(row, offers) for row in rows],
+            pks=[row.pk for row in rows],
+            next_position=rows[-1].position + 1 if rows else 0,
+        )
+
+    # -------------------------
+    # CHANGES
+    # -------------------------
+    def append(self, message):
+        super().append(message)
+        self._new.append(message)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def changed(self, message):
+        """Kaydedilmiş bir mesaj yerinde değiştirildi; bir sonraki save() günceller."""
+        if id(message) in self._pks and all(m is not message for m in self._changed):
+            self._changed.append(message)
+
+    def update_state(self, **values):
+        self.state.update(values)
+        self._state_changed = True
+
+    def pop_state(self, key, default=None):
+        if key not in self.state:
+            return default
+        self._state_changed = True
+        return self.state.pop(key)
+
+    # -------------------------
+    # SAVE
+    # -------------------------
+    def ensure_conversation(self):
+        """Conversation yoksa oluşturur ve id'sini session'a yazar (streaming öncesi)."""
+        if self.conversation is None:
+            self.conversation = Conversation.objects.create(state=self.state)
+            self._state_changed = False
+            self.session[SESSION_KEY] = str(self.conversation.pk)
+        return self.conversation
+
+    async def aensure_conversation(self):
+        if self.conversation is None:
+            self.conversation = await Conversation.objects.acreate(state=self.state)
+            self._state_changed = False
+            await self.session.aset(SESSION_KEY, str(self.conversation.pk))
+        return self.conversation
+
+    def save(self):
+        """Yalnızca yeni/değişen mesajları ve değiştiyse durumu yazar."""
+        if not (self._new or self._changed or self._state_changed):
+            return
+        self.ensure_conversation()
+        self._write()
+
+    async def asave(self):
+        if not (self._new or self._changed or self._state_changed):
+            return
+        await self.aensure_conversation()
+        await sync_to_async(self._write)()
+
+    def _write(self):
+        with transaction.atomic():
+            if self._state_changed:
+                Conversation.objects.filter(pk=self.conversation.pk).update(state=self.state)
+                self._state_changed = False
+
+            offers = {}
+            rows = []
+            for message in self._new:
+                fields = self._fields(message, offers)
+                rows.append(Message(conversation=self.conversation, position=self._next_position, **fields))
+                self._next_position += 1
+            changed = [(message, self._fields(message, offers)) for message in self._changed]
+
+            if offers:
+                Offer.objects.bulk_create(
+                    [Offer(key=key, data=data) for key, data in offers.items()],
+                    ignore_conflicts=True,
+                )
+            if rows:
+                Message.objects.bulk_create(rows)
+                for message, row in zip(self._new, rows):
+                    self._pks[id(message)] = row.pk
+            for message, fields in changed:
+                Message.objects.filter(pk=self._pks[id(message)]).update(**fields)
+
+            limit = history_limit()
+            if rows and limit and self._next_position > limit:
+                Message.objects.filter(
+                    conversation=self.conversation, position__lt=self._next_position - limit
+                ).delete()
+
+        self._new = []
+        self._changed = []
+
+    def _fields(self, message, offers):
+        fields = {"role": message.get("role", ""), "content": message.get("content") or "", "extra": {}}
+        offer_fields = {}
+        for name, field in PRODUCT_FIELDS.items():
+            keys = []
+            local = []
+            for data in message.get(name) or []:
+                key = offer_key(data)
+                offers[key], own = _split_offer(data)
+                keys.append(key)
+                local.append(own)
+            fields[field] = keys
+            if any(local):
+                offer_fields[name] = local
+        if offer_fields:
+            fields["extra"][OFFER_EXTRA_KEY] = offer_fields
+        for name, value in message.items():
+            if name not in ("role", "content") and name not in PRODUCT_FIELDS:
+                fields["extra"][name] = value
+        return fields
+
+
+# -------------------------
+# RESET / PRUNE
+# -------------------------
+# Yeni yazılan Offer'lar bu süre boyunca silinmez (eşzamanlı bir kayıtla yarışmamak için)
+OFFER_PRUNE_GRACE = 3600
+PRUNE_BATCH = 500
+
+
+def retention_days():
+    return getattr(settings, "CHAT_RETENTION_DAYS", 14)
+
+
+def _delete_conversation(conversation_id):
+    try:
+        Conversation.objects.filter(pk=conversation_id).delete()
+    except (ValueError, ValidationError):
+        pass
+
+
+def reset(session):
+    """Yeni sohbet: eski Conversation mesajlarıyla birlikte silinir, session boşalır."""
+    conversation_id = session.get(SESSION_KEY)
+    for key in (SESSION_KEY, *LEGACY_SESSION_KEYS):
+        session.pop(key, None)
+    if conversation_id:
+        _delete_conversation(conversation_id)
+
+
+async def areset(session):
+    conversation_id = await session.aget(SESSION_KEY)
+    for key in (SESSION_KEY, *LEGACY_SESSION_KEYS):
+        await session.apop(key, None)
+    if conversation_id:
+        await sync_to_async(_delete_conversation)(conversation_id)
+
+
+def prune(days=None, now=None):
+    """
+    Son mesajı `days` günden eski sohbetleri (session'ı düşmüş olanlar dahil)
+    ve hiçbir mesajın referans vermediği Offer'ları siler.
+    Dönüş: {"conversations": n, "offers": m}
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=retention_days() if days is None else days)
+    stale = (
+        Conversation.objects.annotate(last_message=Max("messages__created_at"))
+        .filter(Q(last_message__lt=cutoff) | Q(last_message__isnull=True, created_at__lt=cutoff))
+        .values_list("pk", flat=True)
+    )
+    stale = list(stale)
+    for start in range(0, len(stale), PRUNE_BATCH):
+        Conversation.objects.filter(pk__in=stale[start:start + PRUNE_BATCH]).delete()
+
+    referenced = set()
+    for product_keys, compare_keys in Message.objects.values_list("product_keys", "compare_keys").iterator():
+        referenced.update(product_keys)
+        referenced.update(compare_keys)
+    candidates = Offer.objects.filter(created_at__lt=now - timedelta(seconds=OFFER_PRUNE_GRACE))
+    orphans = [key for key in candidates.values_list("key", flat=True).iterator() if key not in referenced]
+    offers = 0
+    for start in range(0, len(orphans), PRUNE_BATCH):
+        offers += Offer.objects.filter(key__in=orphans[start:start + PRUNE_BATCH]).delete()[0]
+    return {"conversations": len(stale), "offers": offers}
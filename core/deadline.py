@@ -0,0 +1,171 @@
+"""
+İstek başına zaman bütçesi (deadline).
+
+View başında settings.REQUEST_DEADLINE saniyelik bir Deadline açılır ve
+contextvar ile isteğin tüm upstream çağrılarına taşınır:
+
+  - http_clients her çağrının timeout'unu kalan süreyle kırpar (SerpAPI 10s
+    istese de 3s kaldıysa 3s bekler); kalan süre REQUEST_DEADLINE_MIN_CALL'un
+    altındaysa çağrı hiç başlamaz, DeadlineExceeded (requests.Timeout) atılır.
+  - LLM router süre dolunca yeni deneme/model başlatmaz.
+  - Süre dolduğunda niyet analizi self_fallback'e, ürün yorumu tag_products
+    etiketlerinden üretilen sabit yoruma düşer.
+
+Thread havuzlarına iş verilirken bind() ile bağlam kopyalanır; asyncio
+task'ları bağlamı zaten kopyalar. Arka plan cache yenilemeleri isteğin
+bütçesine bağlı değildir.
+
+    @with_deadline
+    def view(request): ...
+    timeout = deadline.timeout(10)   # min(10, kalan süre)
+"""
+
+import asyncio
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+
+
+_current = contextvars.ContextVar("finda_deadline", default=None)
+
+
+class DeadlineExceeded(requests.Timeout):
+    """İstek bütçesi doldu; çağıranlar bunu upstream timeout'u gibi ele alır."""
+
+
+def min_call():
+    """Bir upstream çağrısını başlatmaya değecek en kısa kalan süre (sn)."""
+    return getattr(settings, "REQUEST_DEADLINE_MIN_CALL", 0.5)
+
+
+class Deadline:
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+        self._tokens = []
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() < min_call()
+
+    def timeout(self, cap=None):
+        """min(cap, kalan süre); yeni çağrıya yetecek süre yoksa DeadlineExceeded."""
+        left = self.remaining()
+        if left < min_call():
+            raise DeadlineExceeded(f"request deadline exceeded ({self.budget}s)")
+        return left if cap is None else min(cap, left)
+
+    def __enter__(self):
+        self._tokens.append(_current.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        token = self._tokens.pop()
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Generator başka bir bağlamda kapatıldı; o bağlamı kirletme
+            pass
+        return False
+
+    def __repr__(self):
+        return f"<Deadline {self.remaining():.2f}s/{self.budget}s>"
+
+
+def current():
+    return _current.get()
+
+
+def for_request():
+    """settings.REQUEST_DEADLINE'lık yeni Deadline; 0/boşsa None (bütçe yok)."""
+    budget = getattr(settings, "REQUEST_DEADLINE", 0)
+    return Deadline(budget) if budget else None
+
+
+def remaining(default=None):
+    active = current()
+    return default if active is None else active.remaining()
+
+
+def expired():
+    active = current()
+    return active is not None and active.expired
+
+
+def timeout(cap=None):
+    """Aktif deadline'a göre kırpılmış timeout; deadline yoksa cap aynen döner."""
+    active = current()
+    return cap if active is None else active.timeout(cap)
+
+
+def bind(fn):
+    """fn'i çağıranın bağlamıyla (deadline dahil) çalıştıran callable; thread havuzları için."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+@contextmanager
+def activate(deadline):
+    """deadline None olabilir (bütçe kapalı): with activate(request.deadline): ..."""
+    if deadline is None:
+        yield None
+        return
+    with deadline:
+        yield deadline
+
+
+def with_deadline(view):
+    """View'i settings.REQUEST_DEADLINE bütçesiyle çalıştırır (sync ve async view'lar)."""
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def _async_view(request, *args, **kwargs):
+            with activate(for_request()):
+                return await view(request, *args, **kwargs)
+        return _async_view
+
+    @functools.wraps(view)
+    def _view(request, *args, **kwargs):
+        with activate(for_request()):
+            return view(request, *args, **kwargs)
+    return _view
+
+
+def bind_stream(chunks, active=None):
+    """
+    Streaming yanıt parçaları view döndükten sonra üretilir; o anda bağlamda
+    deadline kalmaz. active (varsayılan: şu anki deadline) her parça üretilirken
+    yeniden etkinleştirilir. Sync ve async iterator'lar için.
+    """
+    if active is None:
+        active = current()
+    if active is None:
+        return chunks
+
+    if hasattr(chunks, "__aiter__"):
+        async def _achunks():
+            iterator = chunks.__aiter__()
+            while True:
+                with active:
+                    try:
+                        chunk = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        return
+                yield chunk
+        return _achunks()
+
+    def _chunks():
+        iterator = iter(chunks)
+        while True:
+            with active:
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+            yield chunk
+    return _chunks()
@@ -0,0 +1,120 @@
+"""
+Near-duplicate ürün tespiti.
+
+deduplicate_products_v2 ile birebir aynı kararı verir (token Jaccard >= 0.55
+ön filtresi + SequenceMatcher oranı >= eşik), ama her başlığı bir kez
+normalize eder ve adayları token inverted index'i ile bulur. Pahalı
+SequenceMatcher sadece Jaccard filtresini geçen çiftlerde çalışır.
+
+Aday üretimi prefix filtering kullanır: Jaccard(x, y) >= t ise, tokenlar
+sabit bir global sıraya dizildiğinde x'in ilk |x| - ceil(t*|x|) + 1 tokenı
+ile y'nin aynı uzunluktaki prefix'i mutlaka kesişir. Bu yüzden sadece
+prefix tokenları indekslenir; sık geçen ("apple", "iphone") tokenlar çoğu
+zaman prefix dışında kalır ve uzun posting listeleri oluşmaz.
+"""
+
+import difflib
+import math
+from collections import defaultdict
+
+
+def _token_order(token):
+    # Sabit global sıra: rakam içeren (model kodu) ve uzun tokenlar genelde
+    # daha nadirdir, öne alınır. Doğruluk için sıranın sabit olması yeterli.
+    return (not any(c.isdigit() for c in token), -len(token), token)
+
+
+class DedupeIndex:
+    """
+    Artımlı (kaynaklar geldikçe) eklenebilen dedupe indeksi.
+
+        index = DedupeIndex()
+        for p in products:
+            index.add(p)
+        index.items  # benzersiz ürünler, geliş sırasıyla
+    """
+
+    def __init__(self, similarity_threshold=0.84, token_overlap=0.55, normalize=None):
+        if normalize is None:
+            from .utils import normalize_title as normalize
+        self.similarity_threshold = similarity_threshold
+        self.token_overlap = token_overlap
+        self._normalize = normalize
+        self._postings = defaultdict(list)  # prefix token -> [kabul edilen indeksler]
+        self._titles = []
+        self._token_sets = []
+        self._matchers = []  # b dizisi analiz edilmiş SequenceMatcher'lar (lazy)
+        self._exact = set()
+        self.items = []
+        self.comparisons = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, product, normalized_title=None, tokens=None):
+        """
+        Ürün benzersizse ekler ve True döner; duplicate ya da boş başlıksa False.
+        normalized_title/tokens önceden hesaplandıysa (Product) tekrar hesaplanmaz.
+        """
+        title = normalized_title
+        if title is None:
+            title = self._normalize(product.get("title", "") or "")
+        if not title:
+            return False
+        if title in self._exact:
+            return False
+
+        if tokens is None:
+            tokens = frozenset(title.split())
+        prefix = self._prefix(tokens)
+        if self._has_duplicate(title, tokens, prefix):
+            return False
+
+        idx = len(self._titles)
+        self._titles.append(title)
+        self._token_sets.append(tokens)
+        self._matchers.append(None)
+        self._exact.add(title)
+        for token in prefix:
+            self._postings[token].append(idx)
+        self.items.append(product)
+        return True
+
+    def extend(self, products):
+        for product in products:
+            self.add(product)
+        return self.items
+
+    def _prefix(self, tokens):
+        size = len(tokens)
+        required = math.ceil(self.token_overlap * size - 1e-9)
+        length = max(1, size - required + 1)
+        return sorted(tokens, key=_token_order)[:length]
+
+    def _has_duplicate(self, title, tokens, prefix):
+        candidates = set()
+        for token in prefix:
+            candidates.update(self._postings.get(token, ()))
+        if not candidates:
+            return False
+
+        size = len(tokens)
+        threshold = self.similarity_threshold
+        for idx in sorted(candidates):
+            other = self._token_sets[idx]
+            common = len(tokens & other)
+            if common / max(1, size + len(other) - common) < self.token_overlap:
+                continue
+
+            matcher = self._matchers[idx]
+            if matcher is None:
+                matcher = difflib.SequenceMatcher(None, "", self._titles[idx])
+                self._matchers[idx] = matcher
+            matcher.set_seq1(title)
+            self.comparisons += 1
+            # real_quick_ratio / quick_ratio, ratio için üst sınırdır: eleme kesin
+            if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                continue
+            if matcher.ratio() >= threshold:
+                return True
+        return False
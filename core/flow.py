@@ -0,0 +1,136 @@
+"""
+Sync ve async yollar için tek gövdeli akışlar.
+
+Bir işin mantığı bir kez, generator olarak yazılır: I/O gereken her adımda
+io(sync_fn, async_fn, ...) yield edilir, sürücü (drive / adrive) bunlardan
+birini çağırıp sonucu generator'a geri gönderir. Hata da geri atılır, yani
+akış içindeki try/except iki modda da aynı çalışır. Alt akışlar `yield from`
+ile çağrılır; callback isteyen adımlara (cache get_or_set vb.) task(...) ile
+bir alt akış verilir, sürücü onu kendi modunda çalışan bir callable'a çevirir.
+
+    def search_flow(query):
+        res = yield io(http_clients.get, http_clients.aget, URL, params={"q": query})
+        return res.json()
+
+    search = as_sync(search_flow)      # search("iphone")
+    asearch = as_async(search_flow)    # await asearch("iphone")
+
+Streaming akışları ayrıca str parçalar yield eder; drive_stream /
+adrive_stream bunları dışarı verir (bkz. core/views.py).
+"""
+
+import functools
+
+
+def io(fn, afn, *args, **kwargs):
+    return fn, afn, args, kwargs
+
+
+class Task:
+    """Adım argümanı olarak verilen alt akış; sürücü kendi modunda çalıştırır."""
+
+    def __init__(self, flow_fn, args, kwargs):
+        self.flow_fn = flow_fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def bind(self, run):
+        return lambda: run(self.flow_fn(*self.args, **self.kwargs))
+
+
+def task(flow_fn, *args, **kwargs):
+    return Task(flow_fn, args, kwargs)
+
+
+def _call(fn, args, kwargs, run):
+    args = [a.bind(run) if isinstance(a, Task) else a for a in args]
+    kwargs = {k: v.bind(run) if isinstance(v, Task) else v for k, v in kwargs.items()}
+    return fn(*args, **kwargs)
+
+
+def _advance(flow, value, error):
+    return flow.send(value) if error is None else flow.throw(error)
+
+
+# -------------------------
+# DRIVERS
+# -------------------------
+def drive(flow):
+    value = error = None
+    while True:
+        try:
+            fn, _, args, kwargs = _advance(flow, value, error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            value, error = _call(fn, args, kwargs, drive), None
+        except Exception as e:
+            value, error = None, e
+
+
+async def adrive(flow):
+    value = error = None
+    while True:
+        try:
+            _, afn, args, kwargs = _advance(flow, value, error)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            value, error = await _call(afn, args, kwargs, adrive), None
+        except Exception as e:
+            value, error = None, e
+
+
+def drive_stream(flow):
+    value = error = None
+    while True:
+        try:
+            step = _advance(flow, value, error)
+        except StopIteration:
+            return
+        value = error = None
+        if isinstance(step, str):
+            yield step
+            continue
+        fn, _, args, kwargs = step
+        try:
+            value = _call(fn, args, kwargs, drive)
+        except Exception as e:
+            error = e
+
+
+async def adrive_stream(flow):
+    value = error = None
+    while True:
+        try:
+            step = _advance(flow, value, error)
+        except StopIteration:
+            return
+        value = error = None
+        if isinstance(step, str):
+            yield step
+            continue
+        _, afn, args, kwargs = step
+        try:
+            value = await _call(afn, args, kwargs, adrive)
+        except Exception as e:
+            error = e
+
+
+# -------------------------
+# ENTRY POINTS
+# -------------------------
+def as_sync(flow_fn):
+    """Akışı normal fonksiyon olarak çağrılabilir yapar."""
+    @functools.wraps(flow_fn)
+    def _run(*args, **kwargs):
+        return drive(flow_fn(*args, **kwargs))
+    return _run
+
+
+def as_async(flow_fn):
+    """Akışı coroutine fonksiyonu olarak çağrılabilir yapar."""
+    @functools.wraps(flow_fn)
+    async def _run(*args, **kwargs):
+        return await adrive(flow_fn(*args, **kwargs))
+    return _run
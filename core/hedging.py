@@ -0,0 +1,214 @@
+"""
+Hedged (yarışan) LLM çağrıları.
+
+Sağlayıcılar sırayla denenir, ama sıradaki sağlayıcı öncekinin bitmesini
+beklemez: aktif çağrı kendi gözlenen p90 gecikmesi içinde yanıt vermezse
+bir sonraki paralel başlatılır (hedge). İlk geçerli yanıt kazanır, geride
+kalan çağrılar iptal edilir: async'te task iptal edilir; thread'de çalışan
+adayın iptal event'i set edilir, ROUTER.call yeni model/deneme başlatmaz
+(cancelled()), yalnızca o an uçuştaki istek tamamlanır. Bir çağrı None
+dönerse/hata verirse sıradaki hedge süresini beklemeden hemen başlar.
+
+Gecikme örnekleri her tamamlanan denemeden alınır (kazanan, kaybeden, hata);
+async'te iptal edilen kaybedenin o ana kadarki süresi alt sınır olarak kaydedilir.
+
+    result, name = HEDGER.run([("gemini", lambda: ask_gemini(p)), ("groq", ...)])
+    result, name = await HEDGER.arun([("gemini", lambda: aask_gemini(p)), ...])
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from . import deadline
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_cancel = contextvars.ContextVar("finda_hedge_cancel", default=None)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "LLM_HEDGE_WORKERS", 16),
+                    thread_name_prefix="finda-hedge",
+                )
+    return _executor
+
+
+def cancelled():
+    """Çalışan hedge adayı kaybetti mi? Uzun süren adaylar (model döngüleri) bunu yoklar."""
+    event = _cancel.get()
+    return event is not None and event.is_set()
+
+
+def _with_cancel(fn, event):
+    def call():
+        token = _cancel.set(event)
+        try:
+            return fn()
+        finally:
+            _cancel.reset(token)
+    return call
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class Hedger:
+    def __init__(self, window=50, min_samples=5):
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies = {}  # aday adı -> deque (tamamlanan denemelerin süreleri, sn)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def delay(self, name):
+        """Hedge gecikmesi: adayın gözlenen p90'ı; yeterli örnek yoksa varsayılan."""
+        floor = getattr(settings, "LLM_HEDGE_MIN_DELAY", 0.3)
+        with self._lock:
+            samples = list(self._latencies.get(name, ()))
+        if len(samples) < self.min_samples:
+            return max(floor, getattr(settings, "LLM_HEDGE_DEFAULT_DELAY", 2.0))
+        return max(floor, percentile(samples, getattr(settings, "LLM_HEDGE_PERCENTILE", 0.9)))
+
+    def record(self, name, elapsed):
+        with self._lock:
+            self._latencies.setdefault(name, deque(maxlen=self.window)).append(elapsed)
+
+    def _fired(self, name, delay):
+        with self._lock:
+            self.hedges_fired += 1
+        print(f"[AI:{name}] hedge - {delay:.2f}s içinde yanıt yok, sıradaki başlatıldı")
+
+    def _won(self, name, hedge):
+        with self._lock:
+            self.calls += 1
+            if hedge:
+                self.hedges_won += 1
+
+    def _recorder(self, name, started):
+        def _done(future):
+            if not future.cancelled():
+                self.record(name, time.monotonic() - started)
+        return _done
+
+    def _record_cancelled(self, name, started):
+        # Kaybeden en az bu kadar sürdü; hedge eşiğinin altındaki yarışlar (aynı turda
+        # başlayıp iptal edilenler) örneği aşağı çekmesin
+        elapsed = time.monotonic() - started
+        if elapsed >= getattr(settings, "LLM_HEDGE_MIN_DELAY", 0.3):
+            self.record(name, elapsed)
+
+    def run(self, candidates):
+        """candidates: [(ad, fn)], fn() geçerli yanıt ya da None döner. (yanıt, ad) döner."""
+        executor = get_executor()
+        pending = {}  # future -> (ad, hedge mi, iptal event'i)
+        queue = list(candidates)
+
+        def _launch(hedge):
+            name, fn = queue.pop(0)
+            cancel = threading.Event()
+            future = executor.submit(deadline.bind(_with_cancel(fn, cancel)))
+            # Kaybedenler arka planda bitince de kaydedilir
+            future.add_done_callback(self._recorder(name, time.monotonic()))
+            pending[future] = (name, hedge, cancel)
+            return name
+
+        current = _launch(False) if queue else None
+        try:
+            while pending:
+                timeout = self.delay(current) if queue else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    self._fired(current, timeout)
+                    current = _launch(True)
+                    continue
+                for future in done:
+                    name, hedge, _ = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"[AI:{name}] error - {str(e)[:180]}")
+                        result = None
+                    if result:
+                        self._won(name, hedge)
+                        return result, name
+                    if queue:
+                        current = _launch(False)
+            self._won(None, False)
+            return None, None
+        finally:
+            for future, (_, _, cancel) in pending.items():
+                cancel.set()
+                future.cancel()
+
+    async def arun(self, candidates):
+        """run'ın async karşılığı; candidates: [(ad, coroutine döndüren fn)]. Kaybedenler iptal edilir."""
+        pending = {}  # task -> (ad, başlangıç, hedge mi)
+        queue = list(candidates)
+
+        def _launch(hedge):
+            name, fn = queue.pop(0)
+            started = time.monotonic()
+            task = asyncio.ensure_future(fn())
+            task.add_done_callback(self._recorder(name, started))
+            pending[task] = (name, started, hedge)
+            return name
+
+        current = _launch(False) if queue else None
+        try:
+            while pending:
+                timeout = self.delay(current) if queue else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._fired(current, timeout)
+                    current = _launch(True)
+                    continue
+                for task in done:
+                    name, _, hedge = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        print(f"[AI:{name}] error - {str(e)[:180]}")
+                        result = None
+                    if result:
+                        self._won(name, hedge)
+                        return result, name
+                    if queue:
+                        current = _launch(False)
+            self._won(None, False)
+            return None, None
+        finally:
+            for task, (name, started, _) in pending.items():
+                task.cancel()
+                self._record_cancelled(name, started)
+
+    def stats(self):
+        with self._lock:
+            latencies = {name: list(samples) for name, samples in self._latencies.items()}
+            counts = {"calls": self.calls, "hedges_fired": self.hedges_fired, "hedges_won": self.hedges_won}
+        return {
+            **counts,
+            "p90_ms": {
+                name: round(percentile(samples, 0.9) * 1000, 1)
+                for name, samples in latencies.items() if samples
+            },
+        }
+
+
+HEDGER = Hedger()
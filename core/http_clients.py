@@ -0,0 +1,355 @@
+"""
+Tüm upstream'ler (SerpAPI, FakeStore, Amadeus, Groq, OpenRouter, Gemini) için
+paylaşılan, host başına havuzlu ve keep-alive HTTP istemcileri.
+
+Kullanım:
+    from core import http_clients
+    res = http_clients.get(url, params=..., timeout=10)
+    res = http_clients.post(url, json=..., headers=..., timeout=10)
+
+Async (ASGI) view'lar için aynı arayüzün await edilen karşılıkları:
+    res = await http_clients.aget(url, params=..., timeout=10)
+
+settings.UPSTREAM_REPLAY_MODE açıkken tüm çağrılar core.replay üzerinden
+kaydedilir/oynatılır (bkz. core/replay.py).
+
+İstek bütçesi (core/deadline.py) aktifse her çağrının timeout'u kalan süreyle
+kırpılır; süre dolmuşsa çağrı yapılmadan DeadlineExceeded atılır.
+"""
+
+import asyncio
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from . import deadline, replay
+
+try:
+    import httpx
+except ImportError:  # httpx requirements içinde, ama zorunlu değil
+    httpx = None
+
+try:
+    import h2  # noqa: F401  httpx HTTP/2 için gerekli
+    HTTP2_AVAILABLE = httpx is not None
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# Taban URL'ler settings'ten gelir (yük testinde stand-in'lere yönlendirilebilir)
+UPSTREAMS = {
+    "serpapi": getattr(settings, "SERPAPI_BASE_URL", "https://serpapi.com"),
+    "fakestore": getattr(settings, "FAKESTORE_BASE_URL", "https://fakestoreapi.com"),
+    "amadeus": getattr(settings, "AMADEUS_BASE_URL", "https://test.api.amadeus.com"),
+    "groq": getattr(settings, "GROQ_BASE_URL", "https://api.groq.com"),
+    "openrouter": getattr(settings, "OPENROUTER_BASE_URL", "https://openrouter.ai"),
+}
+
+# Havuz/bağlantı hataları: her iki istemci tipinde de yakalanacak hatalar
+if httpx is not None:
+    UPSTREAM_ERRORS = (requests.RequestException, httpx.HTTPError)
+else:
+    UPSTREAM_ERRORS = (requests.RequestException,)
+
+
+def _host_key(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def upstream_name(url):
+    """URL'in UPSTREAMS adı ("serpapi", "amadeus"...), bilinmiyorsa host."""
+    key = _host_key(url)
+    for name, base_url in UPSTREAMS.items():
+        if base_url == key:
+            return name
+    return urlsplit(url).netloc
+
+
+class PooledClient:
+    """Tek bir host için kalıcı bağlantı havuzu + kullanım sayaçları."""
+
+    def __init__(self, base_url, pool_size=20, http2=False):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.http2 = bool(http2 and HTTP2_AVAILABLE)
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+        if self.http2:
+            self._client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+        else:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._adapter = adapter
+            self._client = session
+
+    def request(self, method, url, **kwargs):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return self._client.request(method, url, **kwargs)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self):
+        data = {
+            "protocol": "http2" if self.http2 else "http1.1",
+            "pool_size": self.pool_size,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+        }
+        if not self.http2:
+            pools = self._adapter.poolmanager.pools
+            opened = idle = 0
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                opened += pool.num_connections
+                idle += pool.pool.qsize() if pool.pool else 0
+            data["connections_opened"] = opened
+            data["idle_slots"] = idle
+        return data
+
+    def close(self):
+        self._client.close()
+
+
+class AsyncPooledClient:
+    """
+    Tek bir host için httpx.AsyncClient havuzu. Bir event loop'a bağlıdır;
+    ASGI worker'ında tek loop olduğundan pratikte host başına tek istemci olur.
+    """
+
+    def __init__(self, base_url, pool_size=200, http2=False):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.http2 = bool(http2 and HTTP2_AVAILABLE)
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def request(self, method, url, **kwargs):
+        # Tek loop içinde çalıştığı için sayaçlar kilitsiz güncellenir
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await self._client.request(method, url, **kwargs)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "protocol": "http2" if self.http2 else "http1.1",
+            "async": True,
+            "pool_size": self.pool_size,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+        }
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+# loop -> {host: AsyncPooledClient}; loop kapanıp silinince istemcileri de düşer,
+# id() tekrar kullanılsa bile yeni loop ölü bir istemciyi almaz
+_async_clients = weakref.WeakKeyDictionary()
+_gemini_clients = {}
+
+
+def get_client(url):
+    """URL'in host'una ait havuzlu istemciyi döndür (yoksa oluştur)."""
+    key = _host_key(url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = PooledClient(
+                    key,
+                    pool_size=getattr(settings, "HTTP_POOL_MAXSIZE", 20),
+                    http2=getattr(settings, "HTTP2_ENABLED", False),
+                )
+                _clients[key] = client
+    return client
+
+
+def request(method, url, **kwargs):
+    kwargs["timeout"] = deadline.timeout(kwargs.get("timeout"))
+    if replay.mode() == "off":
+        return get_client(url).request(method, url, **kwargs)
+    return replay.http_request(
+        upstream_name(url), method, url, kwargs,
+        lambda: get_client(url).request(method, url, **kwargs),
+    )
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def get_async_client(url):
+    """Çalışan event loop + host için async istemci (yoksa oluştur)."""
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    key = _host_key(url)
+    client = clients.get(key)
+    if client is None:
+        client = AsyncPooledClient(
+            key,
+            pool_size=getattr(settings, "HTTP_ASYNC_POOL_MAXSIZE", 200),
+            http2=getattr(settings, "HTTP2_ENABLED", False),
+        )
+        clients[key] = client
+    return client
+
+
+async def arequest(method, url, **kwargs):
+    kwargs["timeout"] = deadline.timeout(kwargs.get("timeout"))
+    if httpx is None:
+        # httpx yoksa senkron havuz bir thread'de kullanılır
+        from asgiref.sync import sync_to_async
+        return await sync_to_async(request, thread_sensitive=False)(method, url, **kwargs)
+    if replay.mode() == "off":
+        return await get_async_client(url).request(method, url, **kwargs)
+    return await replay.ahttp_request(
+        upstream_name(url), method, url, kwargs,
+        lambda: get_async_client(url).request(method, url, **kwargs),
+    )
+
+
+async def aget(url, **kwargs):
+    return await arequest("GET", url, **kwargs)
+
+
+async def apost(url, **kwargs):
+    return await arequest("POST", url, **kwargs)
+
+
+def get_gemini_client(api_key):
+    """genai.Client her çağrıda yeniden kurulmasın; anahtar başına tek istemci."""
+    client = _gemini_clients.get(api_key)
+    if client is None:
+        from google import genai
+
+        with _clients_lock:
+            client = _gemini_clients.get(api_key)
+            if client is None:
+                client = genai.Client(api_key=api_key)
+                _gemini_clients[api_key] = client
+    return client
+
+
+def _gemini_config():
+    """Aktif istek bütçesi varsa kalan süre genai timeout'u (ms) olarak verilir."""
+    if deadline.current() is None:
+        return None
+    return {"http_options": {"timeout": int(deadline.timeout() * 1000)}}
+
+
+def gemini_generate(api_key, model, contents):
+    """generate_content(...).text; record/replay modunda core.replay üzerinden."""
+    config = _gemini_config()
+
+    def _live():
+        response = get_gemini_client(api_key).models.generate_content(model=model, contents=contents, config=config)
+        return getattr(response, "text", None)
+
+    if replay.mode() == "off":
+        return _live()
+    return replay.call("gemini", {"model": model, "contents": contents}, _live)
+
+
+async def agemini_generate(api_key, model, contents):
+    """gemini_generate'in async karşılığı (genai client.aio)."""
+    config = _gemini_config()
+
+    async def _alive():
+        response = await get_gemini_client(api_key).aio.models.generate_content(
+            model=model, contents=contents, config=config
+        )
+        return getattr(response, "text", None)
+
+    if replay.mode() == "off":
+        return await _alive()
+    return await replay.acall("gemini", {"model": model, "contents": contents}, _alive)
+
+
+def pool_stats():
+    """Host başına havuz kullanımı: {"https://serpapi.com": {...}, ...}"""
+    stats = {key: client.stats() for key, client in list(_clients.items())}
+    for clients in list(_async_clients.values()):
+        for key, client in list(clients.items()):
+            stats[f"{key} (async)"] = client.stats()
+    return stats
+
+
+def prewarm(names=None, timeout=3):
+    """
+    Worker açılışında TLS bağlantılarını önceden kur.
+    Hatalar yutulur; amaç sadece havuza sıcak bir bağlantı bırakmak.
+    """
+    targets = [UPSTREAMS[n] for n in (names or UPSTREAMS) if n in UPSTREAMS]
+
+    def _warm(base_url):
+        try:
+            request("HEAD", base_url, timeout=timeout)
+        except Exception as e:
+            print(f"HTTP prewarm failed for {base_url}: {str(e)[:120]}")
+
+    threads = [threading.Thread(target=_warm, args=(url,), daemon=True) for url in targets]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def close_all():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+async def aclose_all():
+    """Çalışan loop'a ait async istemcileri kapat (finda/asgi.py lifespan kapanışında)."""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
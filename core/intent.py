@@ -1,77 +1,456 @@
-"""Intent detection utility for routing queries to product or flight search."""
+"""Intent detection utility for routing queries to product or flight search.
 
+classify_message: ürün aramalarının çoğu ("iphone 15 pro", "adidas nizza",
+"siyah kablosuz kulaklık") LLM'e gitmeden burada çözülür. Mesaj bir
+marka/seri/kategori gazetteer'ına karşı token'lanır, Türkçe ürün terimleri
+İngilizce'ye çevrilir ve {intent, query, confidence} döner. Güven eşiğin
+altındaysa (soru, karşılaştırma, bilinmeyen kelimeler) karar LLM'e kalır.
+"""
+
+import json
 import re
+from pathlib import Path
+
+
+# -------------------------
+# FLIGHT GAZETTEER
+# -------------------------
+# core/data/airports.json: IATA kodu, şehir, havalimanı ve TR/EN takma adlar.
+# Tüm eşleştirme import anında bir kez derlenen tek bir regex ile yapılır;
+# üç harfli kelimeler ancak gazetteer'daki gerçek bir havalimanıysa kod sayılır
+# ("red cap" / "pro max" değil). Küçük harfli kodlar ("ham", "bal", "ise" aynı
+# zamanda Türkçe kelime) yalnızca bir uçuş ifadesinin ya da başka bir yer
+# adının hemen yanındaysa kabul edilir: "IST ESB" ve "ist ankara" uçuş,
+# "ham bal" değil.
+AIRPORTS = json.loads((Path(__file__).resolve().parent / "data" / "airports.json").read_text(encoding="utf-8"))
+
+_FOLD = str.maketrans({"ı": "i", "ş": "s", "ğ": "g", "ü": "u", "ö": "o", "ç": "c", "â": "a", "î": "i", "û": "u",
+                       "é": "e", "ã": "a", "’": "'", "‘": "'", "`": "'", "̇": None})
+
+
+def _fold_flight(text):
+    """Küçük harf + ASCII (İ/I -> i): 'İzmir'den' -> "izmir'den"."""
+    return str(text).replace("İ", "i").replace("I", "i").lower().translate(_FOLD)
+
+
+# Kesin uçuş ifadeleri; tek başına yeterli
+FLIGHT_PHRASES = (
+    r"ucus\w*", r"ucak\s+bilet\w*", r"ucakla", r"havayol\w*", r"havalimani\w*", r"havaalani\w*",
+    r"aktarmasiz", r"binis\s+karti", r"flights?", r"airlines?", r"airport\w*", r"airfares?",
+    r"plane\s+tickets?", r"air\s+tickets?", r"fly(?:ing)?\s+to", r"one\s+way\s+(?:flight|ticket)",
+)
+# Başka bağlamda da geçen ifadeler ("konser bileti", "travel bag"); bir yer adıyla birlikte sayılır
+FLIGHT_HINTS = (
+    r"bilet\w*", r"tickets?", r"ucak\w*", r"seyahat\w*", r"travel\w*", r"trips?", r"gidis\w*",
+    r"donus\w*", r"tek\s+yon", r"tatil\w*", r"round\s+trip", r"return",
+)
+# Yer adından sonra yön/yer ekleri: istanbul'dan, ankaraya, londra'ya
+_DIRECTION_SUFFIX = r"'?(?:ndan|nden|dan|den|tan|ten|ya|ye|na|ne|a|e)"
+_LOCATIVE_SUFFIX = r"'?(?:da|de|ta|te)"
+_DATE = (
+    r"\d{4}-\d{2}-\d{2}|\d{1,2}[./]\d{1,2}[./]\d{4}"
+    r"|\d{1,2}\s+(?:ocak|subat|mart|nisan|mayis|haziran|temmuz|agustos|eylul|ekim|kasim|aralik"
+    r"|jan\w*|feb\w*|mar\w*|apr\w*|may|jun\w*|jul\w*|aug\w*|sep\w*|oct\w*|nov\w*|dec\w*)"
+    r"|yarin|haftaya|tomorrow|tonight|next\s+week"
+)
+
+PLACES = {}   # katlanmış takma ad -> şehir
+IATA_CODES = {}  # küçük harf kod -> şehir
+for _airport in AIRPORTS:
+    IATA_CODES[_airport["code"].lower()] = _airport["city"]
+    for _alias in _airport["aliases"]:
+        PLACES[_fold_flight(_alias)] = _airport["city"]
+
+
+def _alternation(words):
+    # En uzun önce: "new york" "new"den önce denensin
+    return "|".join(sorted(words, key=len, reverse=True))
+
+
+def _trie_pattern(words):
+    """
+    Sabit kelimelerden ortak önekleri birleştirilmiş regex (istanbul|izmir ->
+    i(?:stanbul|zmir)); yüzlerce yer adı tek tek değil harf harf denenir.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def _build(node):
+        end = "" in node
+        branches = [re.escape(char) + _build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if end:
+            # Kelime burada bitebilir; daha uzun eşleşme önce denenir
+            return ("(?:" + body + ")?") if len(branches) == 1 else body + "?"
+        return body
+
+    return _build(trie)
+
+
+FLIGHT_PATTERN = re.compile(
+    rf"(?<![\w'])(?:"
+    rf"(?P<place>{_trie_pattern(PLACES)})"
+    rf"(?:(?P<direction>{_DIRECTION_SUFFIX})|{_LOCATIVE_SUFFIX})?"
+    rf"|(?P<phrase>{_alternation(FLIGHT_PHRASES)})"
+    rf"|(?P<hint>{_alternation(FLIGHT_HINTS)})"
+    rf"|(?P<date>{_DATE})"
+    rf"|(?P<arrow>to|from|nereden|nereye)"
+    rf"|(?P<code>[a-z]{{3}})"
+    rf")(?![\w])"
+    rf"|(?P<route>->|→|>)"
+)
+# Yan yana sayılan iki eşleşme arasında yalnızca bunlar olabilir
+_ADJACENT_GAP = re.compile(r"[\s,/-]*")
+_WORD3 = re.compile(r"(?<!\w)[^\W\d_]{3}(?!\w)")
+
+
+def _accept_codes(text, items):
+    """
+    Küçük harfli kodları, bir uçuş işaretinin, yer adının ya da kabul edilmiş
+    başka bir kodun hemen yanındaysa yer adına çevirir ("ist esb uçuş" ikisi de).
+    """
+    changed = True
+    while changed:
+        changed = False
+        for i, (span, kind, city) in enumerate(items):
+            if kind != "code":
+                continue
+            for j in (i - 1, i + 1):
+                if not 0 <= j < len(items) or items[j][1] == "code":
+                    continue
+                left, right = (span, items[j][0]) if i < j else (items[j][0], span)
+                if _ADJACENT_GAP.fullmatch(text, left[1], right[0]):
+                    items[i] = (span, "place", city)
+                    changed = True
+                    break
 
 
-FLIGHT_KEYWORDS = {
-    'tr': ['uçuş', 'bilet', 'uçak',  'seyahat', 'havayolu', 'gidiş', 'biniş'],
-    'en': ['flight', 'ticket', 'airplane', 'plane', 'fly', 'airport', 'airline', 'trip', 'travel'],
+def detect_flight_intent(query):
+    """
+    Detect if a query is flight-related.
+
+    Returns:
+        dict: {'is_flight': bool, 'confidence': float, 'reason': str, 'places': [city, ...]}
+    """
+    if not query or not isinstance(query, str):
+        return {'is_flight': False, 'confidence': 0.0, 'reason': 'empty', 'places': []}
+
+    text = _fold_flight(query)
+    typed_codes = None
+    items = []  # ((start, end), kind, city); metin sırasıyla
+    directed = phrase = hint = date = arrow = False
+    for match in FLIGHT_PATTERN.finditer(text):
+        kind = match.lastgroup if match.lastgroup != "direction" else "place"
+        city = None
+        if kind == "place":
+            city = PLACES[match.group("place")]
+            directed = directed or match.group("direction") is not None
+        elif kind == "code":
+            code = match.group("code")
+            city = IATA_CODES.get(code)
+            if not city:
+                continue
+            if typed_codes is None:
+                # Büyük harfle yazılanlar ("IST", "İST") kullanıcının kod olarak yazdıklarıdır
+                typed_codes = {_fold_flight(word) for word in _WORD3.findall(query) if word.isupper()}
+            if code in typed_codes:
+                kind = "place"
+        elif kind == "phrase":
+            phrase = True
+        elif kind == "hint":
+            hint = True
+        elif kind == "date":
+            date = True
+        else:
+            arrow = True
+        items.append((match.span(), kind, city))
+
+    if typed_codes is not None:
+        _accept_codes(text, items)
+    places = [city for _, kind, city in items if kind == "place"]
+    places = list(dict.fromkeys(places))
+    if len(places) >= 2:
+        result = (True, 0.95, 'route')
+    elif phrase:
+        result = (True, 0.95 if places else 0.85, 'flight_phrase')
+    elif places and (hint or date):
+        result = (True, 0.85, 'place_with_hint' if hint else 'place_with_date')
+    elif places and (directed or arrow):
+        result = (True, 0.7, 'place_with_direction')
+    else:
+        result = (False, 0.0, 'no_flight_markers')
+    is_flight, confidence, reason = result
+    return {'is_flight': is_flight, 'confidence': confidence, 'reason': reason, 'places': places}
+
+
+# -------------------------
+# SMALLTALK
+# -------------------------
+SMALLTALK_TOKENS = {
+    "slm", "selam", "merhaba", "mrb", "hi", "hello", "hey",
+    "nasilsin", "naber", "gunaydin", "iyi aksamlar", "iyi geceler",
+    "tesekkur", "tesekkurler", "sagol"
+}
+
+
+def fold_turkish(text):
+    """Küçük harf + Türkçe karakterleri ASCII'ye indir (smalltalk eşleştirmesi için)."""
+    normalized = str(text).strip().lower()
+    normalized = normalized.replace("ı", "i").replace("İ", "i")
+    normalized = normalized.replace("ş", "s").replace("ğ", "g")
+    normalized = normalized.replace("ü", "u").replace("ö", "o").replace("ç", "c")
+    return re.sub(r"\s+", " ", normalized)
+
+
+def is_smalltalk_message(text):
+    if not text:
+        return False
+    normalized = fold_turkish(text)
+    if normalized in SMALLTALK_TOKENS:
+        return True
+
+    words = [w for w in re.split(r"\s+", normalized) if w]
+    if 1 < len(words) <= 4 and all(w in SMALLTALK_TOKENS for w in words):
+        return True
+
+    return False
+
+
+# -------------------------
+# PRODUCT GAZETTEER
+# -------------------------
+BRANDS = {
+    "apple", "samsung", "xiaomi", "huawei", "oppo", "realme", "oneplus", "google", "honor",
+    "sony", "lg", "lenovo", "hp", "dell", "asus", "acer", "msi", "monster", "casper", "toshiba",
+    "philips", "bosch", "arçelik", "beko", "vestel", "siemens", "dyson", "tefal", "braun", "karaca",
+    "jbl", "bose", "sennheiser", "anker", "logitech", "razer", "steelseries", "canon", "nikon",
+    "fujifilm", "gopro", "nintendo", "microsoft", "garmin", "amazfit", "fitbit", "nokia", "tcl",
+    "adidas", "nike", "puma", "reebok", "skechers", "converse", "vans", "asics", "salomon",
+    "timberland", "lacoste", "tommy", "levis", "zara", "koton", "lcw", "defacto", "columbia",
+    "rayban", "casio", "seiko", "swatch", "lego", "stanley", "kärcher", "karcher",
+    "new balance", "under armour", "north face", "hummel", "kinetix", "crocs", "birkenstock",
 }
 
-TURKISH_CITIES = {
-    'istanbul': ['ist', 'iow'],
-    'ankara': ['ank', 'esr'],
-    'izmir': ['izm', 'adb'],
-    'antalya': ['ant', 'gny'],
-    'adana': ['adp', 'gwj'],
-    'bursa': ['yeg'],
-    'gaziantep': ['gno'],
-    'bodrum': ['bjv'],
-    'alanya': ['acy'],
-    'erzurum': ['erz'],
-    'kayseri': ['kay'],
-    'konya': ['kya'],
-    'trabzon': ['trz'],
+# Marka dışı seri/model adları
+PRODUCT_LINES = {
+    "iphone", "ipad", "macbook", "imac", "airpods", "galaxy", "pixel", "redmi", "poco",
+    "playstation", "ps4", "ps5", "xbox", "thinkpad", "ideapad", "legion", "zenbook", "vivobook",
+    "rog", "tuf", "pavilion", "omen", "inspiron", "xps", "kindle", "buds", "tab", "surface",
+    "switch", "air", "jordan", "stan", "superstar", "samba", "gazelle", "nizza", "forum",
+    "chuck", "ultraboost", "mac", "macbook air", "macbook pro", "apple watch",
 }
 
+# Türkçe/İngilizce ürün kategorileri -> İngilizce arama terimi.
+# Çok kelimeli ifadeler token'lamadan önce tek terime çevrilir.
+CATEGORY_PHRASES = {
+    "cep telefonu": "phone",
+    "akıllı telefon": "smartphone",
+    "akıllı saat": "smartwatch",
+    "spor ayakkabı": "sneakers",
+    "sırt çantası": "backpack",
+    "oyun konsolu": "game console",
+    "şarj aleti": "charger",
+    "kahve makinesi": "coffee machine",
+    "çamaşır makinesi": "washing machine",
+    "bulaşık makinesi": "dishwasher",
+    "fotoğraf makinesi": "camera",
+    "saç kurutma makinesi": "hair dryer",
+    "robot süpürge": "robot vacuum",
+    "oyuncu mouse": "gaming mouse",
+    "oyun bilgisayarı": "gaming laptop",
+}
 
-def detect_flight_intent(query):
+# Kısıtlı modun (chat_service.self_fallback) ürün sözlüğü: arama terimi ->
+# onu işaret eden kelimeler. Yerel sınıflandırıcı da aynı sözlüğü kullanır;
+# başka bir sözlükte olmayan kelimeler kategori sayılır (bkz. LEXICONS).
+PRODUCT_KEYWORDS = {
+    'laptop': ['laptop', 'dizüstü', 'macbook', 'bilgisayar', 'pc'],
+    'phone': ['phone', 'telefon', 'iphone', 'samsung', 'mobile', 'cep'],
+    'headphones': ['kulaklık', 'headphone', 'airpods'],
+    'shoes': ['ayakkabı', 'sneaker', 'bot'],
+    'woman': ['kadın', 'woman', 'bayan']
+}
+
+CATEGORY_TERMS = {
+    "telefon": "phone", "phone": "phone", "smartphone": "smartphone", "mobile": "phone",
+    "kulaklık": "headphones", "headphone": "headphones", "headphones": "headphones",
+    "earbuds": "earbuds", "airpods": "airpods",
+    "bilgisayar": "computer", "pc": "computer", "computer": "computer",
+    "dizüstü": "laptop", "laptop": "laptop", "notebook": "laptop",
+    "tablet": "tablet", "televizyon": "tv", "tv": "tv", "monitör": "monitor", "monitor": "monitor",
+    "klavye": "keyboard", "keyboard": "keyboard", "mouse": "mouse", "fare": "mouse",
+    "hoparlör": "speaker", "speaker": "speaker", "kamera": "camera", "camera": "camera",
+    "saat": "watch", "watch": "watch", "smartwatch": "smartwatch",
+    "şarj": "charger", "charger": "charger", "kılıf": "case", "case": "case",
+    "powerbank": "power bank", "konsol": "console", "console": "console",
+    "ayakkabı": "shoes", "shoes": "shoes", "sneaker": "sneakers", "sneakers": "sneakers",
+    "bot": "boots", "çizme": "boots", "boots": "boots", "terlik": "slippers",
+    "çanta": "bag", "bag": "bag", "cüzdan": "wallet", "mont": "jacket", "ceket": "jacket",
+    "jacket": "jacket", "tişört": "t-shirt", "gömlek": "shirt", "elbise": "dress", "dress": "dress",
+    "pantolon": "trousers", "jean": "jeans", "kot": "jeans", "kazak": "sweater", "hırka": "cardigan",
+    "eşofman": "tracksuit", "etek": "skirt", "gözlük": "glasses", "parfüm": "perfume",
+    "perfume": "perfume", "süpürge": "vacuum cleaner", "buzdolabı": "refrigerator", "ütü": "iron",
+    "klima": "air conditioner", "blender": "blender", "airfryer": "air fryer", "fritöz": "air fryer",
+    "oyuncak": "toy", "toy": "toy", "kitap": "book", "book": "book", "bisiklet": "bicycle",
+    "matkap": "drill", "yazıcı": "printer", "printer": "printer", "router": "router", "modem": "modem",
+}
+
+COLOR_TERMS = {
+    "siyah": "black", "beyaz": "white", "kırmızı": "red", "mavi": "blue", "yeşil": "green",
+    "gri": "gray", "pembe": "pink", "mor": "purple", "sarı": "yellow", "lacivert": "navy",
+    "kahverengi": "brown", "bej": "beige", "turuncu": "orange", "altın": "gold", "gümüş": "silver",
+    "black": "black", "white": "white", "red": "red", "blue": "blue", "green": "green",
+}
+
+MODIFIER_TERMS = {
+    "pro": "pro", "max": "max", "ultra": "ultra", "plus": "plus", "mini": "mini", "lite": "lite",
+    "se": "se", "fe": "fe", "5g": "5g", "wifi": "wifi", "kablosuz": "wireless", "wireless": "wireless",
+    "bluetooth": "bluetooth", "oyuncu": "gaming", "gaming": "gaming", "erkek": "men", "kadın": "women",
+    "bayan": "women", "woman": "women", "women": "women", "men": "men", "çocuk": "kids", "kids": "kids",
+    "deri": "leather", "su": "water", "geçirmez": "proof", "mekanik": "mechanical", "akıllı": "smart",
+}
+
+# Alışveriş niyetini güçlendiren ama sorguya girmeyen kelimeler
+SHOPPING_CUES = {
+    "al", "almak", "alayım", "alacağım", "alıcam", "satın", "istiyorum", "lazım", "arıyorum",
+    "bul", "bulur", "öner", "önerir", "göster", "fiyat", "fiyatı", "fiyatları", "fiyatlar",
+    "ucuz", "uygun", "indirim", "indirimli", "buy", "cheap", "cheapest", "price", "best", "deal",
+}
+
+# Sorguya girmeyen dolgu kelimeler
+FILLER_TERMS = {
+    "bana", "bir", "için", "ile", "ve", "en", "iyi", "model", "modeli", "modelleri", "tane",
+    "musun", "misin", "bakıyorum", "bakar", "yeni", "orijinal", "the", "a", "for", "with", "and",
+    "please", "lütfen", "şu", "bu", "olan", "tl", "altı", "altında",
+}
+
+# Soru/karşılaştırma işaretleri: karar LLM'e bırakılır
+QUESTION_MARKERS = {
+    "nasıl", "neden", "niye", "nedir", "ne", "hangi", "hangisi", "mi", "mı", "mu", "mü",
+    "mısın", "kimsin", "karşılaştır", "fark", "farkı", "vs", "veya", "yoksa",
+    "how", "why", "what", "which", "or",
+}
+
+# Türkçe çekim ekleri (uzundan kısaya); "kulaklığı" -> "kulaklık" için ğ->k denenir
+TR_SUFFIXES = (
+    "lerini", "larını", "leri", "ları", "ler", "lar", "nın", "nin", "nun", "nün",
+    "sı", "si", "su", "sü", "yı", "yi", "yu", "yü", "ı", "i", "u", "ü", "e", "a",
+)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9çğıöşü]+(?:-[a-z0-9çğıöşü]+)*")
+MODEL_CODE_PATTERN = re.compile(r"^(?:[a-z]{0,3}\d{1,4}[a-z]{0,3}|\d+(?:gb|tb|mm|inç|inch|hz|w))$")
+
+# Çok kelimeli marka/seri adları token'lamadan önce tireyle birleştirilir ("new balance" -> "new-balance")
+LEXICONS = (
+    ("brand", {b.replace(" ", "-"): b for b in BRANDS}),
+    ("line", {l.replace(" ", "-"): l for l in PRODUCT_LINES}),
+    ("category", CATEGORY_TERMS),
+    ("color", COLOR_TERMS),
+    ("modifier", MODIFIER_TERMS),
+)
+for _query, _keywords in PRODUCT_KEYWORDS.items():
+    for _keyword in _keywords:
+        if not any(_keyword in lexicon for _, lexicon in LEXICONS):
+            CATEGORY_TERMS[_keyword] = _query
+
+# Uzundan kısaya: "macbook air" "macbook"tan önce birleştirilsin
+NAME_PHRASES = sorted((n for n in BRANDS | PRODUCT_LINES if " " in n), key=len, reverse=True)
+
+
+def _lower_tr(text):
+    return str(text).replace("İ", "i").replace("I", "ı").lower()
+
+
+def _stem_candidates(token):
+    yield token
+    for suffix in TR_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            stem = token[: -len(suffix)]
+            yield stem
+            if stem.endswith("ğ"):
+                yield stem[:-1] + "k"
+
+
+def _classify_token(token):
+    """(tür, sorgudaki karşılığı). Tür: brand/line/category/color/modifier/model/cue/filler/question/unknown."""
+    if token in QUESTION_MARKERS:
+        return "question", None
+    if token in SHOPPING_CUES:
+        return "cue", None
+    if token in FILLER_TERMS:
+        return "filler", None
+    # Sözlükler model kodundan önce: "ps5" bir seri, "574" bir model
+    for candidate in _stem_candidates(token):
+        for kind, lexicon in LEXICONS:
+            if candidate in lexicon:
+                return kind, lexicon[candidate]
+        if candidate in SHOPPING_CUES:
+            return "cue", None
+    if MODEL_CODE_PATTERN.match(token):
+        return "model", token
+    return "unknown", token
+
+
+def classify_message(text):
     """
-    Detect if a query is flight-related.
-    
+    Yerel niyet sınıflandırıcı.
+
     Returns:
-        dict: {'is_flight': bool, 'confidence': float, 'reason': str}
+        dict: {'intent': 'shopping'|'chat'|'unknown', 'query': str, 'confidence': float, 'reason': str}
     """
-    if not query or not isinstance(query, str):
-        return {'is_flight': False, 'confidence': 0.0, 'reason': 'empty'}
-    
-    query_lower = query.lower().strip()
-    
-    # Check for exact city code patterns (e.g., "ist ank")
-    city_code_pattern = r'\b([a-z]{3})\s+([a-z]{3})\b'
-    if re.search(city_code_pattern, query_lower):
-        return {'is_flight': True, 'confidence': 0.9, 'reason': 'city_code_pattern'}
-    
-    # Check for flight keywords in Turkish
-    for keyword in FLIGHT_KEYWORDS['tr']:
-        if keyword in query_lower:
-            return {'is_flight': True, 'confidence': 0.8, 'reason': f'keyword_tr: {keyword}'}
-    
-    # Check for flight keywords in English
-    for keyword in FLIGHT_KEYWORDS['en']:
-        if keyword in query_lower:
-            return {'is_flight': True, 'confidence': 0.8, 'reason': f'keyword_en: {keyword}'}
-    
-    # Check for city name patterns (e.g., "istanbul ankara", "ankara to istanbul")
-    cities_pattern = '|'.join(list(TURKISH_CITIES.keys()))
-    if re.search(rf'\b({cities_pattern})\b.*\b({cities_pattern})\b', query_lower):
-        return {'is_flight': True, 'confidence': 0.85, 'reason': 'city_names'}
-    
-    # Check for "to" or "->" patterns with cities
-    if re.search(r'\b(?:to|den|dan|\'dan|from)\b', query_lower):
-        if re.search(rf'\b({cities_pattern})\b', query_lower):
-            return {'is_flight': True, 'confidence': 0.7, 'reason': 'city_with_direction'}
-    
-    # Check for date patterns (YYYY-MM-DD, DD.MM.YYYY, DD/MM/YYYY)
-    date_pattern = r'(\d{4}-\d{2}-\d{2}|\d{2}[./]\d{2}[./]\d{4})'
-    has_date = bool(re.search(date_pattern, query))
-    
-    # If has date + city code/keyword = likely flight
-    if has_date and (re.search(city_code_pattern, query_lower) or 
-                     any(kw in query_lower for kw in FLIGHT_KEYWORDS['tr'] + FLIGHT_KEYWORDS['en'])):
-        return {'is_flight': True, 'confidence': 0.9, 'reason': 'date_with_flight_marker'}
-    
-    return {'is_flight': False, 'confidence': 0.0, 'reason': 'no_flight_markers'}
+    if not text or not isinstance(text, str):
+        return {'intent': 'unknown', 'query': '', 'confidence': 0.0, 'reason': 'empty'}
+    if is_smalltalk_message(text):
+        return {'intent': 'chat', 'query': '', 'confidence': 1.0, 'reason': 'smalltalk'}
+
+    lowered = _lower_tr(text)
+    if "?" in lowered:
+        return {'intent': 'unknown', 'query': '', 'confidence': 0.3, 'reason': 'question'}
+    for phrase, term in CATEGORY_PHRASES.items():
+        lowered = lowered.replace(phrase, f" {term.replace(' ', '_')} ")
+    for name in NAME_PHRASES:
+        if name in lowered:
+            lowered = lowered.replace(name, name.replace(" ", "_"))
+
+    kinds = []
+    query_terms = []
+    for token in TOKEN_PATTERN.findall(lowered.replace("_", "-")):
+        if "-" in token and token.replace("-", " ") in CATEGORY_PHRASES.values():
+            kind, term = "category", token.replace("-", " ")
+        else:
+            kind, term = _classify_token(token)
+        kinds.append(kind)
+        if term:
+            query_terms.append(term)
+
+    if "question" in kinds:
+        return {'intent': 'unknown', 'query': '', 'confidence': 0.3, 'reason': 'question'}
+
+    anchors = sum(1 for k in kinds if k in ("brand", "line", "category"))
+    unknown = kinds.count("unknown")
+    if not anchors:
+        return {'intent': 'unknown', 'query': '', 'confidence': 0.1, 'reason': 'no_product_terms'}
+
+    if unknown == 0:
+        confidence, reason = 0.95, "gazetteer"
+    elif unknown == 1 and any(k in ("brand", "line") for k in kinds):
+        # "adidas nizza", "xiaomi redmi note": marka + bilinmeyen model adı
+        confidence, reason = 0.85, "brand_with_model"
+    elif unknown == 1:
+        confidence, reason = 0.6, "category_with_unknown"
+    else:
+        confidence, reason = 0.4, "too_many_unknown"
+    if "cue" in kinds:
+        confidence = min(0.99, confidence + 0.05)
+
+    query = " ".join(dict.fromkeys(query_terms))
+    return {'intent': 'shopping', 'query': query, 'confidence': round(confidence, 2), 'reason': reason}
 
 # """
 # Intent detection utility for routing queries to product or flight search.
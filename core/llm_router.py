@@ -0,0 +1,293 @@
+"""
+LLM sağlayıcı/model yönlendirici.
+
+Her (sağlayıcı, model) için başarı oranı ve gecikme EWMA'sı, ardışık hata
+sayısı ve devre kesici (circuit breaker) durumu tutulur. Durum process
+belleğindedir; çağrı başına cache I/O'su yoktur. LLM_ROUTER_SYNC_INTERVAL'da
+bir (ve bir devre açıldığında hemen) paylaşılan Django cache'iyle birleştirilir:
+açık devreler tüm worker'lara yayılır, EWMA'lar ortalanır. Ardışık hata
+sayısı her process'in kendisinindir; worker'lar birbirinin sayacını ezmez.
+
+  order(provider, models) - açık devreleri atlar, kalanları başarı oranı
+                            ve gecikmeye göre sıralar
+  call(provider, model, fn) - fn()'i çağırır; geçici hatalarda tenacity ile
+                            jitter'lı üstel bekleme yapıp tekrar dener,
+                            sonucu kaydeder. 429'da ya da üst üste hatada
+                            devre cooldown süresince açılır. İstek bütçesi
+                            (core/deadline.py) dolunca yeni deneme yapılmaz,
+                            bütçe kaynaklı hatalar modelin sağlığına yazılmaz.
+                            Hedge yarışını kaybeden aday (core/hedging.py)
+                            yeni model/deneme başlatmaz.
+
+Olaylar log_ai_event ile loglanır (chat_service de aynı fonksiyonu kullanır).
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from tenacity import (
+    AsyncRetrying,
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from . import deadline, hedging, http_clients
+
+
+def log_ai_event(provider, status, detail=""):
+    """Lightweight provider logging for debugging limited-mode fallbacks."""
+    if detail:
+        print(f"[AI:{provider}] {status} - {detail}")
+    else:
+        print(f"[AI:{provider}] {status}")
+
+
+class ProviderHTTPError(Exception):
+    """Sağlayıcı 200 dışı yanıt döndü."""
+
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def check_response(res):
+    """HTTP yanıtı 200 değilse ProviderHTTPError; değilse yanıtın kendisi."""
+    if res.status_code != 200:
+        retry_after = None
+        try:
+            retry_after = float(res.headers.get("retry-after"))
+        except (TypeError, ValueError, AttributeError):
+            pass
+        raise ProviderHTTPError(res.status_code, retry_after)
+    return res
+
+
+def _status(error):
+    # ProviderHTTPError.status_code, google.genai APIError.code
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_rate_limited(error):
+    status = _status(error)
+    if status is not None:
+        return status == 429
+    text = str(error)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text
+
+
+def is_transient(error):
+    """Tekrar denemeye değer hatalar: bağlantı/timeout ve 5xx (429 tekrar denenmez, devreyi açar)."""
+    status = _status(error)
+    if status is not None:
+        return status >= 500
+    return isinstance(error, http_clients.UPSTREAM_ERRORS)
+
+
+def _deadline_expired(retry_state):
+    """tenacity stop koşulu: istek bütçesi dolduysa tekrar deneme."""
+    return deadline.expired()
+
+
+def _hedge_lost(retry_state):
+    """tenacity stop koşulu: bu çağrı hedge yarışını kaybettiyse tekrar deneme."""
+    return hedging.cancelled()
+
+
+class ModelRouter:
+    def __init__(self, prefix="llm_router", alpha=0.3, prior=0.9):
+        self.prefix = prefix
+        self.alpha = alpha
+        self.prior = prior  # hiç denenmemiş modelin varsayılan başarı oranı
+        self._states = {}  # (sağlayıcı, model) -> durum
+        self._synced = {}  # (sağlayıcı, model) -> son senkron (monotonic)
+        self._lock = threading.Lock()
+
+    # -------------------------
+    # STATE
+    # -------------------------
+    def _key(self, provider, model):
+        return f"{self.prefix}:{provider}:{model}"
+
+    @staticmethod
+    def _blank():
+        return {"success": None, "latency_ms": None, "errors": 0, "open_until": 0, "calls": 0}
+
+    def state(self, provider, model):
+        """Process içi durumun kopyası; senkron süresi dolduysa önce paylaşılan cache'le birleştirilir."""
+        key = (provider, model)
+        if time.monotonic() - self._synced.get(key, float("-inf")) >= getattr(settings, "LLM_ROUTER_SYNC_INTERVAL", 10):
+            self.sync(provider, model)
+        with self._lock:
+            return dict(self._states.get(key) or self._blank())
+
+    def sync(self, provider, model):
+        """
+        Paylaşılan durumla birleştir ve geri yaz: devre en geç kapananın
+        süresiyle açık kalır, EWMA'lar ortalanır. Cache hatası sessizce geçilir.
+        """
+        key = (provider, model)
+        self._synced[key] = time.monotonic()
+        try:
+            shared = cache.get(self._key(provider, model))
+        except Exception:
+            shared = None
+        with self._lock:
+            entry = self._states.setdefault(key, self._blank())
+            if shared:
+                entry["open_until"] = max(entry["open_until"], shared.get("open_until", 0))
+                for field in ("success", "latency_ms"):
+                    theirs = shared.get(field)
+                    if theirs is not None:
+                        entry[field] = theirs if entry[field] is None else (entry[field] + theirs) / 2
+            snapshot = {field: entry[field] for field in ("success", "latency_ms", "open_until")}
+        try:
+            cache.set(self._key(provider, model), snapshot, timeout=getattr(settings, "LLM_ROUTER_STATE_TTL", 86400))
+        except Exception as e:
+            print("LLM router state write error:", e)
+
+    def reset(self):
+        """Process içi durumu unutur (testler)."""
+        with self._lock:
+            self._states.clear()
+            self._synced.clear()
+
+    def _ewma(self, old, value):
+        return value if old is None else self.alpha * value + (1 - self.alpha) * old
+
+    def is_open(self, provider, model):
+        return self.state(provider, model)["open_until"] > time.time()
+
+    def _entry(self, provider, model):
+        # self._lock tutulurken çağrılır
+        return self._states.setdefault((provider, model), self._blank())
+
+    def record_success(self, provider, model, elapsed):
+        with self._lock:
+            entry = self._entry(provider, model)
+            entry["calls"] += 1
+            entry["success"] = self._ewma(entry["success"], 1.0)
+            entry["latency_ms"] = self._ewma(entry["latency_ms"], elapsed * 1000)
+            entry["errors"] = 0
+            entry["open_until"] = 0
+
+    def record_failure(self, provider, model, error=None):
+        with self._lock:
+            entry = self._entry(provider, model)
+            entry["calls"] += 1
+            entry["success"] = self._ewma(entry["success"], 0.0)
+            entry["errors"] += 1
+
+            cooldown = 0
+            if error is not None and is_rate_limited(error):
+                cooldown = getattr(error, "retry_after", None) or getattr(settings, "LLM_ROUTER_RATE_LIMIT_COOLDOWN", 60)
+                reason = "rate limited"
+            elif entry["errors"] >= getattr(settings, "LLM_ROUTER_ERROR_THRESHOLD", 3):
+                cooldown = getattr(settings, "LLM_ROUTER_ERROR_COOLDOWN", 30)
+                reason = f"{entry['errors']} consecutive errors"
+            if cooldown:
+                entry["open_until"] = time.time() + cooldown
+        if cooldown:
+            log_ai_event(provider, "circuit_open", f"{model}: {reason}, {cooldown:.0f}s")
+            # Açılan devre diğer worker'lara beklemeden yayılsın
+            self.sync(provider, model)
+
+    # -------------------------
+    # ORDERING
+    # -------------------------
+    def order(self, provider, models):
+        """Devresi kapalı modeller; başarı oranı (0.1 adımlarla), sonra gecikme, sonra verilen sıra."""
+        now = time.time()
+        ranked = []
+        for index, model in enumerate(models):
+            entry = self.state(provider, model)
+            if entry["open_until"] > now:
+                log_ai_event(provider, "skipped", f"{model}: circuit open")
+                continue
+            success = self.prior if entry["success"] is None else entry["success"]
+            latency = entry["latency_ms"] if entry["latency_ms"] is not None else float("inf")
+            ranked.append((-round(success, 1), latency, index, model))
+        ranked.sort()
+        return [model for *_, model in ranked]
+
+    # -------------------------
+    # CALLS
+    # -------------------------
+    def _retry_kwargs(self):
+        return {
+            "retry": retry_if_exception(is_transient),
+            "stop": stop_after_attempt(getattr(settings, "LLM_ROUTER_RETRIES", 1) + 1) | _deadline_expired | _hedge_lost,
+            "wait": wait_random_exponential(
+                multiplier=getattr(settings, "LLM_ROUTER_BACKOFF", 0.25),
+                max=getattr(settings, "LLM_ROUTER_BACKOFF_MAX", 2),
+            ),
+            "reraise": True,
+        }
+
+    def _skip(self, provider, model):
+        if hedging.cancelled():
+            log_ai_event(provider, "skipped", f"{model}: hedge lost")
+            return True
+        if deadline.expired():
+            log_ai_event(provider, "skipped", f"{model}: request deadline exceeded")
+            return True
+        if self.is_open(provider, model):
+            log_ai_event(provider, "skipped", f"{model}: circuit open")
+            return True
+        return False
+
+    def _failed(self, provider, model, error):
+        log_ai_event(provider, "error", f"{model}: {str(error)[:180]}")
+        # Timeout'u isteğin bütçesi kısalttıysa model sağlıksız sayılmaz
+        if not (isinstance(error, http_clients.UPSTREAM_ERRORS) and deadline.expired()):
+            self.record_failure(provider, model, error)
+
+    def call(self, provider, model, fn):
+        """fn() sonucunu döner; hata ya da boş yanıtta None (sonuç her durumda kaydedilir)."""
+        if self._skip(provider, model):
+            return None
+        started = time.monotonic()
+        try:
+            result = Retrying(**self._retry_kwargs())(fn)
+        except Exception as e:
+            self._failed(provider, model, e)
+            return None
+        return self._finish(provider, model, result, started)
+
+    async def acall(self, provider, model, afn):
+        """call'un async karşılığı; afn() bir coroutine döner."""
+        if self._skip(provider, model):
+            return None
+        started = time.monotonic()
+        try:
+            result = await AsyncRetrying(**self._retry_kwargs())(afn)
+        except Exception as e:
+            self._failed(provider, model, e)
+            return None
+        return self._finish(provider, model, result, started)
+
+    def _finish(self, provider, model, result, started):
+        if not result:
+            log_ai_event(provider, "empty", model)
+            self.record_failure(provider, model)
+            return None
+        self.record_success(provider, model, time.monotonic() - started)
+        return result
+
+    def stats(self, candidates):
+        """candidates: {"gemini": [...modeller], ...} -> her model için durum."""
+        now = time.time()
+        return {
+            f"{provider}:{model}": {**entry, "open": entry["open_until"] > now}
+            for provider, models in candidates.items()
+            for model in models
+            for entry in [self.state(provider, model)]
+        }
+
+
+ROUTER = ModelRouter()
@@ -0,0 +1,500 @@
+"""
+Yük testi araçları.
+
+Stand-in sunucular: SerpAPI (search.json), FakeStore (/products), Amadeus
+(token + flight-offers) ve OpenAI uyumlu chat-completions (Groq, OpenRouter)
+formatında yanıt veren yerel HTTP sunucuları. Her upstream ayrı bir portta
+çalışır; gecikme dağılımı (log-normal), 429 ve hata oranları ayarlanabilir.
+
+Harness: sanal kullanıcılar (her biri kendi session cookie'si ile) `/` ve
+`/search_ajax/` uçlarını gerçek Django yığını üzerinden çağırır; throughput
+ve p50/p95/p99 gecikme raporlar.
+
+Kullanım (ayrı süreçler):
+    python manage.py standins --latency 400 --rate-429 0.02
+    # çıktıdaki env satırlarıyla sunucuyu başlat (gunicorn / runserver)
+    python manage.py loadtest --target http://127.0.0.1:8000 --users 50 --duration 60
+
+Ya da tek süreçte: python manage.py loadtest --serve --with-standins
+"""
+
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import requests
+
+
+STANDIN_ORDER = ("serpapi", "fakestore", "amadeus", "groq", "openrouter")
+
+STANDIN_ENV = {
+    "serpapi": "SERPAPI_BASE_URL",
+    "fakestore": "FAKESTORE_BASE_URL",
+    "amadeus": "AMADEUS_BASE_URL",
+    "groq": "GROQ_BASE_URL",
+    "openrouter": "OPENROUTER_BASE_URL",
+}
+
+DEFAULT_QUERIES = [
+    "iphone 15 almak istiyorum",
+    "samsung galaxy s24 fiyatları",
+    "adidas nizza ayakkabı",
+    "sony kablosuz kulaklık öner",
+    "airfryer tavsiye",
+    "merhaba",
+]
+
+
+# -------------------------
+# STAND-IN BEHAVIOUR
+# -------------------------
+class Behavior:
+    """Bir stand-in'in gecikme/hata profili. latency_ms log-normal medyanıdır."""
+
+    def __init__(self, latency_ms=200, sigma=0.5, rate_429=0.0, error_rate=0.0):
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.rate_429 = rate_429
+        self.error_rate = error_rate
+
+    def sample_latency(self, rng):
+        if self.latency_ms <= 0:
+            return 0.0
+        return self.latency_ms * math.exp(self.sigma * rng.gauss(0, 1)) / 1000
+
+    def copy(self, **changes):
+        data = dict(vars(self))
+        data.update(changes)
+        return Behavior(**data)
+
+
+def parse_behaviors(default, overrides=()):
+    """
+    overrides: ["serpapi:latency=900,sigma=0.6,429=0.05,error=0.01", ...]
+    Dönen sözlük her stand-in için bir Behavior içerir.
+    """
+    keys = {"latency": "latency_ms", "sigma": "sigma", "429": "rate_429", "error": "error_rate"}
+    behaviors = {name: default.copy() for name in STANDIN_ORDER}
+    for spec in overrides or ():
+        name, _, body = spec.partition(":")
+        if name not in behaviors:
+            raise ValueError(f"Bilinmeyen upstream: {name}")
+        changes = {}
+        for item in filter(None, body.split(",")):
+            key, _, value = item.partition("=")
+            if key not in keys:
+                raise ValueError(f"Bilinmeyen ayar: {key} ({spec})")
+            changes[keys[key]] = float(value)
+        behaviors[name] = behaviors[name].copy(**changes)
+    return behaviors
+
+
+def add_behavior_arguments(parser):
+    """standins/loadtest komutlarının ortak stand-in seçenekleri."""
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100, help="Stand-in'ler port+1..port+5 kullanır")
+    parser.add_argument("--latency", type=float, default=200, help="Medyan gecikme (ms)")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Log-normal yayılım")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--upstream", action="append", default=[],
+                        help="Upstream bazlı ayar, örn. serpapi:latency=900,429=0.05,error=0.01")
+
+
+def behaviors_from_options(options):
+    default = Behavior(
+        latency_ms=options["latency"],
+        sigma=options["sigma"],
+        rate_429=options["rate_429"],
+        error_rate=options["error_rate"],
+    )
+    return parse_behaviors(default, options["upstream"])
+
+
+# -------------------------
+# STAND-IN PAYLOADS
+# -------------------------
+_serp_payload = None
+
+
+def _serp_body(params):
+    global _serp_payload
+    if _serp_payload is None:
+        from .benchmarks import load_serp_payload
+        _serp_payload = load_serp_payload()
+    return {
+        "search_parameters": {"engine": "google_shopping", "q": params.get("q", "")},
+        "shopping_results": _serp_payload.get("shopping_results", []),
+    }
+
+
+def _fakestore_body():
+    return [
+        {
+            "id": i,
+            "title": title,
+            "price": price,
+            "image": f"https://fakestoreapi.com/img/{i}.jpg",
+            "rating": {"rate": 4.1, "count": 120 + i},
+        }
+        for i, (title, price) in enumerate([
+            ("Mens Cotton Jacket", 55.99),
+            ("Samsung 49-Inch Gaming Monitor", 999.99),
+            ("WD 2TB Elements Portable Hard Drive", 64),
+            ("SanDisk SSD PLUS 1TB", 109),
+            ("Womens Rain Jacket", 39.99),
+        ], start=1)
+    ]
+
+
+def _flight_offers_body(params):
+    origin = params.get("originLocationCode", "IST")
+    destination = params.get("destinationLocationCode", "ESB")
+    date = params.get("departureDate", "2030-01-01")
+    offers = []
+    for i, carrier in enumerate(["TK", "PC", "VF", "XQ"]):
+        hour = 6 + i * 3
+        offers.append({
+            "id": str(i + 1),
+            "validatingAirlineCodes": [carrier],
+            "itineraries": [{
+                "duration": f"PT1H{10 + i * 5}M",
+                "segments": [{
+                    "departure": {"iataCode": origin, "at": f"{date}T{hour:02d}:00:00"},
+                    "arrival": {"iataCode": destination, "at": f"{date}T{hour + 1:02d}:{10 + i * 5}:00"},
+                    "carrierCode": carrier,
+                    "number": str(2100 + i),
+                }],
+            }],
+            "price": {"total": f"{1450 + i * 175}.00", "currency": "TRY"},
+            "travelerPricings": [{"fareDetailsBySegment": [{"cabin": "ECONOMY", "includedCheckedBags": {"weight": 20, "weightUnit": "KG"}}]}],
+        })
+    return {"meta": {"count": len(offers)}, "data": offers}
+
+
+_LAST_MESSAGE = re.compile(r'Kullanıcının son mesajı: "(.*?)"', re.DOTALL)
+
+
+def _chat_body(request_json):
+    messages = request_json.get("messages") or []
+    prompt = messages[-1].get("content", "") if messages else ""
+    match = _LAST_MESSAGE.search(prompt)
+    if match:
+        content = {
+            "intent": "ALISVERIS",
+            "query": match.group(1)[:80],
+            "response": "Sizin için en uygun seçenekleri listeliyorum.",
+        }
+    else:
+        content = {"commentary": "Fiyat/performans açısından ilk sıradaki ürün öne çıkıyor."}
+    return {
+        "id": "standin",
+        "object": "chat.completion",
+        "model": request_json.get("model", "standin"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(content, ensure_ascii=False)}}],
+    }
+
+
+# -------------------------
+# STAND-IN SERVERS
+# -------------------------
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def do_HEAD(self):
+        self._send(200, b"", content_type="text/plain")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        parts = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+
+        with server.lock:
+            delay = server.behavior.sample_latency(server.rng)
+            roll = server.rng.random()
+            server.counters["requests"] += 1
+        time.sleep(delay)
+
+        behavior = server.behavior
+        if roll < behavior.rate_429:
+            server.count("429")
+            return self._send(429, {"error": "rate_limited"}, headers={"Retry-After": "1"})
+        if roll < behavior.rate_429 + behavior.error_rate:
+            server.count("errors")
+            return self._send(500, {"error": "standin_error"})
+
+        body = self._route(server.upstream, self.command, parts.path, params, raw)
+        if body is None:
+            server.count("not_found")
+            return self._send(404, {"error": f"unknown path {parts.path}"})
+        self._send(200, body)
+
+    def _route(self, upstream, method, path, params, raw):
+        if upstream == "serpapi" and path == "/search.json":
+            return _serp_body(params)
+        if upstream == "fakestore" and path == "/products":
+            return _fakestore_body()
+        if upstream == "amadeus" and path == "/v1/security/oauth2/token":
+            return {"access_token": f"standin-{random.getrandbits(32):08x}", "expires_in": 1799}
+        if upstream == "amadeus" and path == "/v2/shopping/flight-offers":
+            return _flight_offers_body(params)
+        if upstream in ("groq", "openrouter") and path.endswith("/chat/completions"):
+            try:
+                request_json = json.loads(raw or b"{}")
+            except ValueError:
+                request_json = {}
+            return _chat_body(request_json)
+        return None
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, upstream, behavior, seed=None):
+        super().__init__(address, StandinHandler)
+        self.upstream = upstream
+        self.behavior = behavior
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "429": 0, "errors": 0, "not_found": 0}
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] += 1
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_standins(behaviors, host="127.0.0.1", base_port=9100, seed=None):
+    """Her upstream için base_port+1, +2, ... portlarında stand-in başlatır."""
+    servers = {}
+    for offset, name in enumerate(STANDIN_ORDER, start=1):
+        port = base_port + offset if base_port else 0
+        server = StandinServer((host, port), name, behaviors[name], seed=seed)
+        threading.Thread(target=server.serve_forever, name=f"standin-{name}", daemon=True).start()
+        servers[name] = server
+    return servers
+
+
+def stop_standins(servers):
+    for server in servers.values():
+        server.shutdown()
+        server.server_close()
+
+
+def standin_env(servers):
+    """Sunucuyu stand-in'lere yönlendiren env değişkenleri."""
+    env = {STANDIN_ENV[name]: server.base_url for name, server in servers.items()}
+    env.update({
+        "SERP_API_KEY": "standin",
+        "AMADEUS_API_KEY": "standin",
+        "AMADEUS_API_SECRET": "standin",
+        "GROQ_API_KEY": "standin",
+        "OPENROUTER_API_KEY": "standin",
+        # Gemini SDK'sı yönlendirilemez; yük testinde kapalı kalmalı
+        "GEMINI_API_KEY": "",
+    })
+    return env
+
+
+def use_standins_in_process(servers):
+    """
+    Bu süreçteki Django'yu stand-in'lere yönlendirir (loadtest --serve için).
+    Taban URL'ler import anında okunduğundan modül sabitleri de güncellenir.
+    """
+    from django.conf import settings
+
+    from flights import services as flight_services
+    from . import ai_service, chat_service, http_clients, utils
+
+    for name, server in servers.items():
+        setattr(settings, STANDIN_ENV[name], server.base_url)
+        http_clients.UPSTREAMS[name] = server.base_url
+    for key, value in standin_env(servers).items():
+        if key.endswith(("_KEY", "_SECRET")):
+            setattr(settings, key, value)
+
+    utils.SERP_API_URL = f"{servers['serpapi'].base_url}/search.json"
+    utils.FAKESTORE_URL = f"{servers['fakestore'].base_url}/products"
+    flight_services.TOKEN_URL = f"{servers['amadeus'].base_url}/v1/security/oauth2/token"
+    flight_services.FLIGHT_URL = f"{servers['amadeus'].base_url}/v2/shopping/flight-offers"
+    for module in (ai_service, chat_service):
+        module.GROQ_URL = f"{servers['groq'].base_url}/openai/v1/chat/completions"
+        module.OPENROUTER_URL = f"{servers['openrouter'].base_url}/api/v1/chat/completions"
+        module.GEMINI_API_KEY = ""
+        module.GROQ_API_KEY = "standin"
+        module.OPENROUTER_API_KEY = "standin"
+
+
+# -------------------------
+# IN-PROCESS DJANGO SERVER
+# -------------------------
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_django(host="127.0.0.1", port=0):
+    """Django WSGI uygulamasını thread'li bir sunucuda arka planda çalıştırır."""
+    from django.core.wsgi import get_wsgi_application
+
+    server = make_server(host, port, get_wsgi_application(),
+                         server_class=_ThreadingWSGIServer, handler_class=_QuietHandler)
+    threading.Thread(target=server.serve_forever, name="loadtest-django", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+# -------------------------
+# HARNESS
+# -------------------------
+def percentile(values, pct):
+    """Nearest-rank yüzdelik."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LoadRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}  # endpoint -> [ms]
+        self.errors = {}
+        self.status_codes = {}
+
+    def record(self, endpoint, elapsed_ms, status):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(elapsed_ms)
+            self.status_codes[str(status)] = self.status_codes.get(str(status), 0) + 1
+            if status == "error" or (isinstance(status, int) and status >= 400):
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, elapsed_s):
+        endpoints = {}
+        total = 0
+        for endpoint, values in self.samples.items():
+            total += len(values)
+            endpoints[endpoint] = {
+                "count": len(values),
+                "errors": self.errors.get(endpoint, 0),
+                "p50_ms": round(percentile(values, 50), 1),
+                "p95_ms": round(percentile(values, 95), 1),
+                "p99_ms": round(percentile(values, 99), 1),
+                "max_ms": round(max(values), 1),
+            }
+        return {
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "elapsed_s": round(elapsed_s, 2),
+            "throughput_rps": round(total / elapsed_s, 2) if elapsed_s else 0.0,
+            "status_codes": self.status_codes,
+            "endpoints": endpoints,
+        }
+
+
+def _timed(recorder, endpoint, call):
+    started = time.perf_counter()
+    try:
+        response = call()
+        status = response.status_code
+    except requests.RequestException:
+        response, status = None, "error"
+    recorder.record(endpoint, (time.perf_counter() - started) * 1000, status)
+    return response
+
+
+def _virtual_user(target, recorder, deadline, queries, think_time, timeout, reset_every, seed):
+    rng = random.Random(seed)
+    session = requests.Session()
+    searches = 0
+
+    def _insecure_cookies():
+        # SESSION/CSRF_COOKIE_SECURE açıkken de düz HTTP üzerinden cookie gönder
+        for cookie in session.cookies:
+            cookie.secure = False
+
+    _timed(recorder, "GET /", lambda: session.get(f"{target}/", timeout=timeout))
+    _insecure_cookies()
+
+    while time.monotonic() < deadline:
+        query = rng.choice(queries)
+        headers = {"X-CSRFToken": session.cookies.get("csrftoken", ""), "Referer": f"{target}/"}
+        _timed(recorder, "POST /search_ajax/", lambda: session.post(
+            f"{target}/search_ajax/", data={"query": query}, headers=headers, timeout=timeout,
+        ))
+        _insecure_cookies()
+        searches += 1
+        if reset_every and searches % reset_every == 0:
+            # Sohbet geçmişi (session) sınırsız büyümesin
+            _timed(recorder, "GET /search_ajax/?new_chat", lambda: session.get(
+                f"{target}/search_ajax/", params={"new_chat": "true"}, timeout=timeout,
+            ))
+        if think_time:
+            time.sleep(rng.uniform(0, 2 * think_time))
+
+
+def run_load(target, users=10, duration=30, queries=None, think_time=0.0, ramp_up=0.0,
+             timeout=60, reset_every=5, seed=0):
+    """`users` sanal kullanıcıyı `duration` saniye çalıştırır ve rapor sözlüğü döner."""
+    target = target.rstrip("/")
+    recorder = LoadRecorder()
+    queries = list(queries or DEFAULT_QUERIES)
+    started = time.monotonic()
+    deadline = started + duration
+
+    threads = []
+    for i in range(users):
+        thread = threading.Thread(
+            target=_virtual_user,
+            args=(target, recorder, deadline, queries, think_time, timeout, reset_every, seed + i),
+            name=f"vu-{i}",
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+        if ramp_up and users > 1:
+            time.sleep(ramp_up / users)
+    for thread in threads:
+        thread.join()
+
+    report = recorder.report(time.monotonic() - started)
+    report.update({"target": target, "users": users, "duration_s": duration})
+    return report
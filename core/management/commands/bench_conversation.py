@@ -0,0 +1,78 @@
+import json
+import platform
+import statistics
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import conversation_turn_costs
+
+
+class Command(BaseCommand):
+    help = (
+        "Sohbet geçmişi tur maliyetini ölçer: geçmişin tamamı session'da (eski) ile "
+        "ChatHistory (mesaj başına satır, ürünler Offer referansı). Sonucu JSON olarak "
+        "kaydeder; ChatHistory kayıt maliyeti geçmiş büyüdükçe artıyorsa hata verir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--turns", type=int, default=100)
+        parser.add_argument("--products", type=int, default=20, help="Tur başına ürün sayısı")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--window", type=int, default=10, help="Baş/son karşılaştırmasındaki tur sayısı")
+        parser.add_argument("--max-growth", type=float, default=3.0,
+                            help="Son turların kayıt medyanı / ilk turlarınki için üst sınır")
+        parser.add_argument("--output", help="Sonuç JSON yolu (varsayılan: benchmarks/results/conversation-<zaman>.json)")
+
+    def handle(self, *args, **options):
+        turns = options["turns"]
+        window = max(1, min(options["window"], turns // 2 or 1))
+        costs = conversation_turn_costs(turns, products_per_turn=options["products"], seed=options["seed"])
+
+        self.stdout.write(f"{'turn':>6} {'legacy':>10} {'load':>10} {'save':>10}")
+        checkpoints = sorted({1, 10, 25, 50, 100, 200, 500, turns} & set(range(1, turns + 1)))
+        for turn in checkpoints:
+            i = turn - 1
+            self.stdout.write(
+                f"{turn:6d} {costs['legacy_ms'][i]:10.2f} {costs['store_load_ms'][i]:10.2f} {costs['store_save_ms'][i]:10.2f}"
+            )
+
+        summary = {}
+        for name, values in costs.items():
+            first = statistics.median(values[:window])
+            last = statistics.median(values[-window:])
+            summary[name] = {
+                "first_median_ms": round(first, 3),
+                "last_median_ms": round(last, 3),
+                "growth": round(last / first, 2) if first else None,
+            }
+            self.stdout.write(f"{name:<14} ilk {window}: {first:.2f}ms, son {window}: {last:.2f}ms (x{summary[name]['growth']})")
+
+        output = self._write_results(options["output"], {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "turns": turns,
+            "products_per_turn": options["products"],
+            "history_limit": getattr(settings, "CHAT_HISTORY_LIMIT", 50),
+            "python": platform.python_version(),
+            "summary": summary,
+            "turn_costs": costs,
+        })
+        self.stdout.write(f"Sonuçlar: {output}")
+
+        growth = summary["store_save_ms"]["growth"]
+        if growth is not None and growth > options["max_growth"]:
+            raise CommandError(
+                f"ChatHistory kayıt maliyeti geçmişle büyüyor: x{growth} > x{options['max_growth']}"
+            )
+
+    def _write_results(self, path, data):
+        if path:
+            output = Path(path)
+        else:
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            output = Path(settings.BASE_DIR) / "benchmarks" / "results" / f"conversation-{stamp}.json"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        return output
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import legacy_deduplicate_products_v2, synthetic_offers
+from core.utils import deduplicate_products_v2
+
+
+class Command(BaseCommand):
+    help = "Dedupe motorunu sentetik tekliflerle ölçer ve eski O(n²) sürümle karşılaştırır."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100,500,1000,5000", help="Virgülle ayrılmış teklif sayıları")
+        parser.add_argument("--legacy-max", type=int, default=1000, help="Eski sürümün çalıştırılacağı en büyük boyut")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options["sizes"].split(",") if s.strip()]
+        self.stdout.write(f"{'offers':>8} {'unique':>8} {'new (ms)':>10} {'legacy (ms)':>12} {'speedup':>8}")
+
+        for size in sizes:
+            offers = synthetic_offers(size, seed=options["seed"])
+
+            started = time.perf_counter()
+            unique = deduplicate_products_v2(offers)
+            new_ms = (time.perf_counter() - started) * 1000
+
+            legacy_ms = None
+            if size <= options["legacy_max"]:
+                started = time.perf_counter()
+                legacy = legacy_deduplicate_products_v2(offers)
+                legacy_ms = (time.perf_counter() - started) * 1000
+                if [p["id"] for p in legacy] != [p["id"] for p in unique]:
+                    raise CommandError(f"Sonuçlar eski sürümle uyuşmuyor (n={size})")
+
+            legacy_txt = f"{legacy_ms:12.1f}" if legacy_ms is not None else f"{'-':>12}"
+            speedup = f"{legacy_ms / max(new_ms, 1e-6):7.1f}x" if legacy_ms is not None else f"{'-':>8}"
+            self.stdout.write(f"{size:>8} {len(unique):>8} {new_ms:10.1f} {legacy_txt} {speedup}")
@@ -0,0 +1,85 @@
+import json
+import platform
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import STAGE_BUDGETS_MS, pipeline_stages, time_stage
+
+
+class Command(BaseCommand):
+    help = (
+        "Ürün pipeline'ının her aşamasını (normalize, relevance, dedupe, sıralama, "
+        "etiketleme, AI cache key, prompt metni, şablon) ayrı ayrı ölçer, sonucu JSON "
+        "olarak kaydeder ve bütçe/baseline aşılırsa hata verir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=1000, help="Sentetik teklif sayısı")
+        parser.add_argument("--repeat", type=int, default=5, help="Aşama başına ölçüm sayısı")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Sonuç JSON yolu (varsayılan: benchmarks/results/pipeline-<zaman>.json)")
+        parser.add_argument("--baseline", help="Karşılaştırılacak önceki sonuç JSON'u")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="Baseline'a göre izin verilen yavaşlama oranı (0.25 = %%25)")
+        parser.add_argument("--budget-scale", type=float, default=1.0,
+                            help="STAGE_BUDGETS_MS çarpanı (yavaş CI makineleri için)")
+
+    def handle(self, *args, **options):
+        size = options["size"]
+        baseline = self._load_baseline(options["baseline"])
+        scale = size / 1000 * options["budget_scale"]
+
+        stages = {}
+        failures = []
+        self.stdout.write(f"{'stage':<26} {'median':>10} {'min':>10} {'budget':>10} {'baseline':>10}")
+        for name, fn in pipeline_stages(size, seed=options["seed"]):
+            timing = time_stage(fn, repeat=options["repeat"])
+            budget = round(STAGE_BUDGETS_MS[name] * scale, 3)
+            timing["budget_ms"] = budget
+            stages[name] = timing
+
+            median = timing["median_ms"]
+            if median > budget:
+                failures.append(f"{name}: {median:.1f}ms > bütçe {budget:.1f}ms")
+
+            base = baseline.get(name)
+            if base is not None and median > base * (1 + options["tolerance"]):
+                failures.append(f"{name}: {median:.1f}ms, baseline {base:.1f}ms (+%{(median / base - 1) * 100:.0f})")
+
+            base_txt = f"{base:10.2f}" if base is not None else f"{'-':>10}"
+            self.stdout.write(f"{name:<26} {median:10.2f} {timing['min_ms']:10.2f} {budget:10.2f} {base_txt}")
+
+        output = self._write_results(options["output"], {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "size": size,
+            "seed": options["seed"],
+            "repeat": options["repeat"],
+            "python": platform.python_version(),
+            "stages": stages,
+        })
+        self.stdout.write(f"Sonuçlar: {output}")
+
+        if failures:
+            raise CommandError("Performans regresyonu:\n  " + "\n  ".join(failures))
+
+    def _load_baseline(self, path):
+        if not path:
+            return {}
+        try:
+            data = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Baseline okunamadı: {e}")
+        return {name: stage["median_ms"] for name, stage in data.get("stages", {}).items()}
+
+    def _write_results(self, path, data):
+        if path:
+            output = Path(path)
+        else:
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            output = Path(settings.BASE_DIR) / "benchmarks" / "results" / f"pipeline-{stamp}.json"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        return output
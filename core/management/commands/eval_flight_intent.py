@@ -0,0 +1,63 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import evaluate_flight_intent, legacy_detect_flight_intent, load_intent_corpus
+from core.intent import detect_flight_intent
+
+
+class Command(BaseCommand):
+    help = (
+        "Uçuş niyeti dedektörünü etiketli TR/EN korpus üzerinde ölçer: precision, recall "
+        "ve çağrı başına gecikme. --legacy ile gazetteer öncesi sürümle karşılaştırır."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", help="JSON Lines korpus (varsayılan: core/data/flight_intent_corpus.jsonl)")
+        parser.add_argument("--repeat", type=int, default=20, help="Gecikme ölçümünde korpus tekrar sayısı")
+        parser.add_argument("--legacy", action="store_true", help="Eski dedektörü de ölç")
+        parser.add_argument("--errors", action="store_true", help="Yanlış sınıflanan sorguları listele")
+        parser.add_argument("--min-precision", type=float, default=0.0)
+        parser.add_argument("--min-recall", type=float, default=0.0)
+        parser.add_argument("--output", help="Sonuçları JSON olarak bu yola yaz")
+
+    def handle(self, *args, **options):
+        rows = load_intent_corpus(options["corpus"])
+        self.stdout.write(f"Korpus: {len(rows)} sorgu ({sum(r['is_flight'] for r in rows)} uçuş)")
+
+        detectors = [("gazetteer", detect_flight_intent)]
+        if options["legacy"]:
+            detectors.append(("legacy", legacy_detect_flight_intent))
+
+        self.stdout.write(f"{'detector':<10} {'lang':<5} {'precision':>9} {'recall':>7} {'f1':>6} {'fp':>4} {'fn':>4}")
+        results = {}
+        for name, detect in detectors:
+            report = results[name] = evaluate_flight_intent(rows, detect, repeat=options["repeat"])
+            for lang, scores in [("all", report), *report["by_lang"].items()]:
+                self.stdout.write(
+                    f"{name:<10} {lang:<5} {scores['precision']:9.3f} {scores['recall']:7.3f} "
+                    f"{scores['f1']:6.3f} {scores['fp']:4d} {scores['fn']:4d}"
+                )
+            latency = report["latency_us"]
+            self.stdout.write(
+                f"{name:<10} gecikme (µs): ort {latency['mean']:.1f}, p50 {latency['p50']:.1f}, "
+                f"p95 {latency['p95']:.1f}, p99 {latency['p99']:.1f}"
+            )
+            if options["errors"]:
+                for error in report["errors"]:
+                    label = "FN" if error["expected"] else "FP"
+                    self.stdout.write(f"  {label} {error['text']}")
+
+        if options["output"]:
+            output = Path(options["output"])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+            self.stdout.write(f"Sonuçlar: {output}")
+
+        current = results["gazetteer"]
+        if current["precision"] < options["min_precision"] or current["recall"] < options["min_recall"]:
+            raise CommandError(
+                f"Eşik altında: precision {current['precision']:.3f} (min {options['min_precision']}), "
+                f"recall {current['recall']:.3f} (min {options['min_recall']})"
+            )
@@ -0,0 +1,98 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Sanal kullanıcılarla / ve /search_ajax/ uçlarına yük bindirir; throughput ve "
+        "p50/p95/p99 gecikme raporlar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", help="Test edilecek sunucu, örn. http://127.0.0.1:8000")
+        parser.add_argument("--serve", action="store_true", help="Django'yu bu süreçte thread'li WSGI sunucusunda çalıştır")
+        parser.add_argument("--with-standins", action="store_true", help="Stand-in upstream'leri bu süreçte başlat")
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--duration", type=float, default=30, help="Saniye")
+        parser.add_argument("--ramp-up", type=float, default=0, help="Kullanıcıların bu sürede kademeli başlaması (sn)")
+        parser.add_argument("--think-time", type=float, default=0, help="İstekler arası ortalama bekleme (sn)")
+        parser.add_argument("--timeout", type=float, default=60)
+        parser.add_argument("--queries", help="Her satırı bir kullanıcı mesajı olan dosya")
+        parser.add_argument("--output", help="Raporu JSON olarak yaz")
+        loadtest.add_behavior_arguments(parser)
+
+    def handle(self, *args, **options):
+        if not options["target"] and not options["serve"]:
+            raise CommandError("--target ya da --serve gerekli")
+
+        servers = {}
+        if options["with_standins"]:
+            try:
+                behaviors = loadtest.behaviors_from_options(options)
+            except ValueError as e:
+                raise CommandError(str(e))
+            servers = loadtest.start_standins(behaviors, host=options["host"], base_port=options["port"])
+            for name, server in servers.items():
+                self.stdout.write(f"stand-in {name:<11} {server.base_url}")
+
+        django_server = None
+        target = options["target"]
+        if options["serve"]:
+            if servers:
+                loadtest.use_standins_in_process(servers)
+            # Test düz HTTP üzerinden; güvenli cookie'ler tarayıcı dışı istemcide sorun çıkarmasın
+            settings.SESSION_COOKIE_SECURE = False
+            settings.CSRF_COOKIE_SECURE = False
+            django_server, target = loadtest.serve_django(host=options["host"])
+            self.stdout.write(f"Django        {target}")
+
+        queries = None
+        if options["queries"]:
+            lines = Path(options["queries"]).read_text(encoding="utf-8").splitlines()
+            queries = [line.strip() for line in lines if line.strip()]
+
+        self.stdout.write(f"{options['users']} kullanıcı, {options['duration']:.0f} sn -> {target}")
+        try:
+            report = loadtest.run_load(
+                target,
+                users=options["users"],
+                duration=options["duration"],
+                queries=queries,
+                think_time=options["think_time"],
+                ramp_up=options["ramp_up"],
+                timeout=options["timeout"],
+            )
+        finally:
+            if django_server is not None:
+                django_server.shutdown()
+            if servers:
+                report_upstreams = {name: dict(server.counters) for name, server in servers.items()}
+                loadtest.stop_standins(servers)
+            else:
+                report_upstreams = {}
+
+        report["upstreams"] = report_upstreams
+        self._print_report(report)
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+            self.stdout.write(f"Rapor: {options['output']}")
+
+    def _print_report(self, report):
+        self.stdout.write(
+            f"\n{report['requests']} istek, {report['errors']} hata, {report['elapsed_s']} sn, "
+            f"{report['throughput_rps']} istek/sn"
+        )
+        self.stdout.write(f"{'endpoint':<30} {'count':>7} {'err':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+        for endpoint, s in report["endpoints"].items():
+            self.stdout.write(
+                f"{endpoint:<30} {s['count']:>7} {s['errors']:>5} {s['p50_ms']:>9.1f} "
+                f"{s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f} {s['max_ms']:>9.1f}"
+            )
+        if report.get("upstreams"):
+            for name, counters in report["upstreams"].items():
+                self.stdout.write(f"upstream {name:<11} {counters}")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.conversations import prune
+
+
+class Command(BaseCommand):
+    help = (
+        "Son mesajı CHAT_RETENTION_DAYS günden eski sohbetleri ve hiçbir mesajın "
+        "referans vermediği Offer kayıtlarını siler (cron ile çalıştırılır)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Saklama süresi (varsayılan: settings.CHAT_RETENTION_DAYS)")
+
+    def handle(self, *args, **options):
+        deleted = prune(days=options["days"])
+        self.stdout.write(f"Silinen sohbet: {deleted['conversations']}, silinen teklif: {deleted['offers']}")
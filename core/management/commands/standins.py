@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.loadtest import add_behavior_arguments, behaviors_from_options, standin_env, start_standins, stop_standins
+
+
+class Command(BaseCommand):
+    help = "SerpAPI, FakeStore, Amadeus, Groq ve OpenRouter için yerel stand-in sunucuları başlatır."
+
+    def add_arguments(self, parser):
+        add_behavior_arguments(parser)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            behaviors = behaviors_from_options(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        servers = start_standins(behaviors, host=options["host"], base_port=options["port"], seed=options["seed"])
+        for name, server in servers.items():
+            b = server.behavior
+            self.stdout.write(
+                f"{name:<11} {server.base_url}  latency={b.latency_ms:.0f}ms sigma={b.sigma} "
+                f"429={b.rate_429} error={b.error_rate}"
+            )
+        self.stdout.write("\nSunucuyu şu env ile başlatın:")
+        for key, value in standin_env(servers).items():
+            self.stdout.write(f"export {key}={value}")
+
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for name, server in servers.items():
+                self.stdout.write(f"{name:<11} {server.counters}")
+            stop_standins(servers)
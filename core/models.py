@@ -1,3 +1,41 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class Conversation(models.Model):
+    """Bir sohbet. Session'da yalnızca id'si tutulur (bkz. core/conversations.py)."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Mesaj dışı sohbet durumu: flight_results, flight_form_data, show_flight_section...
+    state = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class Offer(models.Model):
+    """
+    Ürün kaydı (Product.to_dict(), id ve tags hariç). Başlık/mağaza/link/fiyat
+    hash'iyle adreslenir; aynı teklif kaç mesajda/sohbette geçerse geçsin bir
+    kez saklanır. id ve tags sonuç setine özgüdür, Message.extra'da tutulur.
+    """
+
+    key = models.CharField(max_length=40, primary_key=True)
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class Message(models.Model):
+    conversation = models.ForeignKey(Conversation, related_name="messages", on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+    role = models.CharField(max_length=16)
+    content = models.TextField(blank=True)
+    # Offer.key listeleri (sıralı)
+    product_keys = models.JSONField(default=list, blank=True)
+    compare_keys = models.JSONField(default=list, blank=True)
+    # Diğer mesaj alanları: ai_summary, compare_ai_summary, ürünlerin id/tags'i...
+    extra = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["position", "id"]
+        indexes = [models.Index(fields=["conversation", "position"])]
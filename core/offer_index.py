@@ -0,0 +1,206 @@
+"""
+Yerel teklif indeksi (L3 ürün cache'i).
+
+CACHE (L1/L2) ham SerpAPI payload'ını normalize sorgu başına PRODUCT_CACHE_TTL
+kadar tutar; süre dolunca o teklifler kaybolurdu. Artık her başarılı SerpAPI
+yanıtındaki teklifler tek transaction'da ayrı bir SQLite dosyasındaki FTS5
+indeksine (başlık, mağaza, fiyat, zaman) yazılır. get_all_products bir sorgu
+için indekste yeterince taze eşleşme bulursa SerpAPI'ye hiç gitmez:
+
+    "iphone 15"            -> SerpAPI (indeks boş), teklifler indekslenir
+    "iphone 15 pro max"    -> indeksten, milisaniyeler içinde
+    "iphone 15 siyah 128"  -> indeksten (long-tail)
+
+Eşleşme: sorgudaki tüm token'lar başlıkta (önek eşleşmesi) geçmeli, bm25'e
+göre sıralanır; OFFER_INDEX_MAX_AGE'den eski teklifler kullanılmaz ve silinir.
+İndeks yalnızca bir hızlandırmadır: FTS5 yoksa ya da SQLite hatası olursa
+sessizce devre dışı kalır, arama SerpAPI'ye düşer.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from .products import Product, normalize_title
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS offers (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    merchant TEXT NOT NULL,
+    price REAL,
+    indexed_at REAL NOT NULL,
+    product TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS offers_indexed_at ON offers(indexed_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS offers_fts USING fts5(
+    title, merchant, content='offers', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS offers_ai AFTER INSERT ON offers BEGIN
+    INSERT INTO offers_fts(rowid, title, merchant) VALUES (new.id, new.title, new.merchant);
+END;
+CREATE TRIGGER IF NOT EXISTS offers_ad AFTER DELETE ON offers BEGIN
+    INSERT INTO offers_fts(offers_fts, rowid, title, merchant) VALUES ('delete', old.id, old.title, old.merchant);
+END;
+CREATE TRIGGER IF NOT EXISTS offers_au AFTER UPDATE ON offers BEGIN
+    INSERT INTO offers_fts(offers_fts, rowid, title, merchant) VALUES ('delete', old.id, old.title, old.merchant);
+    INSERT INTO offers_fts(rowid, title, merchant) VALUES (new.id, new.title, new.merchant);
+END;
+"""
+
+UPSERT = """
+INSERT INTO offers (key, title, merchant, price, indexed_at, product) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(key) DO UPDATE SET
+    title = excluded.title, merchant = excluded.merchant, price = excluded.price,
+    indexed_at = excluded.indexed_at, product = excluded.product
+"""
+
+SEARCH = """
+SELECT o.product FROM offers_fts JOIN offers o ON o.id = offers_fts.rowid
+WHERE offers_fts MATCH ? AND o.indexed_at >= ?
+ORDER BY rank LIMIT ?
+"""
+
+# _shape_results compare modunda en fazla bu kadar farklı mağaza gösterir
+COMPARE_MERCHANTS = 5
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "indexed": 0, "errors": 0}
+
+
+def enabled():
+    return getattr(settings, "OFFER_INDEX_ENABLED", False)
+
+
+def max_age():
+    return getattr(settings, "OFFER_INDEX_MAX_AGE", 6 * 3600)
+
+
+def min_matches():
+    return getattr(settings, "OFFER_INDEX_MIN_MATCHES", 8)
+
+
+def index_path():
+    return str(getattr(settings, "OFFER_INDEX_PATH", Path(settings.BASE_DIR) / "offer_index.sqlite3"))
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+# -------------------------
+# CONNECTION
+# -------------------------
+def _connection():
+    """Thread başına bir bağlantı (sqlite3 bağlantıları thread'ler arası paylaşılmaz)."""
+    path = index_path()
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        connections[path] = conn
+    return conn
+
+
+def close():
+    """Bu thread'in bağlantılarını kapatır (testler, dosya silinmeden önce)."""
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
+
+
+def offer_key(product):
+    """Aynı mağazadaki aynı başlık tek satırdır; yeni fiyat eskisinin üzerine yazılır."""
+    raw = f"{product.site.lower()}|{product.norm_title}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _match_expression(query):
+    terms = []
+    for token in normalize_title(query or "").split():
+        if len(token) < 2:
+            continue
+        # "15" "150"ye uymasın; kelimelerde önek eşleşmesi (çekim ekleri için)
+        terms.append(f'"{token}"' if token.isdigit() else f'"{token}"*')
+    return " AND ".join(terms)
+
+
+# -------------------------
+# WRITE / READ
+# -------------------------
+def index_offers(products, now=None):
+    """Ürünleri tek transaction'da indeksler; eskimiş teklifleri siler. Yazılan sayı."""
+    if not enabled() or not products:
+        return 0
+    now = time.time() if now is None else now
+    rows = [
+        (offer_key(p), p.norm_title, p.site, p.price_value, now,
+         json.dumps(p.to_dict(), ensure_ascii=False, default=str))
+        for p in products if p.norm_title
+    ]
+    try:
+        conn = _connection()
+        with conn:
+            conn.executemany(UPSERT, rows)
+            conn.execute("DELETE FROM offers WHERE indexed_at < ?", (now - max_age(),))
+    except sqlite3.Error as e:
+        _count("errors")
+        print("Offer index error:", e)
+        return 0
+    _count("indexed", len(rows))
+    return len(rows)
+
+
+def search(query, limit=40, now=None):
+    """Sorgunun tüm token'larını içeren taze teklifler (bm25 sırasıyla)."""
+    expression = _match_expression(query)
+    if not enabled() or not expression:
+        return []
+    now = time.time() if now is None else now
+    try:
+        rows = _connection().execute(SEARCH, (expression, now - max_age(), limit)).fetchall()
+    except sqlite3.Error as e:
+        _count("errors")
+        print("Offer index error:", e)
+        return []
+    return [Product.from_dict(json.loads(row[0])) for row in rows]
+
+
+def lookup(query, compare_mode=False):
+    """
+    İndeks sorguyu tek başına karşılayabiliyorsa Product listesi, yoksa None.
+    Normal modda en az OFFER_INDEX_MIN_MATCHES teklif, compare modunda ayrıca
+    COMPARE_MERCHANTS farklı mağaza gerekir.
+    """
+    if not enabled():
+        return None
+    products = search(query)
+    enough = len(products) >= min_matches()
+    if enough and compare_mode:
+        enough = len({p.site for p in products if p.site}) >= COMPARE_MERCHANTS
+    if not enough:
+        _count("misses")
+        return None
+    _count("hits")
+    print(f"🗂️ İNDEKSTEN GELDİ: {query} ({len(products)} teklif)")
+    return products
@@ -0,0 +1,107 @@
+"""
+Kompakt ürün kaydı.
+
+Her ürün SerpAPI/FakeStore payload'ından bir kez oluşturulur; normalize
+başlık, token seti ve sayısal fiyat/puan/yorum değerleri o anda hesaplanır.
+Dedupe, sıralama, etiketleme ve şablonlar bu alanları tekrar hesaplamadan
+kullanır. Session'a yazarken to_dict() kullanılır.
+"""
+
+import re
+
+
+def normalize_title(title):
+    text = title.lower()
+    text = re.sub(r"[^a-z0-9çğıöşü ]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+# -------------------------
+# PRICE & RATING PARSERS
+# -------------------------
+def parse_price(price_str):
+    if not price_str:
+        return None
+    cleaned = re.sub(r"[^\d.,]", "", str(price_str))
+    cleaned = cleaned.replace(",", ".")
+    try:
+        return float(cleaned)
+    except:
+        return None
+
+
+def parse_rating(r):
+    if isinstance(r, str):
+        mapping = {"five": 5, "four": 4, "three": 3, "two": 2, "one": 1}
+        r_lower = r.lower()
+        if r_lower in mapping: return mapping[r_lower]
+        return parse_price(r) or 0
+    return float(r) if r else 0
+
+
+def parse_review_count(rev):
+    if isinstance(rev, str):
+        cleaned = re.sub(r"[^\d]", "", rev)
+        return int(cleaned) if cleaned else 0
+    return int(rev) if rev else 0
+
+
+class Product:
+    # Şablon/session'a giden alanlar
+    FIELDS = (
+        "id", "title", "price", "image", "images", "brand", "rating", "review_count",
+        "reviews", "site", "site_color", "delivery_info", "positive_ratio",
+        "review_summary", "description", "link", "tags",
+    )
+
+    __slots__ = FIELDS + (
+        # Oluşturulurken bir kez hesaplananlar
+        "norm_title", "tokens", "price_value", "rating_value", "review_value",
+        "sort_priority",
+    )
+
+    def __init__(self, id, title, price="Fiyat yok", image=None, images=None, brand="",
+                 rating=0, review_count=0, reviews=None, site="", site_color="warning",
+                 delivery_info="", positive_ratio=0, review_summary="", description="",
+                 link="#", tags=None):
+        self.id = id
+        self.title = title or ""
+        self.price = price
+        self.image = image
+        self.images = images or []
+        self.brand = brand
+        self.rating = rating
+        self.review_count = review_count
+        self.reviews = reviews or []
+        self.site = site or ""
+        self.site_color = site_color
+        self.delivery_info = delivery_info
+        self.positive_ratio = positive_ratio
+        self.review_summary = review_summary
+        self.description = description
+        self.link = link
+        self.tags = list(tags) if tags else []
+
+        self.norm_title = normalize_title(self.title)
+        self.tokens = frozenset(self.norm_title.split())
+        self.price_value = parse_price(price)
+        self.rating_value = parse_rating(rating)
+        self.review_value = parse_review_count(review_count)
+        self.sort_priority = 99
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{k: data[k] for k in cls.FIELDS if k in data})
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    def get(self, key, default=None):
+        """dict tabanlı eski kodla uyumluluk için."""
+        if key in self.FIELDS:
+            return getattr(self, key)
+        return default
+
+    def __repr__(self):
+        return f"<Product {self.id}: {self.title[:40]}>"
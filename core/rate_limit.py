@@ -0,0 +1,146 @@
+"""
+İstek hızı sınırlayıcı (GCRA / token bucket).
+
+Her çağrı sıradaki boş slotu rezerve eder ve o slota kadar bekler; böylece
+kaç thread ya da task aynı anda çağırırsa çağırsın saniyede `rate` isteği
+(en fazla `burst` kadar ani) geçilmez. Bekleme aktif deadline'ı aşacaksa
+hiç beklenmez, DeadlineExceeded atılır (rezerve edilen slot harcanır; sınır
+hiçbir durumda aşılmaz).
+
+Bütçe tüm worker'lar için geçerlidir:
+  - `name` verilmiş ve paylaşılan cache atomik incr destekliyorsa (Redis,
+    Memcached) slotlar cache'te pencere başına sayaçla (add + incr) dağıtılır;
+    tüm process'ler toplamda `rate`'i aşmaz.
+  - Aksi halde (locmem/file/db cache ya da cache hatası) process içi GCRA
+    kullanılır ve bütçe `workers`'a bölünür: her worker rate / workers.
+
+    AMADEUS_LIMITER = RateLimiter(10, name="amadeus", workers=4)
+    AMADEUS_LIMITER.throttle()          # sync
+    await AMADEUS_LIMITER.athrottle()   # async
+"""
+
+import asyncio
+import math
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.memcached import BaseMemcachedCache
+from django.core.cache.backends.redis import RedisCache
+
+from . import deadline
+
+
+# incr'i process'ler arası atomik olan backend'ler
+ATOMIC_BACKENDS = (RedisCache, BaseMemcachedCache)
+
+
+class RateLimiter:
+    # Paylaşılan modda en fazla bu kadar pencere ileriye slot aranır
+    MAX_LOOKAHEAD = 60
+
+    def __init__(self, rate, burst=1, name=None, backend="default", workers=1):
+        self.rate = rate
+        self.burst = max(1, int(burst))
+        self.name = name
+        self.backend = backend
+        self.workers = max(1, int(workers))
+        self._lock = threading.Lock()
+        self._next = 0.0  # sıradaki isteğin teorik varış zamanı (monotonic)
+        self.waited = 0.0
+        self.calls = 0
+        self.shared_errors = 0
+
+    # -------------------------
+    # RESERVE
+    # -------------------------
+    def _shared_cache(self):
+        if not self.name:
+            return None
+        cache = caches[self.backend]
+        return cache if isinstance(cache, ATOMIC_BACKENDS) else None
+
+    def reserve(self):
+        """Bir slot ayırır; o slota kadar beklenmesi gereken süre (sn)."""
+        if not self.rate or self.rate <= 0:
+            return 0.0
+        shared = self._shared_cache()
+        if shared is not None:
+            try:
+                delay = self._reserve_shared(shared)
+            except deadline.DeadlineExceeded:
+                raise
+            except Exception:
+                with self._lock:
+                    self.shared_errors += 1
+            else:
+                with self._lock:
+                    self.calls += 1
+                    self.waited += delay
+                return delay
+        return self._reserve_local()
+
+    def _reserve_local(self):
+        interval = self.workers / self.rate
+        with self._lock:
+            now = time.monotonic()
+            arrival = max(self._next, now)
+            delay = max(0.0, arrival - (self.burst - 1) * interval - now)
+            self._next = arrival + interval
+            self.calls += 1
+            self.waited += delay
+        return delay
+
+    def _reserve_shared(self, cache):
+        """
+        Sabit pencereler (en az 1 sn): her pencerede en fazla `capacity` slot.
+        Pencere doluysa bir sonrakine geçilir; zamanlar duvar saatiyle
+        (time.time) hesaplanır çünkü tüm process'lerde aynı olmalıdır.
+        """
+        window = max(1.0, 1.0 / self.rate)
+        capacity = max(1, math.floor(self.rate * window))
+        ttl = int(window * (self.MAX_LOOKAHEAD + 2))
+        now = time.time()
+        slot = int(now // window)
+        for _ in range(self.MAX_LOOKAHEAD):
+            key = f"ratelimit:{self.name}:{slot}"
+            cache.add(key, 0, timeout=ttl)
+            if cache.incr(key) <= capacity:
+                return max(0.0, slot * window - now)
+            slot += 1
+        raise deadline.DeadlineExceeded(f"rate limit {self.name}: no slot in the next {self.MAX_LOOKAHEAD} windows")
+
+    # -------------------------
+    # WAIT
+    # -------------------------
+    def _check_deadline(self, delay):
+        left = deadline.remaining()
+        if left is not None and delay > left - deadline.min_call():
+            raise deadline.DeadlineExceeded(f"rate limit wait {delay:.2f}s exceeds request deadline")
+
+    def throttle(self):
+        delay = self.reserve()
+        if delay:
+            self._check_deadline(delay)
+            time.sleep(delay)
+        return delay
+
+    async def athrottle(self):
+        if self._shared_cache() is not None:
+            # Cache'e ağ üzerinden gidilir; event loop bloklanmasın
+            delay = await sync_to_async(self.reserve, thread_sensitive=False)()
+        else:
+            delay = self.reserve()
+        if delay:
+            self._check_deadline(delay)
+            await asyncio.sleep(delay)
+        return delay
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate": self.rate, "burst": self.burst, "calls": self.calls, "waited": round(self.waited, 3),
+                "shared": self._shared_cache() is not None, "workers": self.workers,
+                "shared_errors": self.shared_errors,
+            }
@@ -0,0 +1,234 @@
+"""
+Upstream record/replay (SerpAPI, FakeStore, Amadeus, Gemini, Groq, OpenRouter).
+
+settings.UPSTREAM_REPLAY_MODE:
+  "off"    - normal çalışma (varsayılan)
+  "record" - gerçek çağrı yapılır, yanıt fixture store'a yazılır
+  "replay" - ağa çıkılmaz; yanıt fixture'dan döner, yoksa ReplayMiss
+
+Fixture store (settings.UPSTREAM_FIXTURE_DIR), içerik adresli:
+  index/<istek-hash>.json  -> {"upstream", "request", "status", "content_type", "body": <gövde-hash>}
+  blobs/<gövde-hash>.gz    -> gzip'li yanıt gövdesi (aynı gövde bir kez saklanır)
+
+İstek hash'i method + URL + params/json/data üzerinden alınır. api_key,
+client_secret gibi gizli alanlar hash'e ve kayda girmez; fixture'lar
+anahtarsız bir makinede de eşleşir. Replay'de sağlayıcılar hâlâ anahtar
+kontrolü yaptığı için sahte anahtarlar (SERP_API_KEY=x vb.) yeterlidir.
+
+settings.UPSTREAM_REPLAY_LATENCY: replay'de yanıt başına yapay gecikme (sn).
+Tek sayı, [min, max] aralığı ya da upstream bazlı sözlük olabilir:
+  {"serpapi": [0.6, 1.2], "gemini": 1.5, "default": 0.1}
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+import requests
+from django.conf import settings
+
+
+SECRET_FIELDS = {"api_key", "apikey", "key", "client_id", "client_secret", "access_token", "token"}
+
+_lock = threading.Lock()
+_stats = {"recorded": 0, "replayed": 0, "misses": 0}
+
+
+class ReplayMiss(requests.ConnectionError):
+    """Replay modunda fixture yok; çağıranlar bunu bağlantı hatası gibi ele alır."""
+
+
+def mode():
+    value = (getattr(settings, "UPSTREAM_REPLAY_MODE", "off") or "off").lower()
+    return value if value in ("record", "replay") else "off"
+
+
+def fixture_dir():
+    return Path(getattr(settings, "UPSTREAM_FIXTURE_DIR", Path(settings.BASE_DIR) / "fixtures" / "upstream"))
+
+
+def _redact(data):
+    if isinstance(data, dict):
+        return {k: ("<redacted>" if str(k).lower() in SECRET_FIELDS else _redact(v)) for k, v in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_redact(v) for v in data]
+    return data
+
+
+def describe_request(method, url, kwargs):
+    """Hash'lenecek, gizli alanları ayıklanmış istek tanımı."""
+    parts = urlsplit(url)
+    params = dict(parse_qsl(parts.query))
+    extra = kwargs.get("params") or {}
+    params.update(dict(extra.items() if isinstance(extra, dict) else extra))
+    return _redact({
+        "method": method.upper(),
+        "url": urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")),
+        "params": {str(k): str(v) for k, v in params.items()},
+        "json": kwargs.get("json"),
+        "data": kwargs.get("data"),
+    })
+
+
+def request_key(upstream, description):
+    canonical = json.dumps([upstream, description], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _load(key):
+    root = fixture_dir()
+    try:
+        meta = json.loads((root / "index" / f"{key}.json").read_text(encoding="utf-8"))
+        with gzip.open(root / "blobs" / f"{meta['body']}.gz", "rb") as f:
+            return meta, f.read()
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _store(key, upstream, description, status, content_type, body):
+    root = fixture_dir()
+    body_hash = hashlib.sha256(body).hexdigest()
+    blob = root / "blobs" / f"{body_hash}.gz"
+    if not blob.exists():
+        _write_atomic(blob, gzip.compress(body, mtime=0))
+    meta = {
+        "upstream": upstream,
+        "request": description,
+        "status": status,
+        "content_type": content_type,
+        "body": body_hash,
+    }
+    _write_atomic(root / "index" / f"{key}.json", json.dumps(meta, ensure_ascii=False, indent=1).encode("utf-8"))
+    with _lock:
+        _stats["recorded"] += 1
+
+
+def _latency(upstream):
+    value = getattr(settings, "UPSTREAM_REPLAY_LATENCY", 0) or 0
+    if isinstance(value, dict):
+        value = value.get(upstream, value.get("default", 0))
+    if isinstance(value, (list, tuple)):
+        value = random.uniform(*value)
+    return float(value or 0)
+
+
+def _lookup(upstream, key):
+    meta, body = _load(key)
+    if meta is None:
+        with _lock:
+            _stats["misses"] += 1
+        raise ReplayMiss(f"No {upstream} fixture for request {key[:12]}")
+    with _lock:
+        _stats["replayed"] += 1
+    return meta, body
+
+
+def _replay(upstream, key):
+    meta, body = _lookup(upstream, key)
+    delay = _latency(upstream)
+    if delay > 0:
+        time.sleep(delay)
+    return meta, body
+
+
+async def _areplay(upstream, key):
+    meta, body = _lookup(upstream, key)
+    delay = _latency(upstream)
+    if delay > 0:
+        await asyncio.sleep(delay)
+    return meta, body
+
+
+def _build_response(method, url, meta, body):
+    response = requests.Response()
+    response.status_code = meta["status"]
+    response._content = body
+    response.headers["Content-Type"] = meta.get("content_type") or "application/json"
+    response.encoding = "utf-8"
+    response.url = url
+    response.request = requests.Request(method, url).prepare()
+    return response
+
+
+def http_request(upstream, method, url, kwargs, live):
+    """
+    HTTP çağrısını mode()'a göre kaydet/oynat. live() gerçek isteği yapar;
+    requests.Response ve httpx.Response aynı alanlarla okunur.
+    5xx yanıtlar geçici kabul edilir ve kaydedilmez.
+    """
+    description = describe_request(method, url, kwargs)
+    key = request_key(upstream, description)
+
+    if mode() == "replay":
+        meta, body = _replay(upstream, key)
+        return _build_response(method, url, meta, body)
+
+    response = live()
+    if mode() == "record" and response.status_code < 500:
+        _store(key, upstream, description, response.status_code,
+               response.headers.get("content-type", ""), response.content)
+    return response
+
+
+async def ahttp_request(upstream, method, url, kwargs, alive):
+    """http_request'in async karşılığı; alive() bir coroutine döner."""
+    description = describe_request(method, url, kwargs)
+    key = request_key(upstream, description)
+
+    if mode() == "replay":
+        meta, body = await _areplay(upstream, key)
+        return _build_response(method, url, meta, body)
+
+    response = await alive()
+    if mode() == "record" and response.status_code < 500:
+        _store(key, upstream, description, response.status_code,
+               response.headers.get("content-type", ""), response.content)
+    return response
+
+
+def call(upstream, description, live):
+    """SDK tabanlı (HTTP dışı) çağrılar için: live() bir metin ya da None döner."""
+    description = _redact(description)
+    key = request_key(upstream, description)
+
+    if mode() == "replay":
+        _, body = _replay(upstream, key)
+        return body.decode("utf-8")
+
+    text = live()
+    if mode() == "record" and text is not None:
+        _store(key, upstream, description, 200, "text/plain; charset=utf-8", text.encode("utf-8"))
+    return text
+
+
+async def acall(upstream, description, alive):
+    description = _redact(description)
+    key = request_key(upstream, description)
+
+    if mode() == "replay":
+        _, body = await _areplay(upstream, key)
+        return body.decode("utf-8")
+
+    text = await alive()
+    if mode() == "record" and text is not None:
+        _store(key, upstream, description, 200, "text/plain; charset=utf-8", text.encode("utf-8"))
+    return text
+
+
+def stats():
+    with _lock:
+        return {"mode": mode(), "fixture_dir": str(fixture_dir()), **_stats}
@@ -0,0 +1,111 @@
+"""
+Aynı anahtar için eşzamanlı hesaplamaları tek bir çağrıya indirger.
+
+Process içinde: ilk gelen (leader) hesaplar, diğerleri onun sonucunu bekler.
+Worker'lar arasında: leader paylaşılan cache'te `add` ile kilit alır; kilidi
+alamayan worker sonucun cache'e düşmesini bekler (lookup ile yoklar).
+"""
+
+import hashlib
+import threading
+import time
+import uuid
+
+from django.core.cache import caches
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name, backend="default", lock_ttl=30, poll_interval=0.1):
+        self.name = name
+        self.backend = backend
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, lookup=None):
+        """
+        fn(): sonucu üretir (sadece leader çağırır).
+        lookup(): başka bir worker'ın ürettiği sonucu paylaşılan cache'ten okur;
+        verilmezse sadece process içi birleştirme yapılır.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._lead(key, fn, lookup)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _lead(self, key, fn, lookup):
+        if lookup is None:
+            return fn()
+
+        digest = hashlib.md5(str(key).encode("utf-8")).hexdigest()
+        lock_key = f"singleflight:{self.name}:{digest}"
+        token = uuid.uuid4().hex
+        shared = caches[self.backend]
+
+        try:
+            acquired = shared.add(lock_key, token, timeout=self.lock_ttl)
+        except Exception:
+            acquired = True  # cache erişilemiyorsa yerelde hesapla
+
+        if acquired:
+            try:
+                return fn()
+            finally:
+                try:
+                    if shared.get(lock_key) == token:
+                        shared.delete(lock_key)
+                except Exception:
+                    pass
+
+        # Başka bir worker hesaplıyor: sonucunu bekle
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = lookup()
+            if value is not None:
+                with self._lock:
+                    self.coalesced += 1
+                return value
+            try:
+                if shared.get(lock_key) is None:
+                    break  # leader sonuç bırakmadan bitti
+            except Exception:
+                break
+        return fn()
+
+    def stats(self):
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._calls)}
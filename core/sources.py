@@ -0,0 +1,267 @@
+"""
+Product source registry: every primary source runs concurrently within one
+latency budget. Fallback sources start only when the primaries come back
+short or are still running at PRODUCT_FALLBACK_AFTER. Calls still running
+when the budget ends are abandoned; a source with too many of them is
+skipped until they finish.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+
+from . import deadline
+
+
+DEFAULT_SEARCH_BUDGET = 12  # saniye, tüm kaynaklar için toplam bekleme
+DEFAULT_MIN_RESULTS = 5
+DEFAULT_FALLBACK_AFTER = 4  # saniye; birincil kaynaklar hâlâ sürüyorsa yedekler başlar
+DEFAULT_MAX_STRAGGLERS = 4  # kaynak başına bütçeyi aşıp arka planda süren çağrı sınırı
+
+
+class ProductSource:
+    """
+    Tek bir ürün kaynağı.
+
+    fetch(query, timeout=...) -> list[dict]
+    afetch(query, timeout=...) -> coroutine, list[dict] (opsiyonel; yoksa
+    async yolda fetch bir thread'de çalıştırılır)
+    fallback=True olan kaynaklar yalnızca birincil kaynaklar yetersiz
+    kaldığında (min_results altı) ya da PRODUCT_FALLBACK_AFTER dolduğunda
+    başlatılır; sonuçları yine yalnızca birincil sonuçlar yetersizse eklenir.
+    """
+
+    def __init__(self, name, fetch, timeout=10, max_concurrency=8, fallback=False, afetch=None):
+        self.name = name
+        self.fetch = fetch
+        self.afetch = afetch
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.fallback = fallback
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._aslots = {}  # id(loop) -> asyncio.Semaphore
+        self._lock = threading.Lock()
+        self.stragglers = 0  # bütçe dolduğunda hâlâ süren (terk edilmiş) çağrılar
+
+    def _timeout(self, timeout):
+        return self.timeout if timeout is None else min(self.timeout, timeout)
+
+    def run(self, query, timeout=None):
+        timeout = self._timeout(timeout)
+        # Kaynak doluysa en fazla timeout kadar sıra bekle
+        if not self._slots.acquire(timeout=timeout):
+            print(f"⚠️ SOURCE BUSY: {self.name}")
+            return []
+        try:
+            return self.fetch(query, timeout=timeout) or []
+        except Exception as e:
+            print(f"Source {self.name} error:", e)
+            return []
+        finally:
+            self._slots.release()
+
+    async def arun(self, query, timeout=None):
+        timeout = self._timeout(timeout)
+        if self.afetch is None:
+            from asgiref.sync import sync_to_async
+            return await sync_to_async(self.run, thread_sensitive=False)(query, timeout)
+
+        loop_id = id(asyncio.get_running_loop())
+        slots = self._aslots.get(loop_id)
+        if slots is None:
+            slots = self._aslots[loop_id] = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ SOURCE BUSY: {self.name}")
+            return []
+        try:
+            return await self.afetch(query, timeout=timeout) or []
+        except Exception as e:
+            print(f"Source {self.name} error:", e)
+            return []
+        finally:
+            slots.release()
+
+    def abandon(self, future):
+        """Bütçeyi aşıp arka planda süren çağrı; bitince sayaçtan düşer."""
+        with self._lock:
+            self.stragglers += 1
+        future.add_done_callback(self._straggler_done)
+
+    def _straggler_done(self, future):
+        with self._lock:
+            self.stragglers -= 1
+
+
+SOURCES = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def register_source(name, fetch, timeout=10, max_concurrency=8, fallback=False, afetch=None):
+    """Kaynağı kaydet. settings.PRODUCT_SOURCES[name] ile timeout/limit ezilebilir."""
+    overrides = getattr(settings, "PRODUCT_SOURCES", {}).get(name, {})
+    source = ProductSource(
+        name,
+        fetch,
+        timeout=overrides.get("timeout", timeout),
+        max_concurrency=overrides.get("max_concurrency", max_concurrency),
+        fallback=overrides.get("fallback", fallback),
+        afetch=afetch,
+    )
+    SOURCES[name] = source
+    return source
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "PRODUCT_SOURCE_WORKERS", 16),
+                    thread_name_prefix="finda-source",
+                )
+    return _executor
+
+
+def _budget(budget):
+    if budget is None:
+        budget = getattr(settings, "PRODUCT_SEARCH_BUDGET", DEFAULT_SEARCH_BUDGET)
+    # İstek bütçesinden (core/deadline.py) fazlası beklenmez
+    return min(budget, deadline.remaining(budget))
+
+
+def _fallback_after(budget):
+    return min(getattr(settings, "PRODUCT_FALLBACK_AFTER", DEFAULT_FALLBACK_AFTER), budget / 2)
+
+
+def _runnable(fallback):
+    """Kayıt sırasıyla (ad, kaynak); çok fazla askıda çağrısı olan kaynak atlanır."""
+    limit = getattr(settings, "PRODUCT_SOURCE_MAX_STRAGGLERS", DEFAULT_MAX_STRAGGLERS)
+    for name, source in SOURCES.items():
+        if source.fallback != fallback:
+            continue
+        if source.stragglers >= limit:
+            print(f"⚠️ SOURCE STRAGGLING: {name} ({source.stragglers} çağrı bütçeyi aştı), atlandı")
+            continue
+        yield name, source
+
+
+def _primary_count(collected):
+    return sum(len(results) for name, results in collected.items() if not SOURCES[name].fallback)
+
+
+def _start_fallbacks(pending, collected, min_results, now, fallback_at):
+    # Birincil kaynaklar yetersiz döndü ya da yedek süresi doldu
+    return (not pending and _primary_count(collected) < min_results) or (pending and now >= fallback_at)
+
+
+def fetch_from_sources(query, budget=None, min_results=DEFAULT_MIN_RESULTS):
+    """
+    Birincil kaynakları aynı anda başlatır, bitenleri toplar; yedek kaynaklar
+    gerekirse sonradan eklenir. Bütçe dolduğunda yetişemeyen kaynaklar
+    atlanır; gecikme en yavaş kaynağa (en fazla budget) eşit olur, toplamlarına değil.
+    """
+    budget = _budget(budget)
+    started = time.monotonic()
+    ends_at = started + budget
+    fallback_at = started + _fallback_after(budget)
+
+    executor = get_executor()
+    futures = {}
+
+    def _submit(fallback):
+        submitted = set()
+        for name, source in _runnable(fallback):
+            timeout = max(0.0, ends_at - time.monotonic())
+            future = executor.submit(deadline.bind(source.run), query, timeout)
+            futures[future] = name
+            submitted.add(future)
+        return submitted
+
+    pending = _submit(False)
+    collected = {}
+    fallbacks_started = False
+    while True:
+        now = time.monotonic()
+        if not fallbacks_started and _start_fallbacks(pending, collected, min_results, now, fallback_at):
+            pending |= _submit(True)
+            fallbacks_started = True
+        if not pending or now >= ends_at:
+            break
+        wake_at = ends_at if fallbacks_started else min(ends_at, fallback_at)
+        done, pending = wait(pending, timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            collected[futures[future]] = future.result()
+
+    if pending:
+        late = ", ".join(sorted(futures[f] for f in pending))
+        print(f"⏱️ BUDGET AŞILDI ({budget}s), atlanan kaynaklar: {late}")
+        for future in pending:
+            # Henüz başlamamışsa iptal; başlamışsa askıda sayılır
+            if not future.cancel():
+                SOURCES[futures[future]].abandon(future)
+
+    return _merge(collected, min_results)
+
+
+async def afetch_from_sources(query, budget=None, min_results=DEFAULT_MIN_RESULTS):
+    """fetch_from_sources'un async karşılığı: kaynaklar loop'ta task olarak çalışır, geç kalanlar iptal edilir."""
+    budget = _budget(budget)
+    started = time.monotonic()
+    ends_at = started + budget
+    fallback_at = started + _fallback_after(budget)
+    tasks = {}
+
+    def _submit(fallback):
+        submitted = set()
+        for name, source in _runnable(fallback):
+            task = asyncio.ensure_future(source.arun(query, max(0.0, ends_at - time.monotonic())))
+            tasks[task] = name
+            submitted.add(task)
+        return submitted
+
+    pending = _submit(False)
+    collected = {}
+    fallbacks_started = False
+    while True:
+        now = time.monotonic()
+        if not fallbacks_started and _start_fallbacks(pending, collected, min_results, now, fallback_at):
+            pending |= _submit(True)
+            fallbacks_started = True
+        if not pending or now >= ends_at:
+            break
+        wake_at = ends_at if fallbacks_started else min(ends_at, fallback_at)
+        done, pending = await asyncio.wait(pending, timeout=max(0.0, wake_at - now),
+                                           return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            collected[tasks[task]] = task.result()
+
+    if pending:
+        for task in pending:
+            task.cancel()
+        late = ", ".join(sorted(tasks[t] for t in pending))
+        print(f"⏱️ BUDGET AŞILDI ({budget}s), atlanan kaynaklar: {late}")
+
+    return _merge(collected, min_results)
+
+
+def _merge(collected, min_results):
+    # Birleştirme sırası kayıt sırasıdır, böylece sonuç bitiş sırasından bağımsızdır
+    results = []
+    for name, source in SOURCES.items():
+        if not source.fallback:
+            results.extend(collected.get(name, []))
+
+    if len(results) < min_results:
+        for name, source in SOURCES.items():
+            if source.fallback:
+                results.extend(collected.get(name, []))
+
+    return results
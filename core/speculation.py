@@ -0,0 +1,161 @@
+"""
+Spekülatif ürün araması.
+
+Yerel sınıflandırıcı (core/intent.py) mesajın ürün araması olduğundan emin
+değilse analiz LLM'e gider ve ürün araması normalde onun sorgusunu bekler.
+Spekülatif modda (settings.SPECULATIVE_FETCH) yerel tahmini sorguyla arama
+LLM çalışırken başlatılır:
+
+  - LLM'in sorgusu tahmine yeterince yakınsa (token Jaccard >=
+    SPECULATIVE_MATCH_THRESHOLD) sonuç LLM sorgusuna göre yeniden sıralanıp
+    kullanılır;
+  - değilse sonuç atılır (upstream payload'ı CACHE'te kalır, aynı sorgu
+    tekrar gelirse oradan döner) ve LLM sorgusuyla normal arama yapılır.
+
+stats(): deneme/isabet sayıları ve isabetlerde kazanılan toplam süre.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import deadline
+from .chat_service import aanalyze_user_message, analyze_user_message, shopping_query
+from .intent import classify_message, is_smalltalk_message
+from .products import normalize_title
+from .utils import aget_all_products, get_all_products, rank_products
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_background = set()  # iskarta edilen async task'lar bitene kadar referans tutulur
+
+_lock = threading.Lock()
+_stats = {"attempts": 0, "hits": 0, "misses": 0, "saved_ms": 0.0}
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "SPECULATIVE_FETCH_WORKERS", 8),
+                    thread_name_prefix="finda-speculative",
+                )
+    return _executor
+
+
+def speculative_query(user_message):
+    """Spekülasyona değer bir tahmin varsa sorgu, yoksa None."""
+    if not getattr(settings, "SPECULATIVE_FETCH", False) or is_smalltalk_message(user_message):
+        return None
+    local = classify_message(user_message)
+    if local["intent"] != "shopping" or not local["query"]:
+        return None
+    if local["confidence"] >= getattr(settings, "LOCAL_INTENT_MIN_CONFIDENCE", 0.8):
+        # Yerel sonuç zaten kullanılacak, LLM turu yok
+        return None
+    return local["query"]
+
+
+def queries_match(guess, query):
+    a = set(normalize_title(guess).split())
+    b = set(normalize_title(query).split())
+    if not a or not b:
+        return False
+    return len(a & b) / len(a | b) >= getattr(settings, "SPECULATIVE_MATCH_THRESHOLD", 0.6)
+
+
+def _record(hit, saved=0.0):
+    with _lock:
+        _stats["attempts"] += 1
+        if hit:
+            _stats["hits"] += 1
+            _stats["saved_ms"] += saved * 1000
+        else:
+            _stats["misses"] += 1
+
+
+def _timed_fetch(query, compare_mode):
+    started = time.monotonic()
+    products = get_all_products(query, compare_mode=compare_mode)
+    return products, time.monotonic() - started
+
+
+def analyze_and_fetch(user_message, chat_history, compare_mode=False):
+    """(analysis, query, products). Spekülasyon yoksa analiz + arama sırayla yapılır."""
+    guess = speculative_query(user_message)
+    if guess is None:
+        analysis = analyze_user_message(user_message, chat_history)
+        query = shopping_query(analysis)
+        return analysis, query, (get_all_products(query, compare_mode=compare_mode) if query else [])
+
+    started = time.monotonic()
+    future = get_executor().submit(deadline.bind(_timed_fetch), guess, compare_mode)
+    analysis = analyze_user_message(user_message, chat_history)
+    llm_elapsed = time.monotonic() - started
+    query = shopping_query(analysis)
+
+    if query and queries_match(guess, query):
+        try:
+            products, fetch_elapsed = future.result()
+        except Exception as e:
+            print("Speculative fetch error:", e)
+        else:
+            # Seri akışta arama LLM'den sonra başlardı: kazanç örtüşen süre kadar
+            _record(True, min(llm_elapsed, fetch_elapsed))
+            print(f"🔮 SPEKÜLASYON İSABET: '{guess}' ~ '{query}'")
+            return analysis, query, rank_products(products, query)
+
+    _record(False)
+    return analysis, query, (get_all_products(query, compare_mode=compare_mode) if query else [])
+
+
+async def aanalyze_and_fetch(user_message, chat_history, compare_mode=False):
+    """analyze_and_fetch'in async karşılığı; spekülatif arama loop'ta task olarak çalışır."""
+    guess = speculative_query(user_message)
+    if guess is None:
+        analysis = await aanalyze_user_message(user_message, chat_history)
+        query = shopping_query(analysis)
+        return analysis, query, (await aget_all_products(query, compare_mode=compare_mode) if query else [])
+
+    async def _timed():
+        fetch_started = time.monotonic()
+        products = await aget_all_products(guess, compare_mode=compare_mode)
+        return products, time.monotonic() - fetch_started
+
+    started = time.monotonic()
+    task = asyncio.ensure_future(_timed())
+    analysis = await aanalyze_user_message(user_message, chat_history)
+    llm_elapsed = time.monotonic() - started
+    query = shopping_query(analysis)
+
+    if query and queries_match(guess, query):
+        try:
+            products, fetch_elapsed = await task
+        except Exception as e:
+            print("Speculative fetch error:", e)
+        else:
+            _record(True, min(llm_elapsed, fetch_elapsed))
+            print(f"🔮 SPEKÜLASYON İSABET: '{guess}' ~ '{query}'")
+            return analysis, query, rank_products(products, query)
+    else:
+        # Payload cache'e yazılsın diye task iptal edilmez
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+    _record(False)
+    return analysis, query, (await aget_all_products(query, compare_mode=compare_mode) if query else [])
+
+
+def stats():
+    with _lock:
+        data = dict(_stats)
+    data["hit_rate"] = round(data["hits"] / data["attempts"], 3) if data["attempts"] else 0.0
+    data["avg_saved_ms"] = round(data["saved_ms"] / data["hits"], 1) if data["hits"] else 0.0
+    data["saved_ms"] = round(data["saved_ms"], 1)
+    return data
@@ -1,3 +1,1238 @@
-from django.test import TestCase
+import json
+import time
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import sources
+from core.conversations import ChatHistory
+from core.tiered_cache import TieredCache
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class SourceRegistryTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(sources.SOURCES, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sources_run_concurrently(self):
+        def slow(name):
+            def fetch(query, timeout=10):
+                time.sleep(0.3)
+                return [{"title": f"{name} {query}"}]
+            return fetch
+
+        for name in ("a", "b", "c"):
+            sources.register_source(name, slow(name), timeout=1)
+
+        started = time.monotonic()
+        results = sources.fetch_from_sources("phone", budget=2, min_results=1)
+        elapsed = time.monotonic() - started
+
+        self.assertEqual([r["title"] for r in results], ["a phone", "b phone", "c phone"])
+        self.assertLess(elapsed, 0.8)
+
+    def test_budget_drops_late_sources(self):
+        sources.register_source("fast", lambda q, timeout=1: [{"title": "fast"}], timeout=1)
+        sources.register_source("slow", lambda q, timeout=1: time.sleep(1) or [{"title": "slow"}], timeout=1)
+
+        results = sources.fetch_from_sources("x", budget=0.2, min_results=1)
+
+        self.assertEqual([r["title"] for r in results], ["fast"])
+
+    def test_fallback_only_used_when_primary_is_short(self):
+        sources.register_source("main", lambda q, timeout=1: [{"title": "m"}] * 5, timeout=1)
+        sources.register_source("demo", lambda q, timeout=1: [{"title": "d"}], timeout=1, fallback=True)
+
+        self.assertEqual(len(sources.fetch_from_sources("x", budget=1, min_results=5)), 5)
+        self.assertEqual(len(sources.fetch_from_sources("x", budget=1, min_results=6)), 6)
+
+    def test_fallback_not_called_when_primary_is_enough(self):
+        demo = mock.Mock(return_value=[{"title": "d"}])
+        sources.register_source("main", lambda q, timeout=1: [{"title": "m"}] * 5, timeout=1)
+        sources.register_source("demo", demo, timeout=1, fallback=True)
+
+        sources.fetch_from_sources("x", budget=1, min_results=5)
+        demo.assert_not_called()
+
+    @override_settings(PRODUCT_FALLBACK_AFTER=0.1)
+    def test_fallback_starts_while_primary_is_slow(self):
+        sources.register_source("main", lambda q, timeout=1: time.sleep(1) or [{"title": "m"}], timeout=1)
+        sources.register_source("demo", lambda q, timeout=1: [{"title": "d"}], timeout=1, fallback=True)
+
+        started = time.monotonic()
+        results = sources.fetch_from_sources("x", budget=0.4, min_results=5)
+
+        self.assertEqual([r["title"] for r in results], ["d"])
+        self.assertLess(time.monotonic() - started, 0.6)
+
+    @override_settings(PRODUCT_SOURCE_MAX_STRAGGLERS=1)
+    def test_stragglers_are_capped(self):
+        import threading
+
+        release = threading.Event()
+        hung = mock.Mock(side_effect=lambda q, timeout=1: release.wait(2) and [])
+        sources.register_source("hung", hung, timeout=2)
+        self.addCleanup(release.set)
+
+        sources.fetch_from_sources("x", budget=0.1, min_results=1)
+        self.assertEqual(sources.SOURCES["hung"].stragglers, 1)
+        sources.fetch_from_sources("x", budget=0.1, min_results=1)
+        self.assertEqual(hung.call_count, 1)
+
+        release.set()
+        time.sleep(0.05)
+        self.assertEqual(sources.SOURCES["hung"].stragglers, 0)
+
+
+class HttpClientRegistryTests(SimpleTestCase):
+    def test_one_client_per_host(self):
+        from core import http_clients
+
+        a = http_clients.get_client("https://serpapi.com/search.json")
+        b = http_clients.get_client("https://serpapi.com/other")
+        c = http_clients.get_client("https://fakestoreapi.com/products")
+
+        self.assertIs(a, b)
+        self.assertIsNot(a, c)
+        self.assertIn("https://serpapi.com", http_clients.pool_stats())
+
+    def test_stats_count_requests_and_errors(self):
+        from core import http_clients
+
+        client = http_clients.PooledClient("https://example.invalid", pool_size=2)
+        with mock.patch.object(client._client, "request", side_effect=[mock.Mock(status_code=200), OSError("boom")]):
+            client.request("GET", "https://example.invalid/a")
+            with self.assertRaises(OSError):
+                client.request("GET", "https://example.invalid/b")
+
+        stats = client.stats()
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["errors"], 1)
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_lifespan_shutdown_closes_async_clients(self):
+        import asyncio
+        from core import http_clients
+        from finda import asgi
+
+        async def run():
+            client = http_clients.get_async_client("https://serpapi.com/search.json")
+            messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+            sent = []
+
+            async def receive():
+                return next(messages)
+
+            async def send(message):
+                sent.append(message["type"])
+
+            await asgi.application({"type": "lifespan"}, receive, send)
+            return client, sent, asyncio.get_running_loop() in http_clients._async_clients
+
+        client, sent, registered = asyncio.run(run())
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        self.assertTrue(client._client.is_closed)
+        self.assertFalse(registered)
+
+
+class FlowTests(SimpleTestCase):
+    """core/flow.py: aynı akış iki sürücüyle aynı sonucu verir."""
+
+    def test_same_flow_runs_sync_and_async(self):
+        import asyncio
+        from core import flow
+
+        calls = []
+
+        def upper(name):
+            if name == "bad":
+                raise OSError(name)
+            return name.upper()
+
+        def fetch(name):
+            calls.append("sync")
+            return upper(name)
+
+        async def afetch(name):
+            calls.append("async")
+            return upper(name)
+
+        def apply(fn, callback):
+            return fn(callback())
+
+        async def aapply(fn, callback):
+            return fn(await callback())
+
+        def inner_flow(name):
+            return (yield flow.io(fetch, afetch, name))
+
+        def outer_flow():
+            first = yield flow.io(apply, aapply, str.lower, flow.task(inner_flow, "a"))
+            try:
+                yield flow.io(fetch, afetch, "bad")
+            except OSError as e:
+                return first, str(e)
+
+        self.assertEqual(flow.as_sync(outer_flow)(), ("a", "bad"))
+        self.assertEqual(asyncio.run(flow.as_async(outer_flow)()), ("a", "bad"))
+        self.assertEqual(calls, ["sync", "sync", "async", "async"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TieredCacheTests(SimpleTestCase):
+    def test_local_tier_is_bounded_lru(self):
+        c = TieredCache("t_lru", ttl=60, max_entries=2)
+        c.set("a", 1)
+        c.set("b", 2)
+        c.get("a")
+        c.set("c", 3)
+
+        self.assertEqual(len(c), 2)
+        self.assertEqual(list(c._local), ["a", "c"])
+
+    def test_shared_tier_serves_other_workers(self):
+        TieredCache("t_shared", ttl=60).set("q", [1, 2])
+        other = TieredCache("t_shared", ttl=60)
+
+        self.assertEqual(other.get("q"), [1, 2])
+        self.assertEqual(other.stats()["hits_shared"], 1)
+
+    def test_expired_entries_are_misses(self):
+        c = TieredCache("t_ttl", ttl=60)
+        c.set("q", "v")
+        with mock.patch("core.tiered_cache.time.time", return_value=time.time() + 61):
+            self.assertIsNone(c.get("q"))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_misses_share_one_computation(self):
+        import threading
+
+        c = TieredCache("t_flight", ttl=60)
+        calls = []
+        gate = threading.Event()
+
+        def compute():
+            calls.append(1)
+            gate.wait(1)
+            return ["result"]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(c.get_or_set("q", compute))) for _ in range(10)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        gate.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [["result"]] * 10)
+
+    def test_async_misses_share_one_task(self):
+        import asyncio
+
+        c = TieredCache("t_aflight", ttl=60)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return ["result"]
+
+        async def run():
+            return await asyncio.gather(*(c.aget_or_set("q", compute) for _ in range(10)))
+
+        self.assertEqual(asyncio.run(run()), [["result"]] * 10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(c.get("q"), ["result"])
+
+    def test_follower_waits_for_other_workers_lock(self):
+        import hashlib
+        from django.core.cache import cache
+        from core.singleflight import SingleFlight
+
+        flight = SingleFlight("t_worker", lock_ttl=2, poll_interval=0.01)
+        # Başka bir worker kilidi almış ve hesaplıyor
+        cache.add(f"singleflight:t_worker:{hashlib.md5(b'k').hexdigest()}", "other", 2)
+        lookups = iter([None, None, "from-other-worker"])
+        computed = []
+
+        value = flight.do("k", lambda: computed.append(1) or "computed", lookup=lambda: next(lookups))
+
+        self.assertEqual(value, "from-other-worker")
+        self.assertEqual(computed, [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StaleWhileRevalidateTests(SimpleTestCase):
+    def test_stale_hit_returns_at_once_and_refreshes_in_background(self):
+        import threading
+
+        c = TieredCache("t_swr", ttl=10, stale_ttl=100)
+        c.set("q", "old")
+        refreshed = threading.Event()
+
+        def compute():
+            refreshed.set()
+            return "new"
+
+        with mock.patch("core.tiered_cache.time.time", return_value=time.time() + 20):
+            self.assertEqual(c.get_or_set("q", compute), "old")
+            self.assertTrue(refreshed.wait(1))
+            for _ in range(50):
+                if c.get("q") == "new":
+                    break
+                time.sleep(0.01)
+        self.assertEqual(c.get("q"), "new")
+        self.assertEqual(c.stats()["hits_stale"], 1)
+
+    def test_hard_ttl_caps_staleness(self):
+        c = TieredCache("t_swr_hard", ttl=10, stale_ttl=100)
+        c.set("q", "old")
+
+        with mock.patch("core.tiered_cache.time.time", return_value=time.time() + 111):
+            self.assertEqual(c.get_or_set("q", lambda: "new"), "new")
+
+    def test_merchant_ttl_override(self):
+        from core.products import Product
+        from core.utils import product_cache_ttl
+
+        def offers(*sites):
+            return [Product(id=s, title=s, site=s) for s in sites]
+
+        with self.settings(PRODUCT_CACHE_TTLS={"trendyol": 120, "fakestore": 3600}):
+            self.assertEqual(product_cache_ttl(offers("FakeStore")), 3600)
+            self.assertEqual(product_cache_ttl(offers("trendyol.com", "n11.com")), 120)
+            self.assertEqual(product_cache_ttl(offers("n11.com")), 600)
+
+
+class DedupeEngineTests(SimpleTestCase):
+    def test_matches_legacy_quadratic_dedupe(self):
+        from core.benchmarks import legacy_deduplicate_products_v2, synthetic_offers
+        from core.utils import deduplicate_products_v2
+
+        for seed in (1, 2, 3):
+            offers = synthetic_offers(400, seed=seed)
+            self.assertEqual(
+                [p["id"] for p in deduplicate_products_v2(offers)],
+                [p["id"] for p in legacy_deduplicate_products_v2(offers)],
+            )
+
+    def test_incremental_insert(self):
+        from core.dedupe import DedupeIndex
+
+        index = DedupeIndex()
+        self.assertTrue(index.add({"title": "Apple iPhone 15 128 GB Siyah"}))
+        self.assertFalse(index.add({"title": "Apple iPhone 15 128GB Siyah"}))
+        self.assertTrue(index.add({"title": "Samsung Galaxy S24 256 GB"}))
+        self.assertFalse(index.add({"title": "!!!"}))
+        self.assertEqual(len(index), 2)
+
+
+def _json_response(body, status=200):
+    resp = mock.Mock(status_code=status)
+    resp.json.return_value = body
+    return resp
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SERP_API_KEY="test-key")
+class SearchAjaxTests(TestCase):
+    def setUp(self):
+        from core import utils
+
+        utils.CACHE.clear_local()
+        self.payload = json.loads((Path(settings.BASE_DIR) / "raw_serp_deep_analysis.json").read_text(encoding="utf-8"))
+
+    def _fake_get(self, url, **kwargs):
+        if "serpapi" in url:
+            return _json_response(self.payload)
+        return _json_response([])
+
+    def test_product_search_renders_cards_and_stores_history(self):
+        with mock.patch("core.http_clients.get", side_effect=self._fake_get):
+            response = self.client.post("/search_ajax/", {"query": "iphone"})
+
+        self.assertEqual(response.status_code, 200)
+        html = response.content.decode()
+        self.assertIn("product-card", html)
+        self.assertEqual(list(self.client.session.keys()), ["conversation_id"])
+        history = ChatHistory.load(self.client.session)
+        self.assertEqual(history[-1]["role"], "assistant")
+        self.assertIsInstance(history[-1]["products"][0], dict)
+        self.assertNotIn("products", history[-1]["ai_summary"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SERP_API_KEY="test-key",
+                   SESSION_ENGINE="django.contrib.sessions.backends.cache")
+class AsyncSearchTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from core import utils
+
+        cache.clear()
+        utils.CACHE.clear_local()
+        self.payload = json.loads((Path(settings.BASE_DIR) / "raw_serp_deep_analysis.json").read_text(encoding="utf-8"))
+
+    async def _fake_aget(self, url, **kwargs):
+        if "serpapi" in url:
+            return _json_response(self.payload)
+        return _json_response([])
+
+    def _request(self, data):
+        from importlib import import_module
+        from django.test import AsyncRequestFactory
+
+        request = AsyncRequestFactory().post("/search_ajax/", data)
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        return request
+
+    async def test_search_ajax_async_uses_async_upstreams(self):
+        from core.views import search_ajax_async
+
+        request = self._request({"query": "iphone"})
+        with mock.patch("core.http_clients.aget", side_effect=self._fake_aget) as aget, \
+                mock.patch("core.http_clients.get") as sync_get:
+            response = await search_ajax_async(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("product-card", response.content.decode())
+        self.assertTrue(aget.called)
+        sync_get.assert_not_called()
+        history = await ChatHistory.aload(request.session)
+        self.assertIsInstance(history[-1]["products"][0], dict)
+
+    async def test_streaming_reply_is_an_async_iterator(self):
+        from core.views import search_ajax_async
+
+        request = self._request({"query": "iphone", "stream": "1"})
+        summary = {"data": {"commentary": "Async yorum"}, "source": "test"}
+        with mock.patch("core.http_clients.aget", side_effect=self._fake_aget), \
+                mock.patch("core.views.aanalyze_products", new=mock.AsyncMock(return_value=summary)):
+            response = await search_ajax_async(request)
+            chunks = [chunk async for chunk in response.streaming_content]
+
+        self.assertEqual(len(chunks), 3)
+        self.assertIn(b"product-card", chunks[1])
+        self.assertIn(b"Async yorum", chunks[2])
+
+    async def test_streaming_summary_error_is_rendered(self):
+        from core.views import search_ajax_async
+
+        request = self._request({"query": "iphone", "stream": "1"})
+        with mock.patch("core.http_clients.aget", side_effect=self._fake_aget), \
+                mock.patch("core.views.aanalyze_products", new=mock.AsyncMock(side_effect=RuntimeError("llm down"))):
+            response = await search_ajax_async(request)
+            chunks = [chunk async for chunk in response.streaming_content]
+
+        self.assertEqual(len(chunks), 3)
+        history = await ChatHistory.aload(request.session)
+        self.assertEqual(history[-1]["ai_summary"], {"error": "llm down"})
+
+    async def test_home_async_renders_products(self):
+        from django.test import AsyncRequestFactory
+        from core.views import home_async
+
+        request = AsyncRequestFactory().get("/", {"query": "iphone"})
+        request.session = self._request({}).session
+        with mock.patch("core.http_clients.aget", side_effect=self._fake_aget), \
+                mock.patch("core.http_clients.get") as sync_get:
+            response = await home_async(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("product-card", response.content.decode())
+        sync_get.assert_not_called()
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SERP_API_KEY="test-key")
+class StreamingSearchTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from core import utils
+
+        cache.clear()
+        utils.CACHE.clear_local()
+        self.payload = json.loads((Path(settings.BASE_DIR) / "raw_serp_deep_analysis.json").read_text(encoding="utf-8"))
+
+    def _fake_get(self, url, **kwargs):
+        if "serpapi" in url:
+            return _json_response(self.payload)
+        return _json_response([])
+
+    def test_products_flush_before_ai_commentary(self):
+        from core.views import STREAM_DELIMITER
+
+        summary = {"data": {"commentary": "Stream yorumu"}, "source": "test"}
+        with mock.patch("core.http_clients.get", side_effect=self._fake_get), \
+                mock.patch("core.views.analyze_products", return_value=summary) as analyze:
+            response = self.client.post("/search_ajax/", {"query": "iphone", "stream": "1"})
+            chunks = iter(response.streaming_content)
+
+            first = next(chunks).decode()
+            self.assertIn("chat-message user", first)
+            self.assertIn("stream-pending", first)
+
+            second = next(chunks).decode()
+            self.assertIn("product-card", second)
+            self.assertIn("data-fill=", second)
+            analyze.assert_not_called()
+
+            third = b"".join(chunks).decode()
+            self.assertIn("Stream yorumu", third)
+            self.assertTrue(third.endswith(STREAM_DELIMITER))
+
+        history = ChatHistory.load(self.client.session)
+        self.assertEqual(history[-1]["ai_summary"]["data"]["commentary"], "Stream yorumu")
+        self.assertIsInstance(history[-1]["products"][0], dict)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SERP_API_KEY="test-key")
+class UpstreamPayloadCacheTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from core import utils
+
+        cache.clear()
+        utils.CACHE.clear_local()
+        self.payload = json.loads((Path(settings.BASE_DIR) / "raw_serp_deep_analysis.json").read_text(encoding="utf-8"))
+
+    def _fake_get(self, url, **kwargs):
+        if "serpapi" in url:
+            return _json_response(self.payload)
+        return _json_response([])
+
+    def test_one_serpapi_call_per_normalized_query(self):
+        from core.utils import get_all_products
+
+        with mock.patch("core.http_clients.get", side_effect=self._fake_get) as get:
+            normal = get_all_products("iphone", compare_mode=False)
+            compare = get_all_products("iPhone ", compare_mode=True)
+            # strict filtre yetersiz -> relaxed, yine aynı payload üzerinde
+            relaxed = get_all_products("tamamen alakasız sorgu")
+
+        serp_calls = [c for c in get.call_args_list if "serpapi" in c.args[0]]
+        self.assertEqual(len(serp_calls), 2)
+        self.assertTrue(normal)
+        self.assertLessEqual(len(compare), 5)
+        self.assertEqual(len({p.site for p in compare}), len(compare))
+        self.assertTrue(relaxed)
+
+    def test_failed_payload_is_not_cached(self):
+        from core.utils import fetch_serp_payload
+
+        with mock.patch("core.http_clients.get", side_effect=requests.ConnectionError):
+            self.assertIsNone(fetch_serp_payload("iphone"))
+        with mock.patch("core.http_clients.get", side_effect=self._fake_get):
+            self.assertEqual(fetch_serp_payload("iphone"), self.payload["shopping_results"])
+
+
+class PipelineBenchmarkTests(SimpleTestCase):
+    def test_results_saved_and_regressions_fail(self):
+        import tempfile
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from io import StringIO
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / "run.json"
+            call_command("bench_pipeline", size=60, repeat=1, output=str(output), budget_scale=1000, stdout=StringIO())
+            stages = json.loads(output.read_text(encoding="utf-8"))["stages"]
+            self.assertIn("deduplicate_products_v2", stages)
+            self.assertIn("render_result_block", stages)
+
+            for stage in stages.values():
+                stage["median_ms"] = 1e-6
+            baseline = Path(tmp) / "baseline.json"
+            baseline.write_text(json.dumps({"stages": stages}), encoding="utf-8")
+            with self.assertRaises(CommandError):
+                call_command("bench_pipeline", size=60, repeat=1, output=str(output),
+                             baseline=str(baseline), budget_scale=1000, stdout=StringIO())
+
+
+class _FakeUpstream:
+    """get_client() yerine: serpapi için kayıtlı payload, diğerleri boş liste."""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append(url)
+        body = self.payload if "serpapi" in url else []
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["content-type"] = "application/json"
+        response._content = json.dumps(body).encode("utf-8")
+        return response
+
+
+class _Offline:
+    def request(self, method, url, **kwargs):
+        raise AssertionError(f"network call in replay mode: {url}")
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SERP_API_KEY="test-key")
+class RecordReplayTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.core.cache import cache
+        from core import utils
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.payload = json.loads((Path(settings.BASE_DIR) / "raw_serp_deep_analysis.json").read_text(encoding="utf-8"))
+        cache.clear()
+        utils.CACHE.clear_local()
+
+    def _mode(self, mode):
+        return self.settings(UPSTREAM_REPLAY_MODE=mode, UPSTREAM_FIXTURE_DIR=Path(self.tmp.name))
+
+    def test_search_pipeline_replays_offline(self):
+        from django.core.cache import cache
+        from core import utils
+
+        upstream = _FakeUpstream(self.payload)
+        with self._mode("record"), mock.patch("core.http_clients.get_client", return_value=upstream):
+            recorded = self.client.post("/search_ajax/", {"query": "iphone"}).content.decode()
+        self.assertTrue(upstream.calls)
+
+        index = list((Path(self.tmp.name) / "index").glob("*.json"))
+        self.assertTrue(index)
+        self.assertNotIn("test-key", "".join(p.read_text(encoding="utf-8") for p in index))
+
+        cache.clear()
+        utils.CACHE.clear_local()
+        with self._mode("replay"), mock.patch("core.http_clients.get_client", return_value=_Offline()):
+            replayed = self.client.post("/search_ajax/", {"query": "iphone"}).content.decode()
+
+        self.assertIn("product-card", replayed)
+        self.assertEqual(recorded.count("product-card"), replayed.count("product-card"))
+
+    def test_replay_miss_is_a_connection_error(self):
+        from core import http_clients, replay
+
+        with self._mode("replay"):
+            with self.assertRaises(http_clients.UPSTREAM_ERRORS):
+                http_clients.get("https://serpapi.com/search.json", params={"q": "yok"})
+            self.assertGreaterEqual(replay.stats()["misses"], 1)
+
+    def test_gemini_text_round_trip(self):
+        from core import http_clients
+
+        live = mock.Mock(return_value=mock.Mock(text='{"commentary": "ok"}'))
+        gemini = mock.Mock()
+        gemini.models.generate_content = live
+        with self._mode("record"), mock.patch("core.http_clients.get_gemini_client", return_value=gemini):
+            self.assertEqual(http_clients.gemini_generate("k", "gemini-2.5-flash", "p"), '{"commentary": "ok"}')
+        with self._mode("replay"):
+            self.assertEqual(http_clients.gemini_generate("k", "gemini-2.5-flash", "p"), '{"commentary": "ok"}')
+        self.assertEqual(live.call_count, 1)
+
+
+class LoadHarnessTests(SimpleTestCase):
+    def test_standins_speak_upstream_formats(self):
+        from core import loadtest
+
+        behaviors = loadtest.parse_behaviors(loadtest.Behavior(latency_ms=0), ["groq:429=1"])
+        servers = loadtest.start_standins(behaviors, base_port=0)
+        self.addCleanup(loadtest.stop_standins, servers)
+
+        serp = requests.get(f"{servers['serpapi'].base_url}/search.json", params={"q": "iphone"}).json()
+        self.assertTrue(serp["shopping_results"])
+        token = requests.post(f"{servers['amadeus'].base_url}/v1/security/oauth2/token").json()
+        self.assertIn("access_token", token)
+        chat = requests.post(f"{servers['openrouter'].base_url}/api/v1/chat/completions",
+                             json={"messages": [{"role": "user", "content": 'Kullanıcının son mesajı: "iphone 15"'}]}).json()
+        self.assertEqual(json.loads(chat["choices"][0]["message"]["content"])["query"], "iphone 15")
+        self.assertEqual(requests.post(f"{servers['groq'].base_url}/openai/v1/chat/completions", json={}).status_code, 429)
+
+    def test_percentiles(self):
+        from core.loadtest import percentile
+
+        values = list(range(1, 101))
+        self.assertEqual((percentile(values, 50), percentile(values, 95), percentile(values, 99)), (50, 95, 99))
+
+
+class ProductRecordTests(SimpleTestCase):
+    def test_fields_precomputed_once(self):
+        from core.products import Product
+
+        p = Product(id="x", title="Apple iPhone 15 (128 GB)", price="1.299 TL", rating=4.5, review_count="1,204")
+
+        self.assertEqual(p.norm_title, "apple iphone 15 128 gb")
+        self.assertEqual(p.tokens, frozenset({"apple", "iphone", "15", "128", "gb"}))
+        self.assertEqual(p.price_value, 1.299)
+        self.assertEqual(p.rating_value, 4.5)
+        self.assertEqual(p.review_value, 1204)
+        self.assertFalse(hasattr(p, "__dict__"))
+        self.assertEqual(Product.from_dict(p.to_dict()).to_dict(), p.to_dict())
+
+
+@override_settings(LLM_HEDGE_DEFAULT_DELAY=0.05, LLM_HEDGE_MIN_DELAY=0.01)
+class HedgedLLMTests(SimpleTestCase):
+    def test_slow_primary_is_hedged_and_loses(self):
+        from core.hedging import Hedger
+
+        hedger = Hedger()
+
+        def slow():
+            time.sleep(0.5)
+            return {"intent": "SOHBET"}
+
+        start = time.monotonic()
+        result, name = hedger.run([("gemini", slow), ("groq", lambda: {"intent": "ALISVERIS"})])
+
+        self.assertEqual((result, name), ({"intent": "ALISVERIS"}, "groq"))
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(hedger.stats()["hedges_fired"], 1)
+        self.assertEqual(hedger.stats()["hedges_won"], 1)
+
+    def test_failure_starts_next_without_hedging(self):
+        from core.hedging import Hedger
+
+        hedger = Hedger()
+        result, name = hedger.run([("gemini", lambda: None), ("groq", lambda: {"ok": 1})])
+
+        self.assertEqual(name, "groq")
+        self.assertEqual(hedger.stats()["hedges_fired"], 0)
+
+    def test_sync_loser_is_signalled_and_its_latency_recorded(self):
+        import threading
+        from core import hedging
+        from core.hedging import Hedger
+
+        hedger = Hedger()
+        stopped = threading.Event()
+
+        def slow():
+            # Model döngüsü gibi: her adımda kaybedip kaybetmediğini yoklar
+            for _ in range(100):
+                if hedging.cancelled():
+                    stopped.set()
+                    return None
+                time.sleep(0.01)
+            return {"intent": "SOHBET"}
+
+        with override_settings(LLM_HEDGE_DEFAULT_DELAY=0.05, LLM_HEDGE_MIN_DELAY=0):
+            result, name = hedger.run([("gemini", slow), ("groq", lambda: {"ok": 1})])
+
+        self.assertEqual(name, "groq")
+        self.assertTrue(stopped.wait(1))
+        time.sleep(0.05)
+        self.assertEqual(set(hedger.stats()["p90_ms"]), {"gemini", "groq"})
+
+    @override_settings(LLM_HEDGE_DEFAULT_DELAY=0.2, LLM_HEDGE_MIN_DELAY=0)
+    def test_failure_during_hedge_starts_next_immediately(self):
+        from core.hedging import Hedger
+
+        def failing():
+            time.sleep(0.05)
+            return None
+
+        start = time.monotonic()
+        result, name = Hedger().run([
+            ("gemini", lambda: time.sleep(1)), ("groq", failing), ("openrouter", lambda: {"ok": 1}),
+        ])
+
+        self.assertEqual(name, "openrouter")
+        self.assertLess(time.monotonic() - start, 0.4)
+
+    def test_router_skips_models_after_hedge_is_lost(self):
+        import threading
+        from core import hedging
+        from core.llm_router import ModelRouter
+
+        lost = threading.Event()
+        lost.set()
+        fn = mock.Mock(return_value="yanıt")
+        self.assertIsNone(hedging._with_cancel(lambda: ModelRouter().call("gemini", "m", fn), lost)())
+        fn.assert_not_called()
+
+    def test_async_losers_are_cancelled(self):
+        import asyncio
+        from core.hedging import Hedger
+
+        hedger = Hedger()
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        async def fast():
+            return {"ok": 1}
+
+        result, name = asyncio.run(hedger.arun([("gemini", slow), ("groq", fast)]))
+
+        self.assertEqual(name, "groq")
+        self.assertEqual(cancelled, [1])
+
+    @override_settings(LLM_HEDGING=True)
+    def test_chat_service_uses_hedger(self):
+        from core import chat_service
+
+        def slow_gemini(prompt):
+            time.sleep(0.5)
+            return None
+
+        groq_reply = {"intent": "ALISVERIS", "query": "iphone 15", "response": "Bakıyorum"}
+        with mock.patch.multiple(chat_service, GEMINI_API_KEY="g", GROQ_API_KEY="q", OPENROUTER_API_KEY=""), \
+                mock.patch.object(chat_service, "ask_gemini", side_effect=slow_gemini), \
+                mock.patch.object(chat_service, "ask_groq", return_value=groq_reply):
+            result = chat_service.analyze_user_message("kız kardeşime doğum günü hediyesi")
+
+        self.assertEqual(result["intent"], "shopping")
+        self.assertEqual(result["query"], "iphone 15")
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LLM_ROUTER_BACKOFF=0, LLM_ROUTER_BACKOFF_MAX=0)
+class LLMRouterTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+
+    def test_rate_limit_opens_circuit_for_all_workers(self):
+        from core.llm_router import ModelRouter, ProviderHTTPError
+
+        fn = mock.Mock(side_effect=ProviderHTTPError(429))
+        self.assertIsNone(ModelRouter().call("groq", "llama", fn))
+
+        other_worker = ModelRouter()
+        self.assertTrue(other_worker.is_open("groq", "llama"))
+        self.assertIsNone(other_worker.call("groq", "llama", fn))
+        self.assertEqual(fn.call_count, 1)
+        self.assertEqual(other_worker.order("groq", ["llama", "mixtral"]), ["mixtral"])
+
+    def test_transient_errors_are_retried(self):
+        from core.llm_router import ModelRouter, ProviderHTTPError
+
+        fn = mock.Mock(side_effect=[ProviderHTTPError(503), "ok"])
+        router = ModelRouter()
+
+        self.assertEqual(router.call("openrouter", "auto", fn), "ok")
+        self.assertEqual(fn.call_count, 2)
+        self.assertEqual(router.state("openrouter", "auto")["errors"], 0)
+
+    def test_hot_path_stays_in_memory(self):
+        from django.core.cache import cache
+        from core.llm_router import ModelRouter
+
+        router = ModelRouter()
+        fn = mock.Mock(return_value="ok")
+        with mock.patch.object(cache, "get", wraps=cache.get) as get, \
+                mock.patch.object(cache, "set", wraps=cache.set) as set_:
+            for _ in range(20):
+                router.order("gemini", ["flash"])
+                router.call("gemini", "flash", fn)
+        # Yalnızca ilk senkron: bir okuma, bir yazma
+        self.assertEqual((get.call_count, set_.call_count), (1, 1))
+        self.assertEqual(router.state("gemini", "flash")["calls"], 20)
+
+    @override_settings(LLM_ROUTER_SYNC_INTERVAL=0)
+    def test_workers_keep_their_own_error_counts(self):
+        from core.llm_router import ModelRouter
+
+        first, second = ModelRouter(), ModelRouter()
+        first.record_failure("groq", "llama")
+        second.record_failure("groq", "llama")
+        first.record_failure("groq", "llama")
+        self.assertEqual(first.state("groq", "llama")["errors"], 2)
+        self.assertEqual(second.state("groq", "llama")["errors"], 1)
+
+    @override_settings(LLM_ROUTER_ERROR_THRESHOLD=2)
+    def test_order_follows_health_and_repeated_errors_open_circuit(self):
+        from core.llm_router import ModelRouter
+
+        router = ModelRouter()
+        router.record_failure("gemini", "old")
+        router.record_success("gemini", "new", 0.4)
+        self.assertEqual(router.order("gemini", ["old", "new"]), ["new", "old"])
+
+        router.record_failure("gemini", "old")
+        self.assertEqual(router.order("gemini", ["old", "new"]), ["new"])
+
+
+class LocalIntentTests(SimpleTestCase):
+    def test_obvious_product_queries_resolve_locally(self):
+        from core.intent import classify_message
+
+        cases = {
+            "iphone 15 pro": "iphone 15 pro",
+            "siyah kablosuz kulaklık": "black wireless headphones",
+            "Samsung Galaxy S24 Ultra fiyatları": "samsung galaxy s24 ultra",
+            "kulaklığı almak istiyorum": "headphones",
+            "en ucuz ps5": "ps5",
+            "new balance 574": "new balance 574",
+            "mac": "mac",
+            "cep": "phone",
+        }
+        for message, query in cases.items():
+            result = classify_message(message)
+            self.assertEqual(result["intent"], "shopping", message)
+            self.assertEqual(result["query"], query)
+            self.assertGreaterEqual(result["confidence"], 0.8)
+
+    def test_ambiguous_messages_are_left_to_llm(self):
+        from core.intent import classify_message
+
+        for message in ["iphone mu samsung mu", "bana bir hediye öner", "bugün hava nasıl", "telefonum neden ısınıyor?"]:
+            self.assertLess(classify_message(message)["confidence"], 0.8, message)
+        self.assertEqual(classify_message("merhaba")["intent"], "chat")
+
+    def test_analyze_user_message_skips_llm_for_local_hits(self):
+        from core import chat_service
+
+        with mock.patch.object(chat_service, "GEMINI_API_KEY", "g"), \
+                mock.patch.object(chat_service, "ask_gemini") as ask:
+            result = chat_service.analyze_user_message("adidas nizza")
+
+        ask.assert_not_called()
+        self.assertEqual((result["intent"], result["query"]), ("shopping", "adidas nizza"))
+
+
+@override_settings(SPECULATIVE_FETCH=True)
+class SpeculativeFetchTests(SimpleTestCase):
+    # "iphone 15 pro max kılıfı şeffaf magsafe": yerel sınıflandırıcı emin değil, LLM'e gider
+    MESSAGE = "iphone 15 pro max kılıfı şeffaf magsafe"
+
+    def _slow_analysis(self, query):
+        def analyze(message, history=None):
+            time.sleep(0.1)
+            return {"intent": "shopping", "query": query, "response": "", "error": None}
+        return analyze
+
+    def test_matching_llm_query_reuses_speculative_result(self):
+        from core import speculation
+        from core.products import Product
+
+        before = speculation.stats()
+        fetch = mock.Mock(side_effect=lambda *a, **kw: time.sleep(0.05) or [Product(id="1", title="iPhone 15 Pro Max Kılıf")])
+        with mock.patch.object(speculation, "analyze_user_message", side_effect=self._slow_analysis("iphone 15 pro max case magsafe")), \
+                mock.patch.object(speculation, "get_all_products", fetch):
+            analysis, query, products = speculation.analyze_and_fetch(self.MESSAGE, [])
+
+        self.assertEqual(query, "iphone 15 pro max case magsafe")
+        self.assertEqual(len(products), 1)
+        fetch.assert_called_once()
+        after = speculation.stats()
+        self.assertEqual(after["hits"], before["hits"] + 1)
+        self.assertGreater(after["saved_ms"], before["saved_ms"])
+
+    def test_diverging_llm_query_discards_speculation(self):
+        from core import speculation
+
+        before = speculation.stats()
+        fetch = mock.Mock(return_value=[])
+        with mock.patch.object(speculation, "analyze_user_message", side_effect=self._slow_analysis("wireless charger")), \
+                mock.patch.object(speculation, "get_all_products", fetch):
+            _, query, _ = speculation.analyze_and_fetch(self.MESSAGE, [])
+
+        self.assertEqual(query, "wireless charger")
+        self.assertEqual([c.args[0] for c in fetch.call_args_list][-1], "wireless charger")
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(speculation.stats()["misses"], before["misses"] + 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, REQUEST_DEADLINE_MIN_CALL=0.5)
+class RequestDeadlineTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from core.ai_service import MEMORY_CACHE
+
+        cache.clear()
+        MEMORY_CACHE.clear_local()
+
+    def test_upstream_timeout_is_clamped_to_remaining_budget(self):
+        from core import http_clients
+        from core.deadline import Deadline, DeadlineExceeded
+
+        client = mock.Mock()
+        with mock.patch("core.http_clients.get_client", return_value=client):
+            with Deadline(2):
+                http_clients.get("https://serpapi.com/search.json", timeout=10)
+            self.assertLessEqual(client.request.call_args.kwargs["timeout"], 2)
+
+            with Deadline(0.1), self.assertRaises(DeadlineExceeded):
+                http_clients.get("https://serpapi.com/search.json", timeout=10)
+            self.assertEqual(client.request.call_count, 1)
+        self.assertTrue(issubclass(DeadlineExceeded, http_clients.UPSTREAM_ERRORS))
+
+    def test_deadline_follows_work_into_thread_pools(self):
+        from core import deadline
+        from core.sources import get_executor
+
+        with deadline.Deadline(5) as active:
+            self.assertIs(get_executor().submit(deadline.bind(deadline.current)).result(), active)
+        self.assertIsNone(deadline.current())
+
+    def test_expired_budget_skips_llm_without_hurting_model_health(self):
+        from core.deadline import Deadline
+        from core.llm_router import ModelRouter
+
+        fn = mock.Mock(return_value="ok")
+        router = ModelRouter()
+        with Deadline(0.1):
+            self.assertIsNone(router.call("groq", "llama", fn))
+        fn.assert_not_called()
+        self.assertEqual(router.state("groq", "llama")["errors"], 0)
+
+    def test_expired_budget_degrades_intent_and_commentary(self):
+        from core import chat_service
+        from core.ai_service import analyze_products
+        from core.deadline import Deadline
+        from core.products import Product
+
+        products = [
+            Product(id="1", title="Kulaklık A", site="Trendyol", price="499 TL", rating=4.1, review_count=30),
+            Product(id="2", title="Kulaklık B", site="Hepsiburada", price="899 TL", rating=4.8, review_count=12),
+        ]
+        with Deadline(0.1), mock.patch.object(chat_service, "ask_gemini") as gemini, \
+                mock.patch("core.http_clients.get_client") as get_client:
+            analysis = chat_service.analyze_user_message("kız kardeşime doğum günü hediyesi")
+            summary = analyze_products(products)
+
+        gemini.assert_not_called()
+        get_client.assert_not_called()
+        self.assertEqual(analysis, chat_service.self_fallback("kız kardeşime doğum günü hediyesi"))
+        self.assertEqual(summary["source"], "local")
+        self.assertIn("Kulaklık A", summary["data"]["commentary"])
+        self.assertIn("Kulaklık B", summary["data"]["commentary"])
+
+
+class ConversationStoreTests(TestCase):
+    PRODUCT = {"id": "1", "title": "iPhone 15", "price": "49.999 TL", "site": "trendyol.com"}
+
+    def _turn(self, session, n):
+        history = ChatHistory.load(session)
+        history.extend([
+            {"role": "user", "content": f"soru {n}"},
+            {"role": "assistant", "content": f"yanıt {n}", "products": [self.PRODUCT], "ai_summary": {"source": "cache"}},
+        ])
+        history.save()
+        return history
+
+    def test_turn_writes_only_its_own_messages(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from core.models import Message, Offer
+
+        session = {}
+        self._turn(session, 0)
+        with CaptureQueriesContext(connection) as first:
+            self._turn(session, 1)
+        for n in range(2, 20):
+            self._turn(session, n)
+        with CaptureQueriesContext(connection) as later:
+            self._turn(session, 20)
+
+        self.assertEqual(len(later), len(first))
+        self.assertEqual(list(session), ["conversation_id"])
+        self.assertEqual(Offer.objects.count(), 1)
+        self.assertEqual(Message.objects.count(), 42)
+
+        history = ChatHistory.load(session)
+        self.assertEqual(history[-1]["products"], [self.PRODUCT])
+        self.assertEqual(history[-1]["ai_summary"], {"source": "cache"})
+
+    def test_same_offer_from_new_search_is_stored_once(self):
+        from core.models import Offer
+
+        session = {}
+        for n in range(3):
+            history = ChatHistory.load(session)
+            # Her aramada yeni rastgele id ve farklı etiketler
+            history.append({"role": "assistant", "content": "",
+                            "products": [dict(self.PRODUCT, id=f"serp_0_{1000 + n}", tags=[str(n)])]})
+            history.save()
+        self.assertEqual(Offer.objects.count(), 1)
+
+        history = ChatHistory.load(session)
+        history.append({"role": "assistant", "content": "", "products": [dict(self.PRODUCT, price="48.999 TL")]})
+        history.save()
+        self.assertEqual(Offer.objects.count(), 2)
+
+    def test_shared_offer_keeps_tags_and_id_per_message(self):
+        from core.models import Offer
+
+        session = {}
+        history = ChatHistory.load(session)
+        history.append({"role": "assistant", "content": "",
+                        "products": [dict(self.PRODUCT, id="serp_0_1111", tags=["En iyi fiyat"])]})
+        history.append({"role": "assistant", "content": "",
+                        "compare_products": [dict(self.PRODUCT, id="serp_0_2222", tags=[])]})
+        history.save()
+
+        offer = Offer.objects.get()
+        self.assertNotIn("tags", offer.data)
+        self.assertNotIn("id", offer.data)
+
+        history = ChatHistory.load(session)
+        first, second = history[-2]["products"][0], history[-1]["compare_products"][0]
+        self.assertEqual((first["id"], first["tags"]), ("serp_0_1111", ["En iyi fiyat"]))
+        self.assertEqual((second["id"], second["tags"]), ("serp_0_2222", []))
+        self.assertEqual(first["title"], self.PRODUCT["title"])
+        self.assertNotIn("_offer_fields", history[-1])
+
+    def test_reset_deletes_conversation_and_prune_drops_orphan_offers(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from core import conversations
+        from core.models import Conversation, Message, Offer
+
+        kept, dropped = {}, {}
+        self._turn(kept, 0)
+        history = self._turn(dropped, 1)
+        history.append({"role": "assistant", "content": "", "products": [dict(self.PRODUCT, site="hepsiburada.com")]})
+        history.save()
+
+        conversations.reset(dropped)
+        self.assertEqual(dropped, {})
+        self.assertEqual(Conversation.objects.count(), 1)
+        self.assertEqual(Message.objects.count(), 2)
+        self.assertEqual(Offer.objects.count(), 2)
+
+        later = timezone.now() + timedelta(hours=2)
+        self.assertEqual(conversations.prune(now=later), {"conversations": 0, "offers": 1})
+        self.assertEqual(list(Offer.objects.values_list("data__site", flat=True)), ["trendyol.com"])
+
+        # Saklama süresini aşan sohbet de teklifleriyle gider
+        self.assertEqual(conversations.prune(days=0, now=later), {"conversations": 1, "offers": 1})
+        self.assertFalse(Message.objects.exists())
+
+    @override_settings(CHAT_HISTORY_LIMIT=4)
+    def test_history_is_capped_and_in_place_changes_saved(self):
+        from core.models import Message
+
+        session = {}
+        for n in range(3):
+            self._turn(session, n)
+        self.assertEqual(Message.objects.count(), 4)
+
+        history = ChatHistory.load(session)
+        self.assertEqual([m["content"] for m in history], ["soru 1", "yanıt 1", "soru 2", "yanıt 2"])
+        history[-1]["compare_products"] = [dict(self.PRODUCT, price="48.999 TL")]
+        history.changed(history[-1])
+        history.update_state(show_flight_section=True)
+        history.save()
+
+        reloaded = ChatHistory.load(session)
+        self.assertEqual(reloaded[-1]["compare_products"][0]["price"], "48.999 TL")
+        self.assertTrue(reloaded.state["show_flight_section"])
+
+
+class ConversationBenchmarkTests(TestCase):
+    def test_results_saved(self):
+        import tempfile
+        from django.core.management import call_command
+        from io import StringIO
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / "run.json"
+            call_command("bench_conversation", turns=6, products=3, window=2, max_growth=1000,
+                         output=str(output), stdout=StringIO())
+            data = json.loads(output.read_text(encoding="utf-8"))
+        self.assertEqual(len(data["turn_costs"]["store_save_ms"]), 6)
+        self.assertIn("legacy_ms", data["summary"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SERP_API_KEY="test-key", OFFER_INDEX_ENABLED=True, OFFER_INDEX_MIN_MATCHES=3)
+class OfferIndexTests(SimpleTestCase):
+    def setUp(self):
+        import tempfile
+        from django.core.cache import cache
+        from core import offer_index, utils
+
+        cache.clear()
+        utils.CACHE.clear_local()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(offer_index.close)
+        patcher = override_settings(OFFER_INDEX_PATH=str(Path(tmp.name) / "offers.sqlite3"))
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.payload = json.loads((Path(settings.BASE_DIR) / "raw_serp_deep_analysis.json").read_text(encoding="utf-8"))
+
+    def _fake_get(self, url, **kwargs):
+        if "serpapi" in url:
+            return _json_response(self.payload)
+        return _json_response([])
+
+    def test_related_queries_served_from_index(self):
+        from core.utils import get_all_products
+
+        with mock.patch("core.http_clients.get", side_effect=self._fake_get) as get:
+            get_all_products("iphone 15")
+            long_tail = get_all_products("iPhone 15 Pro Max")
+            colour = get_all_products("iphone 15 siyah")
+
+        serp_calls = [c for c in get.call_args_list if "serpapi" in c.args[0]]
+        self.assertEqual(len(serp_calls), 1)
+        self.assertTrue(long_tail)
+        self.assertTrue(all("pro max" in p.norm_title for p in long_tail))
+        self.assertTrue(all("siyah" in p.norm_title for p in colour))
+
+    def test_stale_or_thin_matches_fall_back_to_upstream(self):
+        from core import offer_index
+        from core.utils import build_serp_products
+
+        products = build_serp_products(self.payload["shopping_results"], "iphone", relax_filter=True)
+        offer_index.index_offers(products, now=time.time() - offer_index.max_age() - 1)
+        self.assertIsNone(offer_index.lookup("iphone 15"))
+
+        offer_index.index_offers(products)
+        self.assertIsNotNone(offer_index.lookup("iphone 15"))
+        self.assertIsNone(offer_index.lookup("samsung galaxy"))
+        # Aynı mağaza + başlık tek satır
+        rows = offer_index._connection().execute("SELECT COUNT(*) FROM offers").fetchone()[0]
+        self.assertEqual(rows, len({offer_index.offer_key(p) for p in products}))
+
+
+class FlightIntentTests(SimpleTestCase):
+    def test_gazetteer_routes_real_flights_only(self):
+        from core.intent import detect_flight_intent
+
+        for query in ["IST ESB", "İstanbul'dan Ankara'ya", "cheap flight to paris", "yarın izmir uçak bileti"]:
+            result = detect_flight_intent(query)
+            self.assertTrue(result["is_flight"], query)
+            self.assertGreater(result["confidence"], 0.7, query)
+        for query in ["iphone 15 pro max", "red cap", "seyahat çantası", "konser bileti", ""]:
+            self.assertFalse(detect_flight_intent(query)["is_flight"], query)
+
+        self.assertEqual(detect_flight_intent("IST ESB")["places"], ["İstanbul", "Ankara"])
+
+    def test_lowercase_codes_need_context(self):
+        from core.intent import detect_flight_intent
+
+        # ham (Hamburg), bal (Batman), ise (Isparta) aynı zamanda Türkçe kelime
+        for query in ["ham bal", "ise ham", "Ham Bal", "süzme ham bal 850 gr"]:
+            self.assertFalse(detect_flight_intent(query)["is_flight"], query)
+        for query in ["HAM BAL", "ist > cdg", "ist ankara", "ist esb uçuş"]:
+            self.assertEqual(len(detect_flight_intent(query)["places"]), 2, query)
+
+    def test_eval_command_reports_metrics(self):
+        import tempfile
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from io import StringIO
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / "intent.json"
+            call_command("eval_flight_intent", repeat=1, legacy=True, min_precision=0.9, min_recall=0.9,
+                         output=str(output), stdout=StringIO())
+            data = json.loads(output.read_text(encoding="utf-8"))
+        self.assertGreater(data["gazetteer"]["f1"], data["legacy"]["f1"])
+        self.assertIn("p95", data["gazetteer"]["latency_us"])
+
+        with self.assertRaises(CommandError):
+            call_command("eval_flight_intent", repeat=1, min_precision=1.01, stdout=StringIO())
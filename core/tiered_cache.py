@@ -0,0 +1,294 @@
+"""
+İki katmanlı cache:
+  L1 - process içi, boyutu sınırlı LRU (TTL'li)
+  L2 - paylaşılan Django cache backend'i (settings.CACHES), tüm worker'lar ortak
+
+L1 sıcak anahtarları kilit/IO olmadan döndürür, L2 aynı sorgunun her
+worker'da tekrar upstream'e gitmesini engeller.
+
+Stale-while-revalidate: her kayıt bir soft TTL (taze) ve bir hard TTL
+(en fazla ne kadar bayat sunulabilir) taşır. Soft TTL geçmiş ama hard TTL
+geçmemiş bir kayıt hemen döner, yenileme arka planda sınırlı bir thread
+havuzunda yapılır.
+
+aget_or_set: ASGI view'ları için async karşılık. Eşzamanlı istekler aynı
+event loop içinde tek bir task'a iner; bayat kayıtlar loop'ta arka plan
+task'ı ile yenilenir.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .singleflight import SingleFlight
+
+
+_refresh_executor = None
+_refresh_slots = None
+_refresh_lock = threading.Lock()
+
+
+def _get_refresh_executor():
+    """Arka plan yenilemeleri için paylaşılan, sınırlı havuz (+ sınırlı kuyruk)."""
+    global _refresh_executor, _refresh_slots
+    if _refresh_executor is None:
+        with _refresh_lock:
+            if _refresh_executor is None:
+                workers = getattr(settings, "CACHE_REFRESH_WORKERS", 4)
+                _refresh_slots = threading.BoundedSemaphore(workers * 4)
+                _refresh_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="finda-refresh")
+    return _refresh_executor, _refresh_slots
+
+
+class TieredCache:
+    def __init__(self, prefix, ttl=600, max_entries=256, backend="default", stale_ttl=0):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.backend = backend
+        self._local = OrderedDict()  # key -> (fresh_until, stale_until, value)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._inflight = {}  # (id(loop), key) -> asyncio.Task
+        self.coalesced_async = 0
+        self.hits_local = 0
+        self.hits_shared = 0
+        self.hits_stale = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.flights = SingleFlight(prefix, backend=backend)
+
+    def _shared_key(self, key):
+        digest = hashlib.md5(str(key).encode("utf-8")).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    def _shared(self):
+        return caches[self.backend]
+
+    def get_entry(self, key):
+        """(value, is_stale) ya da None. Hard TTL'i geçmiş kayıtlar yok sayılır."""
+        now = time.time()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                fresh_until, stale_until, value = entry
+                if stale_until > now:
+                    self._local.move_to_end(key)
+                    self.hits_local += 1
+                    return value, fresh_until <= now
+                del self._local[key]
+
+        try:
+            shared = self._shared().get(self._shared_key(key))
+        except Exception as e:
+            print(f"Shared cache read error ({self.prefix}):", e)
+            shared = None
+
+        if shared is not None:
+            fresh_until, stale_until, value = shared
+            if stale_until > now:
+                self._set_local(key, (fresh_until, stale_until, value))
+                with self._lock:
+                    self.hits_shared += 1
+                return value, fresh_until <= now
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get(self, key, default=None):
+        """Sadece taze kayıt döner."""
+        entry = self.get_entry(key)
+        if entry is None or entry[1]:
+            return default
+        return entry[0]
+
+    def set(self, key, value, ttl=None, stale_ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        now = time.time()
+        entry = (now + ttl, now + ttl + stale_ttl, value)
+        self._set_local(key, entry)
+        try:
+            self._shared().set(self._shared_key(key), entry, timeout=max(1, int(ttl + stale_ttl)))
+        except Exception as e:
+            print(f"Shared cache write error ({self.prefix}):", e)
+
+    def get_or_set(self, key, compute, ttl=None, ttl_for=None):
+        """
+        Cache'te yoksa compute() ile üret ve sakla. Aynı anahtar için eşzamanlı
+        istekler (process içi ve worker'lar arası) tek bir compute çağrısına iner.
+        Bayat kayıt varsa hemen döner ve arka planda yenilenir.
+        compute() None dönerse hiçbir şey saklanmaz.
+        ttl_for(value): değere göre soft TTL (örn. mağaza bazlı) seçmek için.
+        """
+        entry = self.get_entry(key)
+        if entry is not None:
+            value, is_stale = entry
+            if is_stale:
+                with self._lock:
+                    self.hits_stale += 1
+                self.refresh_async(key, compute, ttl=ttl, ttl_for=ttl_for)
+            return value
+
+        def _leader():
+            value = self.get(key)
+            if value is None:
+                value = self._compute_and_set(key, compute, ttl, ttl_for)
+            return value
+
+        return self.flights.do(key, _leader, lookup=lambda: self.get(key))
+
+    def _compute_and_set(self, key, compute, ttl, ttl_for):
+        value = compute()
+        if value is not None:
+            if ttl_for is not None:
+                ttl = ttl_for(value)
+            self.set(key, value, ttl)
+        return value
+
+    async def aget_or_set(self, key, acompute, ttl=None, ttl_for=None):
+        """
+        get_or_set'in async karşılığı; acompute() bir coroutine döner.
+        Aynı loop'taki eşzamanlı istekler tek bir acompute task'ını bekler.
+        """
+        entry = self.get_entry(key)
+        if entry is not None:
+            value, is_stale = entry
+            if is_stale:
+                with self._lock:
+                    self.hits_stale += 1
+                self._arefresh(key, acompute, ttl, ttl_for)
+            return value
+
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        task = self._inflight.get(flight_key)
+        if task is None:
+            task = loop.create_task(self._acompute_and_set(key, acompute, ttl, ttl_for))
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(flight_key, None))
+        else:
+            self.coalesced_async += 1
+        # shield: bekleyenlerden biri iptal edilse de diğerleri sonucu alır
+        return await asyncio.shield(task)
+
+    async def _acompute_and_set(self, key, acompute, ttl, ttl_for):
+        value = await acompute()
+        if value is not None:
+            if ttl_for is not None:
+                ttl = ttl_for(value)
+            self.set(key, value, ttl)
+        return value
+
+    def _arefresh(self, key, acompute, ttl, ttl_for):
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+
+        async def _run():
+            try:
+                await self._acompute_and_set(key, acompute, ttl, ttl_for)
+                with self._lock:
+                    self.refreshes += 1
+            except Exception as e:
+                print(f"Background refresh error ({self.prefix}):", e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        # Boş bağlam: yenileme, onu tetikleyen isteğin bütçesiyle (core/deadline.py) kesilmesin
+        asyncio.get_running_loop().create_task(_run(), context=contextvars.Context())
+        return True
+
+    def refresh_async(self, key, compute, ttl=None, ttl_for=None):
+        """
+        Arka planda yenile. Aynı anahtar için process içinde tek yenileme,
+        worker'lar arasında paylaşılan cache kilidiyle tek yenileme yapılır.
+        Havuz kuyruğu doluysa yenileme atlanır (bir sonraki istek dener).
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+
+        executor, slots = _get_refresh_executor()
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self._refreshing.discard(key)
+            return False
+
+        def _run():
+            lock_key = f"{self._shared_key(key)}:refresh"
+            try:
+                try:
+                    acquired = self._shared().add(lock_key, 1, timeout=self.flights.lock_ttl)
+                except Exception:
+                    acquired = True
+                if not acquired:
+                    return
+                try:
+                    self._compute_and_set(key, compute, ttl, ttl_for)
+                    with self._lock:
+                        self.refreshes += 1
+                finally:
+                    try:
+                        self._shared().delete(lock_key)
+                    except Exception:
+                        pass
+            except Exception as e:
+                print(f"Background refresh error ({self.prefix}):", e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+                slots.release()
+
+        executor.submit(_run)
+        return True
+
+    def _set_local(self, key, entry):
+        with self._lock:
+            self._local[key] = entry
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+        try:
+            self._shared().delete(self._shared_key(key))
+        except Exception:
+            pass
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._local)
+
+    def stats(self):
+        return {
+            "local_entries": len(self._local),
+            "max_entries": self.max_entries,
+            "hits_local": self.hits_local,
+            "hits_shared": self.hits_shared,
+            "hits_stale": self.hits_stale,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "coalesced_async": self.coalesced_async,
+            **self.flights.stats(),
+        }
@@ -1,5 +1,12 @@
+from django.conf import settings
 from django.urls import path
-from .views import home, search_ajax
+from . import views
+
+# ASGI (uvicorn) altında async view'lar, WSGI'da sync view'lar
+if settings.ASYNC_VIEWS:
+    home, search_ajax = views.home_async, views.search_ajax_async
+else:
+    home, search_ajax = views.home, views.search_ajax
 
 urlpatterns = [
     path("", home, name="home"),
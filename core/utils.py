@@ -1,24 +1,33 @@
-import requests
 import random
-import re
 import os
-import difflib
 from urllib.parse import urlparse, parse_qs, quote
 from django.conf import settings
-import time
 
-CACHE = {}
+from asgiref.sync import sync_to_async
+
+from . import http_clients, offer_index
+from .dedupe import DedupeIndex
+from .products import Product, normalize_title
+from .sources import register_source, fetch_from_sources, afetch_from_sources
+from .tiered_cache import TieredCache
+
+SERP_API_URL = f"{http_clients.UPSTREAMS['serpapi']}/search.json"
+FAKESTORE_URL = f"{http_clients.UPSTREAMS['fakestore']}/products"
+
+# Ham upstream payload'ları (SerpAPI shopping_results, FakeStore kataloğu)
+# normalize sorgu başına bir kez saklanır. Strict/relaxed filtre, dedupe ve
+# compare gruplaması bu payload üzerinde bellekte üretilen görünümlerdir.
+# L1: worker içi LRU, L2: settings.CACHES["default"] (tüm worker'lar ortak)
+CACHE = TieredCache(
+    "upstream_payload",
+    ttl=getattr(settings, "PRODUCT_CACHE_TTL", 600),
+    max_entries=getattr(settings, "PRODUCT_CACHE_LOCAL_ENTRIES", 256),
+    stale_ttl=getattr(settings, "PRODUCT_CACHE_STALE_TTL", 3600),
+)
 
 # -------------------------
 # TEXT NORMALIZATION & UTILS
 # -------------------------
-def normalize_title(title):
-    text = title.lower()
-    text = re.sub(r"[^a-z0-9çğıöşü ]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
-
 def _query_tokens(query):
     text = normalize_title(query or "")
     tokens = [t for t in text.split() if len(t) > 1]
@@ -35,9 +44,11 @@ def _is_relevant_title(title, query, min_match_ratio=0.6):
     return (matches / len(tokens)) >= min_match_ratio
 
 
-def _relevance_score(title, query):
-    title_norm = normalize_title(title or "")
-    tokens = _query_tokens(query)
+def _relevance_score(title, query, title_norm=None, tokens=None):
+    if title_norm is None:
+        title_norm = normalize_title(title or "")
+    if tokens is None:
+        tokens = _query_tokens(query)
     if not tokens:
         return 0.0
     matches = sum(1 for t in tokens if t in title_norm)
@@ -87,114 +98,273 @@ def extract_real_link(google_link, title="", source=""):
 
     return google_link
 
+# -------------------------
+# UPSTREAM PAYLOAD CACHE
+# -------------------------
+def normalize_query(query):
+    """Payload cache anahtarı: büyük/küçük harf ve boşluk farkları aynı sorgudur."""
+    return " ".join((query or "").lower().split())
+
+
+def product_cache_ttl(items):
+    """
+    Payload'ın soft TTL'i: settings.PRODUCT_CACHE_TTLS kaynak/mağaza bazlı
+    TTL verir (site adında aranır, örn. {"trendyol": 300, "fakestore": 3600}).
+    Eşleşmeyen kayıtlar varsayılan TTL'i kullanır; sonuç en kısa TTL'i alır.
+    items: Product listesi ya da ham SerpAPI kayıtları ("source" alanı).
+    """
+    overrides = getattr(settings, "PRODUCT_CACHE_TTLS", {})
+    if not items or not overrides:
+        return CACHE.ttl
+    ttls = []
+    for r in items:
+        if isinstance(r, Product):
+            site = r.site
+        else:
+            site = r.get("source") or r.get("site") or ""
+        site = site.lower()
+        matched = [ttl for name, ttl in overrides.items() if name.lower() in site]
+        ttls.append(min(matched) if matched else CACHE.ttl)
+    return min(ttls)
+
+
 # -------------------------
 # SERP API (GÜÇLENDİRİLMİŞ)
 # -------------------------
-def fetch_serp_products(query, relax_filter=False):
-    results = []
-    api_key = getattr(settings, "SERP_API_KEY", os.getenv("SERP_API_KEY", "")).strip()
+def _serp_api_key():
+    return getattr(settings, "SERP_API_KEY", os.getenv("SERP_API_KEY", "")).strip()
 
-    if not api_key:
-        print("SERP API KEY bulunamadı")
-        return results
 
-    params = {
+def _serp_params(query):
+    return {
         "engine": "google_shopping",
         "q": query,
-        "api_key": api_key,
+        "api_key": _serp_api_key(),
         "gl": "tr",
         "hl": "tr",
         "direct_link": "true"
     }
 
+
+def _request_serp_payload(query, timeout):
     try:
-        response = requests.get("https://serpapi.com/search.json", params=params, timeout=10)
+        print("🌐 API'DEN GELDİ (SerpAPI):", query)
+        response = http_clients.get(SERP_API_URL, params=_serp_params(query), timeout=timeout)
         data = response.json()
         shopping_results = data.get("shopping_results", [])
+        offer_index.index_offers(build_serp_products(shopping_results, query, relax_filter=True))
+        return shopping_results
+    except Exception as e:
+        print("SerpAPI Error:", e)
+        return None
+
 
-        for i, p in enumerate(shopping_results[:20]):
-            p_id = f"serp_{i}_{random.randint(1000,9999)}"
-            
-            # Ham linki al
-            raw_link = p.get("product_link") or p.get("direct_link")
-
-            offers = p.get("offers")
-            if not raw_link and offers and isinstance(offers, list) and len(offers) > 0:
-                raw_link = offers[0].get("link")
-
-            if not raw_link:
-                raw_link = p.get("product_link") or p.get("link") or "#"
-
-            # FİNDA DOKUNUŞU: Linki mağazaya zorla
-            product_title = p.get("title", "")
-            if not relax_filter and not _is_relevant_title(product_title, query, min_match_ratio=0.6):
-                continue
-            source_name = p.get("source", "")
-            final_link = extract_real_link(raw_link, product_title, source_name)
-
-            # Site Renkleri
-            source_lower = source_name.lower()
-            site_color = "warning"
-            if "trendyol" in source_lower: site_color = "orange"
-            elif "hepsiburada" in source_lower: site_color = "hb"
-            elif "amazon" in source_lower: site_color = "amazon"
-            elif "n11" in source_lower: site_color = "n11"
-            elif "boyner" in source_lower: site_color = "boyner"
-
-            results.append({
-                "id": p_id,
-                "title": product_title,
-                "price": p.get("price", "Fiyat yok"),
-                "image": p.get("thumbnail") or p.get("image"),
-                "images": p.get("images") or ([p.get("thumbnail")] if p.get("thumbnail") else ([])),
-                "brand": source_name,
-                "rating": p.get("rating", 0),
-                "review_count": p.get("reviews", 0),
-                "reviews": p.get("reviews") if isinstance(p.get("reviews"), list) else [],
-                "site": source_name,
-                "site_color": site_color,
-                "delivery_info": p.get("delivery", "Mağaza Detayı"),
-                "positive_ratio": int(p.get("rating", 0) * 20) if p.get("rating") else 0,
-                "review_summary": p.get("review_summary", ""),
-                "description": p.get("snippet", ""),
-                "link": final_link
-            })
+async def _arequest_serp_payload(query, timeout):
+    try:
+        print("🌐 API'DEN GELDİ (SerpAPI):", query)
+        response = await http_clients.aget(SERP_API_URL, params=_serp_params(query), timeout=timeout)
+        data = response.json()
+        shopping_results = data.get("shopping_results", [])
+        await sync_to_async(offer_index.index_offers, thread_sensitive=False)(
+            build_serp_products(shopping_results, query, relax_filter=True)
+        )
+        return shopping_results
     except Exception as e:
         print("SerpAPI Error:", e)
+        return None
+
+
+def fetch_serp_payload(query, timeout=10):
+    """
+    Sorgunun ham shopping_results listesi. Normalize sorgu başına tek bir
+    SerpAPI çağrısı yapılır; eşzamanlı istekler aynı çağrıyı bekler, bayat
+    kayıt hemen döner ve arka planda yenilenir. Hata durumunda None (cache'lenmez).
+    """
+    if not _serp_api_key():
+        print("SERP API KEY bulunamadı")
+        return None
+    return CACHE.get_or_set(
+        f"serp:{normalize_query(query)}",
+        lambda: _request_serp_payload(query, timeout),
+        ttl_for=product_cache_ttl,
+    )
+
+
+async def afetch_serp_payload(query, timeout=10):
+    """fetch_serp_payload'un async karşılığı (aynı cache anahtarı)."""
+    if not _serp_api_key():
+        print("SERP API KEY bulunamadı")
+        return None
+    return await CACHE.aget_or_set(
+        f"serp:{normalize_query(query)}",
+        lambda: _arequest_serp_payload(query, timeout),
+        ttl_for=product_cache_ttl,
+    )
 
+
+def build_serp_products(shopping_results, query, relax_filter=False):
+    """Ham payload'dan Product listesi; upstream çağrısı yapmaz."""
+    results = []
+    for i, p in enumerate(shopping_results[:20]):
+        p_id = f"serp_{i}_{random.randint(1000,9999)}"
+        
+        # Ham linki al
+        raw_link = p.get("product_link") or p.get("direct_link")
+
+        offers = p.get("offers")
+        if not raw_link and offers and isinstance(offers, list) and len(offers) > 0:
+            raw_link = offers[0].get("link")
+
+        if not raw_link:
+            raw_link = p.get("product_link") or p.get("link") or "#"
+
+        # FİNDA DOKUNUŞU: Linki mağazaya zorla
+        product_title = p.get("title", "")
+        if not relax_filter and not _is_relevant_title(product_title, query, min_match_ratio=0.6):
+            continue
+        source_name = p.get("source", "")
+        final_link = extract_real_link(raw_link, product_title, source_name)
+
+        # Site Renkleri
+        source_lower = source_name.lower()
+        site_color = "warning"
+        if "trendyol" in source_lower: site_color = "orange"
+        elif "hepsiburada" in source_lower: site_color = "hb"
+        elif "amazon" in source_lower: site_color = "amazon"
+        elif "n11" in source_lower: site_color = "n11"
+        elif "boyner" in source_lower: site_color = "boyner"
+
+        results.append(Product(
+            id=p_id,
+            title=product_title,
+            price=p.get("price", "Fiyat yok"),
+            image=p.get("thumbnail") or p.get("image"),
+            images=p.get("images") or ([p.get("thumbnail")] if p.get("thumbnail") else ([])),
+            brand=source_name,
+            rating=p.get("rating", 0),
+            review_count=p.get("reviews", 0),
+            reviews=p.get("reviews") if isinstance(p.get("reviews"), list) else [],
+            site=source_name,
+            site_color=site_color,
+            delivery_info=p.get("delivery", "Mağaza Detayı"),
+            positive_ratio=int(p.get("rating", 0) * 20) if p.get("rating") else 0,
+            review_summary=p.get("review_summary", ""),
+            description=p.get("snippet", ""),
+            link=final_link
+        ))
     return results
 
+
+def fetch_serp_products(query, relax_filter=False, timeout=10):
+    shopping_results = fetch_serp_payload(query, timeout=timeout)
+    if not shopping_results:
+        return []
+    return build_serp_products(shopping_results, query, relax_filter=relax_filter)
+
 # -------------------------
 # DEMO APIs (FakeStore + DummyJSON)
 # -------------------------
-def fetch_demo_products(query):
+def _request_fakestore_catalog(timeout):
+    try:
+        print("🌐 API'DEN GELDİ (FakeStore)")
+        return http_clients.get(FAKESTORE_URL, timeout=timeout).json()
+    except Exception as e:
+        print("FakeStore Error:", e)
+        return None
+
+
+async def _arequest_fakestore_catalog(timeout):
+    try:
+        print("🌐 API'DEN GELDİ (FakeStore)")
+        return (await http_clients.aget(FAKESTORE_URL, timeout=timeout)).json()
+    except Exception as e:
+        print("FakeStore Error:", e)
+        return None
+
+
+def _fakestore_ttl(_catalog):
+    return product_cache_ttl([{"source": "FakeStore"}])
+
+
+def fetch_fakestore_catalog(timeout=5):
+    """FakeStore kataloğu sorgudan bağımsızdır; tek kayıt olarak saklanır."""
+    return CACHE.get_or_set(
+        "fakestore:catalog",
+        lambda: _request_fakestore_catalog(timeout),
+        ttl_for=_fakestore_ttl,
+    )
+
+
+async def afetch_fakestore_catalog(timeout=5):
+    return await CACHE.aget_or_set(
+        "fakestore:catalog",
+        lambda: _arequest_fakestore_catalog(timeout),
+        ttl_for=_fakestore_ttl,
+    )
+
+
+def fetch_demo_products(query, timeout=5):
+    return build_demo_products(fetch_fakestore_catalog(timeout=timeout) or [], query)
+
+
+async def afetch_demo_products(query, timeout=5):
+    return build_demo_products(await afetch_fakestore_catalog(timeout=timeout) or [], query)
+
+
+def build_demo_products(catalog, query):
+    """FakeStore kataloğundan sorguya uyan Product listesi; upstream çağrısı yapmaz."""
     results = []
     query_words = _query_tokens(query)
     try:
-        res = requests.get("https://fakestoreapi.com/products", timeout=5)
-        for p in res.json():
+        for p in catalog:
             title_lower = p["title"].lower()
             if query_words:
                 match_count = sum(1 for w in query_words if w in title_lower)
                 if match_count / len(query_words) < 0.6:
                     continue
-            results.append({
-                "id": f"fs_{p['id']}",
-                "title": p["title"],
-                "price": f"{p['price']} $",
-                "image": p["image"],
-                "images": [p["image"]],
-                "rating": p.get("rating", {}).get("rate", 0),
-                "review_count": p.get("rating", {}).get("count", 0),
-                "site": "FakeStore",
-                "site_color": "primary",
-                "delivery_info": "2-3 gün",
-                "positive_ratio": int(p.get("rating", {}).get("rate", 0) * 20),
-                "link": "#"
-            })
+            results.append(Product(
+                id=f"fs_{p['id']}",
+                title=p["title"],
+                price=f"{p['price']} $",
+                image=p["image"],
+                images=[p["image"]],
+                rating=p.get("rating", {}).get("rate", 0),
+                review_count=p.get("rating", {}).get("count", 0),
+                site="FakeStore",
+                site_color="primary",
+                delivery_info="2-3 gün",
+                positive_ratio=int(p.get("rating", {}).get("rate", 0) * 20),
+                link="#"
+            ))
     except: pass
     return results
 
+# -------------------------
+# SOURCE REGISTRY
+# -------------------------
+def fetch_serp_source(query, timeout=10):
+    """Strict filtre, yetersizse aynı payload üzerinde relaxed filtre (ek çağrı yok)."""
+    return _serp_source_products(fetch_serp_payload(query, timeout=timeout), query)
+
+
+async def afetch_serp_source(query, timeout=10):
+    return _serp_source_products(await afetch_serp_payload(query, timeout=timeout), query)
+
+
+def _serp_source_products(shopping_results, query):
+    if not shopping_results:
+        return []
+    serp_results = build_serp_products(shopping_results, query, relax_filter=False)
+    if len(serp_results) < 5:
+        serp_results = build_serp_products(shopping_results, query, relax_filter=True)
+    return serp_results
+
+
+register_source("serp", fetch_serp_source, timeout=10, max_concurrency=8, afetch=afetch_serp_source)
+register_source("demo", fetch_demo_products, timeout=5, max_concurrency=4, fallback=True,
+                afetch=afetch_demo_products)
+
+
 # -------------------------
 # DEDUPLICATION LOGIC
 # -------------------------
@@ -218,36 +388,14 @@ def deduplicate_products(products):
 
 
 def deduplicate_products_v2(products, similarity_threshold=0.84):
-    unique = []
-
+    """Yakın-kopya ürünleri ayıkla (bkz. core.dedupe.DedupeIndex)."""
+    index = DedupeIndex(similarity_threshold=similarity_threshold, normalize=normalize_title)
     for product in products:
-        title = normalize_title(product.get("title", ""))
-        if not title:
-            continue
-        is_duplicate = False
-        for u in unique:
-            u_title = normalize_title(u.get("title", ""))
-            if not u_title:
-                continue
-
-            # Token overlap (fast check)
-            tokens_a = set(title.split())
-            tokens_b = set(u_title.split())
-            if tokens_a and tokens_b:
-                overlap = len(tokens_a & tokens_b) / max(1, len(tokens_a | tokens_b))
-                if overlap < 0.55:
-                    continue
-
-            # Character-level similarity
-            sm = difflib.SequenceMatcher(None, title, u_title)
-            if sm.ratio() >= similarity_threshold:
-                is_duplicate = True
-                break
-
-        if not is_duplicate:
-            unique.append(product)
-
-    return unique
+        if isinstance(product, Product):
+            index.add(product, product.norm_title, product.tokens)
+        else:
+            index.add(product)
+    return index.items
 
 
 # -------------------------
@@ -258,35 +406,33 @@ def get_all_products(query, compare_mode=False):
     query: Aranacak ürün/başlık
     compare_mode: True = Aynı ürün farklı satıcılardan (5 satıcı), 
                   False = Benzersiz ürünler (dedupe)
+
+    Upstream payload'ları CACHE'te tutulur (bkz. fetch_serp_payload); iki mod
+    da aynı payload'ı kullanır, burada sadece bellekte görünüm üretilir.
+    Daha önce görülmüş tekliflerle karşılanabilen sorgular (ilişkili/long-tail)
+    yerel indeksten döner, upstream'e gidilmez (bkz. core/offer_index.py).
     """
-    now = time.time()
-
-    # cache varsa ve süresi geçmediyse
-    cache_key = f"{query}_{compare_mode}"
-    if cache_key in CACHE:
-        cached_data, cached_time = CACHE[cache_key]
-        if now - cached_time < 600:
-            print("✅ CACHE'DEN GELDİ:", query, f"(compare_mode={compare_mode})")
-            return cached_data
-        else:
-            del CACHE[cache_key]
+    indexed = offer_index.lookup(query, compare_mode=compare_mode)
+    if indexed is not None:
+        return _shape_results(indexed, query, compare_mode)
+    # Tüm kaynaklar paralel; demo sadece SerpAPI yetersizse eklenir
+    return _shape_results(fetch_from_sources(query), query, compare_mode)
 
-    print("🌐 API'DEN GELDİ:", query, f"(compare_mode={compare_mode})")
 
-    results = []
-    serp_results = fetch_serp_products(query, relax_filter=False)
-    if len(serp_results) < 5:
-        serp_results = fetch_serp_products(query, relax_filter=True)
-    results.extend(serp_results)
+async def aget_all_products(query, compare_mode=False):
+    """get_all_products'ın async karşılığı (ASGI view'ları için)."""
+    indexed = await sync_to_async(offer_index.lookup, thread_sensitive=False)(query, compare_mode=compare_mode)
+    if indexed is not None:
+        return _shape_results(indexed, query, compare_mode)
+    return _shape_results(await afetch_from_sources(query), query, compare_mode)
 
-    if len(results) < 5:
-        results.extend(fetch_demo_products(query))
 
+def _shape_results(results, query, compare_mode):
     if compare_mode:
         # COMPARE MODE: Aynı ürünü satıcılardan getir (max 5, farklı mağaza)
         site_map = {}
         for r in results:
-            site = r.get("site")
+            site = r.site
             if site and site not in site_map:
                 site_map[site] = r
         results = list(site_map.values())[:5]
@@ -295,14 +441,18 @@ def get_all_products(query, compare_mode=False):
         # NORMAL MODE: Duplicate ürünleri kaldır
         results = deduplicate_products_v2(results)
     
+    return rank_products(results, query)
+
+
+def rank_products(results, query):
     # Sıra karıştır ama en iyileri yukarıya al (rating + review'e göre)
+    query_tokens = _query_tokens(query)
     results.sort(key=lambda x: (
-        _relevance_score(x.get("title", ""), query),
-        float(x.get("rating", 0)) or 0,
-        int(str(x.get("review_count", 0)).replace(",", "")) or 0
+        _relevance_score(x.title, query, title_norm=x.norm_title, tokens=query_tokens),
+        x.rating_value,
+        x.review_value
     ), reverse=True)
 
-    CACHE[cache_key] = (results, now)
     return results
 
 # import requests
@@ -1,327 +1,471 @@
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponse
-from .utils import get_all_products
-from .ai_service import analyze_products
-from .chat_service import analyze_user_message
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from .utils import get_all_products, aget_all_products
+from .deadline import bind_stream, with_deadline
+from .conversations import ChatHistory, areset as areset_conversation, reset as reset_conversation
+from .products import Product
+from .ai_service import analyze_products, aanalyze_products, tag_products
+from .chat_service import shopping_query
+from .speculation import analyze_and_fetch, aanalyze_and_fetch
+from .flow import adrive, adrive_stream, drive, drive_stream, io
 from .intent import detect_flight_intent
-from flights.services import search_flights
+from flights.services import afare_calendar, aget_flight_offers, fare_calendar, get_flight_offers
 
 from django.template.loader import render_to_string
 from django.views.decorators.http import require_http_methods
 
-AIRLINE_NAMES = {
-    "TK": "Türk Hava Yolları",
-    "PC": "Pegasus",
-    "XQ": "SunExpress",
-    "VF": "AJet",
-    "AJ": "AnadoluJet",
-    "LH": "Lufthansa",
-    "AF": "Air France",
-    "BA": "British Airways",
-    "KL": "KLM",
-    "EK": "Emirates",
-    "QR": "Qatar Airways",
-    "EY": "Etihad",
-}
-
 
 def build_flight_summary(flight_results):
-    data = flight_results.get("data") if isinstance(flight_results, dict) else None
-    if not data:
-        return ""
-    cheapest = None
-    cheapest_price = None
-    for offer in data:
-        try:
-            price_total = float(offer.get("price", {}).get("total", 0))
-        except (TypeError, ValueError):
-            price_total = None
-        if price_total is None:
-            continue
-        if cheapest_price is None or price_total < cheapest_price:
-            cheapest_price = price_total
-            cheapest = offer
-    if not cheapest:
-        return ""
-    seg0 = cheapest.get("itineraries", [{}])[0].get("segments", [{}])[0]
-    dep = (seg0.get("departure", {}) or {}).get("at", "")
-    dep_time = dep[11:16] if len(dep) >= 16 else dep
-    airline = (cheapest.get("validatingAirlineCodes") or [""])[0]
-    currency = cheapest.get("price", {}).get("currency", "")
-    duration = cheapest.get("itineraries", [{}])[0].get("duration", "")
-    dur_text = duration.replace("PT", "").replace("H", "s ").replace("M", "dk").strip()
-    segments = cheapest.get("itineraries", [{}])[0].get("segments", [])
-    stops = max(0, len(segments) - 1)
-    stop_text = "direkt" if stops == 0 else f"{stops} aktarma"
-    airline_name = AIRLINE_NAMES.get(airline, airline)
-    return f"En uygun uçuş {dep_time} saatinde, {airline_name} ile ({stop_text}, {dur_text}). Fiyat: {cheapest_price} {currency}"
-
-
-def normalize_flight_results(flight_results):
-    if not isinstance(flight_results, dict):
-        return flight_results
-    data = flight_results.get("data")
-    if not isinstance(data, list):
-        return flight_results
-    for offer in data:
-        code = (offer.get("validatingAirlineCodes") or [""])[0]
-        offer["airline_code"] = code
-        offer["airline_name"] = AIRLINE_NAMES.get(code, code or "Airline")
-    return flight_results
+    """Özet aramada bir kez hesaplanır (flights/offers.py); burada sadece okunur."""
+    return flight_results.get("summary", "") if isinstance(flight_results, dict) else ""
 
 
-@require_http_methods(["GET", "POST"])
-def search_ajax(request):
-    if request.GET.get("new_chat") == "true":
-        if 'chat_history' in request.session:
-            del request.session['chat_history']
-        return HttpResponse("")
+def session_products(products):
+    """Mesajlar JSON ile saklanır (core/conversations.py): Product kayıtlarını sade dict'e çevir."""
+    return [p.to_dict() if isinstance(p, Product) else p for p in products]
 
-    if 'chat_history' not in request.session:
-        request.session['chat_history'] = []
 
-    chat_history = request.session['chat_history']
-    user_message = request.POST.get("query", "") or request.GET.get("query", "")
-    compare_mode = request.GET.get("compare") == "true" or request.POST.get("compare") == "true"
-    site_filter = (request.POST.get("site", "") or request.GET.get("site", "")).strip().lower()
+def session_summary(ai_result):
+    """AI sonucu, ürünler mesajda zaten tutulduğu için onlarsız saklanır."""
+    return {k: v for k, v in ai_result.items() if k != "products"}
 
-    # Flight state
-    flight_form_data = request.session.get("flight_form_data", {})
+
+def parse_flight_form(request):
+    """Uçuş formu eksiksizse {"origin", "destination", "date", "adults"}, değilse None."""
     origin = request.POST.get("origin", "").strip().upper()
     destination = request.POST.get("destination", "").strip().upper()
     date = request.POST.get("date", "")
     adults_input = request.POST.get("adults", "1")
+    if not (origin and destination and date):
+        return None
+    try:
+        adults = int(adults_input) if adults_input else 1
+        adults = max(1, adults)
+    except (ValueError, TypeError):
+        adults = 1
+    return {
+        "origin": origin,
+        "destination": destination,
+        "date": date,
+        "adults": adults,
+        "flex": request.POST.get("flex") == "1",  # ±FARE_CALENDAR_DAYS gün fiyat takvimi
+    }
+
+
+# -------------------------
+# SYNC / ASYNC ORTAK AKIŞ
+# -------------------------
+# View gövdeleri core/flow.py akışlarıdır: sync view drive, async view adrive
+# ile aynı generator'ı sürer.
+arender_to_string = sync_to_async(render_to_string)
+arender = sync_to_async(render)
+
+
+def search_flight_form(flight_form):
+    """Formdaki uçuş araması (cache'li); esnek tarihte en ucuz gün takvimi de eklenir."""
+    args = (flight_form["origin"], flight_form["destination"], flight_form["date"])
+    flight_results = yield io(get_flight_offers, aget_flight_offers, *args, adults=flight_form["adults"])
+    if flight_form.get("flex") and not flight_results.get("error"):
+        calendar = yield io(fare_calendar, afare_calendar, *args, adults=flight_form["adults"])
+        flight_results = {**flight_results, "calendar": calendar}
+    return flight_results
 
-    # Flight form submission
-    if origin and destination and date and not user_message:
-        try:
-            adults = int(adults_input) if adults_input else 1
-            adults = max(1, adults)
-        except (ValueError, TypeError):
-            adults = 1
-
-        flight_results = normalize_flight_results(search_flights(origin, destination, date, adults=adults))
-        flight_ai_summary = build_flight_summary(flight_results)
-        flight_form_data = {
-            "origin": origin,
-            "destination": destination,
-            "date": date,
-            "adults": adults
-        }
-        request.session["flight_results"] = flight_results
-        request.session["flight_form_data"] = flight_form_data
-
-        html = render_to_string("partials/result_block.html", {
-            "flight_block": True,
-            "flight_results": flight_results,
-            "flight_ai_summary": flight_ai_summary,
-            "flight_form_data": flight_form_data,
-            "flight_intent_detected": False,
-            "flight_query": "",
-            "new_messages": []
-        }, request=request)
-        return HttpResponse(html)
 
-    # Cache current length for delta blocks
-    before_len = len(chat_history)
+def result_block_context(flight_form_data, **overrides):
+    context = {
+        "flight_block": False,
+        "flight_results": None,
+        "flight_ai_summary": "",
+        "flight_form_data": flight_form_data,
+        "flight_intent_detected": False,
+        "flight_query": "",
+        "new_messages": []
+    }
+    context.update(overrides)
+    return context
 
-    # Flight intent detection
-    if user_message and compare_mode:
-        products = get_all_products(user_message, compare_mode=True)
-        if site_filter:
-            filtered = [p for p in products if site_filter not in (p.get("site", "") or "").lower()]
-            if filtered:
-                products = filtered
 
-        if products:
-            ai_summary = analyze_products(products)
-            results = ai_summary.get("products", products)
-            chat_history.append({
-                'role': 'user',
-                'content': user_message
-            })
-            chat_history.append({
-                'role': 'assistant',
-                'content': f'"{user_message}" için karşılaştırma sonuçları:',
-                'compare_products': results,
-                'compare_ai_summary': ai_summary
-            })
-            request.session['chat_history'] = chat_history
-            request.session.modified = True
-
-            new_messages = chat_history[before_len:]
-            html = render_to_string("partials/result_block.html", {
-                "flight_block": False,
-                "flight_results": None,
-                "flight_form_data": flight_form_data,
-                "flight_intent_detected": False,
-                "flight_query": "",
-                "new_messages": new_messages
-            }, request=request)
-            return HttpResponse(html)
+def render_block(request, flight_form_data, **overrides):
+    html = yield io(
+        render_to_string, arender_to_string,
+        "partials/result_block.html", result_block_context(flight_form_data, **overrides), request=request,
+    )
+    return HttpResponse(html)
 
-    if user_message:
-        flight_check = detect_flight_intent(user_message)
-        if flight_check['is_flight'] and flight_check['confidence'] > 0.7:
-            html = render_to_string("partials/result_block.html", {
-                "flight_block": True,
-                "flight_results": None,
-                "flight_ai_summary": "",
-                "flight_form_data": flight_form_data,
-                "flight_intent_detected": True,
-                "flight_query": user_message,
-                "new_messages": []
-            }, request=request)
-            return HttpResponse(html)
 
-    # Normal chat/product flow
-    results = []
-    ai_summary = {}
+def is_flight_message(user_message):
+    flight_check = detect_flight_intent(user_message)
+    return flight_check['is_flight'] and flight_check['confidence'] > 0.7
 
-    if user_message:
+
+def append_ajax_reply(chat_history, analysis, query, products, ai_result, compare_mode):
+    """search_ajax: analiz + ürün sonucuna göre asistan mesajını ekle."""
+    if analysis.get('error'):
         chat_history.append({
-            'role': 'user',
-            'content': user_message
+            'role': 'assistant',
+            'content': f"üzgünüm, bir hata oluştu: {analysis['error']}"
         })
 
-        analysis = analyze_user_message(user_message, chat_history)
+    elif query:
+        if products:
+            results = ai_result.get("products", products)
+            if compare_mode:
+                chat_history.append({
+                    'role': 'assistant',
+                    'content': analysis['response'] or f'"{query}" için karşılaştırma sonuçları:',
+                    'compare_products': session_products(results),
+                    'compare_ai_summary': session_summary(ai_result)
+                })
+            else:
+                chat_history.append({
+                    'role': 'assistant',
+                    'content': analysis['response'] or f'"{query}" için {len(results)} ürün buldum:',
+                    'products': session_products(results),
+                    'ai_summary': session_summary(ai_result)
+                })
 
-        if analysis.get('error'):
+        else:
             chat_history.append({
                 'role': 'assistant',
-                'content': f"üzgünüm, bir hata oluştu: {analysis['error']}"
+                'content': f'"{query}" için ürün bulunamadı. Başka bir şey aramak ister misiniz?'
             })
 
-        elif analysis['intent'] == 'shopping' and analysis.get('query'):
-            query = analysis['query']
-            products = get_all_products(query, compare_mode=compare_mode)
+    else:
+        chat_history.append({
+            'role': 'assistant',
+            'content': analysis['response']
+        })
 
-            if compare_mode and site_filter:
-                filtered = [p for p in products if site_filter not in (p.get("site", "") or "").lower()]
-                if filtered:
-                    products = filtered
 
-            if products:
-                ai_result = analyze_products(products)
-                results = ai_result.get("products", products)
-                ai_summary = ai_result
-
-                if compare_mode:
-                    chat_history.append({
-                        'role': 'assistant',
-                        'content': analysis['response'] or f'"{query}" için karşılaştırma sonuçları:',
-                        'compare_products': results,
-                        'compare_ai_summary': ai_summary
-                    })
-                else:
-                    chat_history.append({
-                        'role': 'assistant',
-                        'content': analysis['response'] or f'"{query}" için {len(results)} ürün buldum:',
-                        'products': results,
-                        'ai_summary': ai_summary
-                    })
+def append_home_reply(chat_history, analysis, query, products, ai_result, compare_mode):
+    """home: compare modunda sonuçlar son ürünlü asistan mesajına eklenir."""
+    if analysis.get('error'):
+        chat_history.append({
+            'role': 'assistant',
+            'content': f"Üzgünüm, bir hata oluştu: {analysis['error']}"
+        })
 
+    elif query:
+        if products:
+            results = ai_result.get("products", products)
+            ai_summary = ai_result # Full result passes 'data', 'error', etc.
+
+            if compare_mode:
+                # COMPARE MODE: Sonuncu assistant message'ına compare_products ekle
+                # Böyle orijinal products kaybolmaz
+                for msg in reversed(chat_history):
+                    if msg.get('role') == 'assistant' and msg.get('products'):
+                        msg['compare_products'] = session_products(results)
+                        msg['compare_ai_summary'] = session_summary(ai_summary)
+                        chat_history.changed(msg)
+                        break
             else:
+                # NORMAL MODE: Yeni message oluştur
                 chat_history.append({
                     'role': 'assistant',
-                    'content': f'"{query}" için ürün bulunamadı. Başka bir şey aramak ister misiniz?'
+                    'content': analysis['response'] or f'"{query}" için {len(results)} ürün buldum:',
+                    'products': session_products(results),
+                    'ai_summary': session_summary(ai_summary)
                 })
 
         else:
             chat_history.append({
                 'role': 'assistant',
-                'content': analysis['response']
+                'content': f'"{query}" için ürün bulunamadı. Başka bir şey aramak ister misiniz?'
             })
 
-        request.session['chat_history'] = chat_history
-        request.session.modified = True
+    else:
+        chat_history.append({
+            'role': 'assistant',
+            'content': analysis['response']
+        })
+
 
-    new_messages = chat_history[before_len:]
+def stream_reply_message(content, query, products, compare_mode):
+    """Streaming yanıtın asistan mesajı (AI özeti sonradan eklenir)."""
+    products_key = 'compare_products' if compare_mode else 'products'
+    if products:
+        return {'role': 'assistant', 'content': content, products_key: session_products(products)}
+    if query:
+        return {'role': 'assistant', 'content': f'"{query}" için ürün bulunamadı. Başka bir şey aramak ister misiniz?'}
+    return {'role': 'assistant', 'content': content}
 
-    html = render_to_string("partials/result_block.html", {
-        "flight_block": False,
+
+def compare_reply_messages(user_message, products, ai_summary):
+    results = ai_summary.get("products", products)
+    return [
+        {
+            'role': 'user',
+            'content': user_message
+        },
+        {
+            'role': 'assistant',
+            'content': f'"{user_message}" için karşılaştırma sonuçları:',
+            'compare_products': session_products(results),
+            'compare_ai_summary': session_summary(ai_summary)
+        },
+    ]
+
+
+def _stream_response(chunks):
+    # Parçalar view döndükten sonra üretilir; istek bütçesi onlara da taşınır
+    response = StreamingHttpResponse(bind_stream(chunks), content_type="text/html; charset=utf-8")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    response["X-Finda-Stream"] = "1"
+    return response
+
+
+# -------------------------
+# STREAMING SEARCH
+# -------------------------
+# Parçalar arası ayraç; home.html'deki fetch döngüsü buna göre böler
+STREAM_DELIMITER = "\n<!--finda:chunk-->\n"
+
+
+def wants_stream(request):
+    return getattr(settings, "SEARCH_AJAX_STREAMING", True) and request.POST.get("stream") == "1"
+
+
+def _fill(slot, html):
+    """Yer tutucu (id=slot) yerine geçecek parça."""
+    return f'<template data-fill="{slot}">{html}</template>{STREAM_DELIMITER}'
+
+
+def _filter_by_site(products, site_filter):
+    if site_filter:
+        filtered = [p for p in products if site_filter not in (p.site or "").lower()]
+        if filtered:
+            return filtered
+    return products
+
+
+def stream_search_reply(request, chat_history, user_message, compare_mode, site_filter, flight_form_data):
+    """
+    search_ajax'ın streaming sürümü. Sırasıyla:
+      1) kullanıcı balonu + yanıt yer tutucusu (hemen)
+      2) asistan mesajı + ürün kartları (ürünler hazır olunca)
+      3) AI yorumu (LLM yanıt verince)
+    2 ve 3 yer tutucuların yerine <template data-fill> ile yerleşir. Geçmiş
+    generator içinde değiştiği için her adımda açıkça kaydedilir.
+    """
+    reply_slot = f"reply-{uuid.uuid4().hex[:12]}"
+    ai_slot = f"ai-{uuid.uuid4().hex[:12]}"
+    summary_key = 'compare_ai_summary' if compare_mode else 'ai_summary'
+
+    chat_history.append({'role': 'user', 'content': user_message})
+    yield io(chat_history.save, chat_history.asave)
+    html = yield io(render_to_string, arender_to_string, "partials/result_block.html", result_block_context(
+        flight_form_data,
+        new_messages=[chat_history[-1], {"role": "assistant", "pending": True, "slot": reply_slot}],
+    ), request=request)
+    yield html + STREAM_DELIMITER
+
+    products = []
+    query = None
+    if compare_mode:
+        query = user_message
+        products = yield io(get_all_products, aget_all_products, query, compare_mode=True)
+        products = _filter_by_site(products, site_filter)
+        content = f'"{query}" için karşılaştırma sonuçları:'
+    else:
+        analysis, query, products = yield io(analyze_and_fetch, aanalyze_and_fetch, user_message, chat_history)
+        content = stream_reply_content(analysis, query, products)
+
+    if products:
+        products = tag_products(products)
+    message = stream_reply_message(content, query, products, compare_mode)
+    chat_history.append(message)
+    yield io(chat_history.save, chat_history.asave)
+    html = yield io(render_to_string, arender_to_string, "partials/chat_message.html", {
+        "message": {**message, "ai_slot": ai_slot},
+        "message_index": len(chat_history),
+    }, request=request)
+    yield _fill(reply_slot, html)
+
+    if not products:
+        return
+    try:
+        ai_summary = yield io(analyze_products, aanalyze_products, products)
+    except Exception as e:
+        print("Streaming AI summary error:", e)
+        ai_summary = {"error": str(e)}
+    message[summary_key] = session_summary(ai_summary)
+    chat_history.changed(message)
+    yield io(chat_history.save, chat_history.asave)
+    html = yield io(render_to_string, arender_to_string, "partials/ai_commentary.html", {"summary": ai_summary})
+    yield _fill(ai_slot, html)
+
+
+def start_stream(stream, request, chat_history, *args):
+    # conversation_id session'a stream başlamadan (middleware'de) yazılsın
+    yield io(chat_history.ensure_conversation, chat_history.aensure_conversation)
+    return _stream_response(stream(stream_search_reply(request, chat_history, *args)))
+
+
+def stream_reply_content(analysis, query, products):
+    if analysis.get('error'):
+        return f"üzgünüm, bir hata oluştu: {analysis['error']}"
+    if query:
+        return analysis['response'] or f'"{query}" için {len(products)} ürün buldum:'
+    return analysis['response']
+
+
+# -------------------------
+# SEARCH AJAX
+# -------------------------
+def search_ajax_flow(request, stream):
+    if request.GET.get("new_chat") == "true":
+        yield io(reset_conversation, areset_conversation, request.session)
+        return HttpResponse("")
+
+    chat_history = yield io(ChatHistory.load, ChatHistory.aload, request.session)
+    user_message = request.POST.get("query", "") or request.GET.get("query", "")
+    compare_mode = request.GET.get("compare") == "true" or request.POST.get("compare") == "true"
+    site_filter = (request.POST.get("site", "") or request.GET.get("site", "")).strip().lower()
+
+    # Flight state
+    flight_form_data = chat_history.state.get("flight_form_data", {})
+    flight_form = parse_flight_form(request)
+
+    # Flight form submission
+    if flight_form and not user_message:
+        flight_results = yield from search_flight_form(flight_form)
+        chat_history.update_state(flight_results=flight_results, flight_form_data=flight_form)
+        yield io(chat_history.save, chat_history.asave)
+
+        return (yield from render_block(
+            request, flight_form,
+            flight_block=True,
+            flight_results=flight_results,
+            flight_ai_summary=build_flight_summary(flight_results),
+        ))
+
+    # Cache current length for delta blocks
+    before_len = len(chat_history)
+
+    if user_message and compare_mode and wants_stream(request):
+        return (yield from start_stream(stream, request, chat_history, user_message, True, site_filter, flight_form_data))
+
+    # Flight intent detection
+    if user_message and compare_mode:
+        products = yield io(get_all_products, aget_all_products, user_message, compare_mode=True)
+        products = _filter_by_site(products, site_filter)
+
+        if products:
+            ai_summary = yield io(analyze_products, aanalyze_products, products)
+            chat_history.extend(compare_reply_messages(user_message, products, ai_summary))
+            yield io(chat_history.save, chat_history.asave)
+            return (yield from render_block(request, flight_form_data, new_messages=chat_history[before_len:]))
+
+    if user_message and is_flight_message(user_message):
+        return (yield from render_block(
+            request, flight_form_data,
+            flight_block=True,
+            flight_intent_detected=True,
+            flight_query=user_message,
+        ))
+
+    if user_message and wants_stream(request):
+        return (yield from start_stream(stream, request, chat_history, user_message, compare_mode, site_filter, flight_form_data))
+
+    # Normal chat/product flow
+    if user_message:
+        chat_history.append({
+            'role': 'user',
+            'content': user_message
+        })
+
+        analysis, query, products = yield io(
+            analyze_and_fetch, aanalyze_and_fetch, user_message, chat_history, compare_mode=compare_mode
+        )
+        ai_result = {}
+        if query:
+            if compare_mode:
+                products = _filter_by_site(products, site_filter)
+            if products:
+                ai_result = yield io(analyze_products, aanalyze_products, products)
+        append_ajax_reply(chat_history, analysis, query, products, ai_result, compare_mode)
+        yield io(chat_history.save, chat_history.asave)
+
+    return (yield from render_block(request, flight_form_data, new_messages=chat_history[before_len:]))
+
+
+# -------------------------
+# HOME
+# -------------------------
+def home_context(chat_history, results, ai_summary, user_message, compare_mode,
+                 flight_results, flight_form_data, show_flight_section, flight_scroll):
+    return {
+        "chat_history": chat_history,
+        "results": results,      # etiketli ürünler
+        "products": results,
+        "ai_summary": ai_summary,  # AI JSON (highlights, pros, cons, verdict)
+        "user_message": user_message,
+        "compare_mode": compare_mode,
+        "flight_results": flight_results,  # Flight search results if any
+        "flight_ai_summary": build_flight_summary(flight_results) if flight_results else "",
+        "flight_form_data": flight_form_data,  # Form values to repopulate
+        "show_flight_section": show_flight_section,
+        "flight_scroll": flight_scroll
+    }
+
+
+def flight_intent_context(chat_history, user_message, compare_mode, flight_form_data):
+    # This is a flight query, don't add to chat history for products
+    return {
+        "chat_history": chat_history,
+        "products": [],
+        "ai_summary": {},
+        "user_message": "",
+        "compare_mode": compare_mode,
+        "flight_intent_detected": True,
+        "flight_query": user_message,
         "flight_results": None,
         "flight_ai_summary": "",
         "flight_form_data": flight_form_data,
-        "flight_intent_detected": False,
-        "flight_query": "",
-        "new_messages": new_messages
-    }, request=request)
-    return HttpResponse(html)
-
+        "show_flight_section": True
+    }
 
 
-def home(request):
+def home_flow(request):
     if request.GET.get("new_chat") == "true":
-        if 'chat_history' in request.session:
-            del request.session['chat_history']
-        if 'flight_results' in request.session:
-            del request.session['flight_results']
-        if 'flight_form_data' in request.session:
-            del request.session['flight_form_data']
-        if 'show_flight_section' in request.session:
-            del request.session['show_flight_section']
+        yield io(reset_conversation, areset_conversation, request.session)
         return redirect('home')
 
-    if 'chat_history' not in request.session:
-        request.session['chat_history'] = []
-
-    chat_history = request.session['chat_history']
+    chat_history = yield io(ChatHistory.load, ChatHistory.aload, request.session)
     user_message = request.POST.get("query", "") or request.GET.get("query", "")
     compare_mode = request.GET.get("compare") == "true"  # Deep analysis modu
     
     # Flight state (persist on page until new chat)
-    flight_results = request.session.get("flight_results")
-    flight_form_data = request.session.get("flight_form_data", {})
-    show_flight_section = request.session.get("show_flight_section", False)
-    flight_scroll = request.session.pop("flight_scroll", False)
-    origin = request.POST.get("origin", "").strip().upper()
-    destination = request.POST.get("destination", "").strip().upper()
-    date = request.POST.get("date", "")
-    adults_input = request.POST.get("adults", "1")
+    flight_results = chat_history.state.get("flight_results")
+    flight_form_data = chat_history.state.get("flight_form_data", {})
+    show_flight_section = chat_history.state.get("show_flight_section", False)
+    flight_scroll = chat_history.pop_state("flight_scroll", False)
+    flight_form = parse_flight_form(request)
     
     # If flight form is submitted, process it
-    if origin and destination and date and not user_message:
-        try:
-            adults = int(adults_input) if adults_input else 1
-            adults = max(1, adults)
-        except (ValueError, TypeError):
-            adults = 1
-        
-        flight_results = normalize_flight_results(search_flights(origin, destination, date, adults=adults))
-        flight_ai_summary = build_flight_summary(flight_results)
-        flight_form_data = {
-            "origin": origin,
-            "destination": destination,
-            "date": date,
-            "adults": adults
-        }
+    if flight_form and not user_message:
+        flight_results = yield from search_flight_form(flight_form)
+        flight_form_data = flight_form
         show_flight_section = True
-        request.session["flight_results"] = flight_results
-        request.session["flight_form_data"] = flight_form_data
-        request.session["show_flight_section"] = True
-        request.session["flight_scroll"] = True
+        chat_history.update_state(
+            flight_results=flight_results, flight_form_data=flight_form_data,
+            show_flight_section=True, flight_scroll=True,
+        )
 
     # Check for flight intent - if detected, don't process as product search
-    if user_message:
-        flight_check = detect_flight_intent(user_message)
-        if flight_check['is_flight'] and flight_check['confidence'] > 0.7:
-            # This is a flight query, don't add to chat history for products
-            show_flight_section = True
-            request.session["show_flight_section"] = True
-            return render(request, "home.html", {
-                "chat_history": chat_history,
-                "products": [],
-                "ai_summary": {},
-                "user_message": "",
-                "compare_mode": compare_mode,
-                "flight_intent_detected": True,
-                "flight_query": user_message,
-                "flight_results": None,
-                "flight_ai_summary": "",
-                "flight_form_data": flight_form_data,
-                "show_flight_section": True
-            })
+    if user_message and is_flight_message(user_message):
+        chat_history.update_state(show_flight_section=True)
+        yield io(chat_history.save, chat_history.asave)
+        return (yield io(
+            render, arender,
+            request, "home.html", flight_intent_context(chat_history, user_message, compare_mode, flight_form_data),
+        ))
 
     results = []
     ai_summary = {}
@@ -332,67 +476,47 @@ def home(request):
             'content': user_message
         })
 
-        analysis = analyze_user_message(user_message, chat_history)
-
-        if analysis.get('error'):
-            chat_history.append({
-                'role': 'assistant',
-                'content': f"Üzgünüm, bir hata oluştu: {analysis['error']}"
-            })
+        analysis, query, products = yield io(
+            analyze_and_fetch, aanalyze_and_fetch, user_message, chat_history, compare_mode=compare_mode
+        )
+        if products:
+            # 🔹 AI ürün etiketleme + analiz
+            ai_summary = yield io(analyze_products, aanalyze_products, products)
+            results = ai_summary.get("products", products)
+        append_home_reply(chat_history, analysis, query, products, ai_summary, compare_mode)
+
+    yield io(chat_history.save, chat_history.asave)
+    return (yield io(render, arender, request, "home.html", home_context(
+        chat_history, results, ai_summary, user_message, compare_mode,
+        flight_results, flight_form_data, show_flight_section, flight_scroll,
+    )))
+
+
+# -------------------------
+# VIEWS
+# -------------------------
+# WSGI'da sync view'lar, settings.ASYNC_VIEWS açıkken (ASGI) async
+# karşılıkları bağlanır (core/urls.py). Async modda upstream çağrıları event
+# loop'ta (httpx.AsyncClient) yapılır, böylece bir worker thread tutmadan
+# yüzlerce arama aynı anda beklenebilir. Sohbet geçmişi ChatHistory.aload /
+# asave ile (async session API + ORM), şablon render'ı sync_to_async ile.
+@require_http_methods(["GET", "POST"])
+@with_deadline
+def search_ajax(request):
+    return drive(search_ajax_flow(request, drive_stream))
 
-        elif analysis['intent'] == 'shopping' and analysis.get('query'):
-            query = analysis['query']
-            products = get_all_products(query, compare_mode=compare_mode)
 
-            if products:
-                # 🔹 AI ürün etiketleme + analiz
-                ai_result = analyze_products(products)
-
-                results = ai_result.get("products", products)
-                ai_summary = ai_result # Full result passes 'data', 'error', etc.
-
-                if compare_mode:
-                    # COMPARE MODE: Sonuncu assistant message'ına compare_products ekle
-                    # Böyle orijinal products kaybolmaz
-                    for msg in reversed(chat_history):
-                        if msg.get('role') == 'assistant' and msg.get('products'):
-                            msg['compare_products'] = results
-                            msg['compare_ai_summary'] = ai_summary
-                            break
-                else:
-                    # NORMAL MODE: Yeni message oluştur
-                    chat_history.append({
-                        'role': 'assistant',
-                        'content': analysis['response'] or f'"{query}" için {len(results)} ürün buldum:',
-                        'products': results,
-                        'ai_summary': ai_summary
-                    })
+@require_http_methods(["GET", "POST"])
+@with_deadline
+async def search_ajax_async(request):
+    return await adrive(search_ajax_flow(request, adrive_stream))
 
-            else:
-                chat_history.append({
-                    'role': 'assistant',
-                    'content': f'"{query}" için ürün bulunamadı. Başka bir şey aramak ister misiniz?'
-                })
 
-        else:
-            chat_history.append({
-                'role': 'assistant',
-                'content': analysis['response']
-            })
+@with_deadline
+def home(request):
+    return drive(home_flow(request))
 
-        request.session['chat_history'] = chat_history
-        request.session.modified = True
 
-    return render(request, "home.html", {
-        "chat_history": chat_history,
-        "results": results,      # etiketli ürünler
-        "products": results,
-        "ai_summary": ai_summary,  # AI JSON (highlights, pros, cons, verdict)
-        "user_message": user_message,
-        "compare_mode": compare_mode,
-        "flight_results": flight_results,  # Flight search results if any
-        "flight_ai_summary": build_flight_summary(flight_results) if flight_results else "",
-        "flight_form_data": flight_form_data,  # Form values to repopulate
-        "show_flight_section": show_flight_section,
-        "flight_scroll": flight_scroll
-    })
+@with_deadline
+async def home_async(request):
+    return await adrive(home_flow(request))
@@ -3,6 +3,17 @@ ASGI config for finda project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Async view'larla (home, search_ajax, /fly/) çalıştırmak için:
+
+    ASYNC_VIEWS=true uvicorn finda.asgi:application --workers 4
+    # ya da
+    ASYNC_VIEWS=true gunicorn finda.asgi:application -k uvicorn.workers.UvicornWorker -w 4
+
+Bu modda upstream çağrıları worker thread'i tutmadan event loop'ta
+beklenir; host başına bağlantı sınırı HTTP_ASYNC_POOL_MAXSIZE ile ayarlanır.
+Django lifespan mesajlarını işlemediği için onları burada karşılıyoruz:
+kapanışta worker'ın havuzlu HTTP istemcileri (core/http_clients.py) kapatılır.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +24,24 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finda.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core import http_clients  # noqa: E402  (settings yüklendikten sonra)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await http_clients.aclose_all()
+            http_clients.close_all()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    return await django_application(scope, receive, send)
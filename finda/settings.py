@@ -217,6 +217,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "finda.wsgi.application"
+ASGI_APPLICATION = "finda.asgi.application"
 
 # =====================
 # DATABASE
@@ -229,6 +230,50 @@ DATABASES = {
     }
 }
 
+# =====================
+# CACHE
+# =====================
+
+# Paylaşılan cache (TieredCache L2, single-flight kilitleri, Amadeus rate limit,
+# LLM router senkronu). Varsayılan locmem: process içi, geliştirme için.
+# Birden çok worker/makinede tüm worker'ların ortak kullanması için:
+#   CACHE_BACKEND=redis      CACHE_URL=redis://127.0.0.1:6379/1   (pip install redis)
+#   CACHE_BACKEND=memcached  CACHE_URL=127.0.0.1:11211            (pip install pymemcache)
+# file (CACHE_LOCATION, varsayılan .cache/) ve db de seçilebilir; db için önce
+# `python manage.py createcachetable` çalıştırın. Bunlarda her get/set disk I/O'sudur.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem").lower()
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+
+if CACHE_BACKEND == "redis":
+    _cache = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_URL or "redis://127.0.0.1:6379/1",
+    }
+elif CACHE_BACKEND == "memcached":
+    _cache = {
+        "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+        "LOCATION": CACHE_URL or "127.0.0.1:11211",
+    }
+else:
+    if CACHE_BACKEND == "db":
+        _cache_backend, _cache_location = "django.core.cache.backends.db.DatabaseCache", "finda_cache"
+    elif CACHE_BACKEND == "file":
+        _cache_backend = "django.core.cache.backends.filebased.FileBasedCache"
+        _cache_location = os.getenv("CACHE_LOCATION", str(BASE_DIR / ".cache"))
+    else:
+        _cache_backend, _cache_location = "django.core.cache.backends.locmem.LocMemCache", "finda"
+    _cache = {
+        "BACKEND": _cache_backend,
+        "LOCATION": _cache_location,
+        "OPTIONS": {
+            "MAX_ENTRIES": CACHE_MAX_ENTRIES,
+            "CULL_FREQUENCY": 3,
+        },
+    }
+
+CACHES = {"default": _cache}
+
 # =====================
 # PASSWORD VALIDATION
 # =====================
@@ -273,3 +318,130 @@ OPENROUTER_API_KEY = get_env("OPENROUTER_API_KEY")
 AMADEUS_API_KEY = get_env("AMADEUS_API_KEY")
 AMADEUS_API_SECRET = get_env("AMADEUS_API_SECRET")
 SERP_API_KEY = get_env("SERP_API_KEY")
+
+# =====================
+# PRODUCT SEARCH
+# =====================
+
+# Tüm ürün kaynakları paralel çalışır; bu süre toplam bekleme üst sınırıdır.
+PRODUCT_SEARCH_BUDGET = float(os.getenv("PRODUCT_SEARCH_BUDGET", "12"))
+# İstek başına toplam bütçe (core/deadline.py): upstream timeout'ları kalan süreyle
+# kırpılır; süre dolunca niyet analizi self_fallback'e, AI yorumu etiket özetine düşer.
+# 0 = kapalı. Kalan süre MIN_CALL'un altındaysa yeni upstream çağrısı başlatılmaz.
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "25"))
+REQUEST_DEADLINE_MIN_CALL = float(os.getenv("REQUEST_DEADLINE_MIN_CALL", "0.5"))
+PRODUCT_SOURCE_WORKERS = int(os.getenv("PRODUCT_SOURCE_WORKERS", "16"))
+# Yedek (fallback) kaynaklar yalnızca birincil sonuçlar yetersizse ya da birincil
+# kaynaklar bu süre sonunda hâlâ sürüyorsa başlatılır (en fazla bütçenin yarısı).
+PRODUCT_FALLBACK_AFTER = float(os.getenv("PRODUCT_FALLBACK_AFTER", "4"))
+# Bütçeyi aşıp arka planda süren çağrısı bu sayıya ulaşan kaynak, bunlar bitene kadar atlanır.
+PRODUCT_SOURCE_MAX_STRAGGLERS = int(os.getenv("PRODUCT_SOURCE_MAX_STRAGGLERS", "4"))
+# Kaynak bazlı ayar, örn: {"serp": {"timeout": 8, "max_concurrency": 4}}
+PRODUCT_SOURCES = {}
+# Stale-while-revalidate: TTL sonrası kayıt STALE_TTL boyunca bayat sunulur
+# ve arka planda yenilenir.
+PRODUCT_CACHE_TTL = int(os.getenv("PRODUCT_CACHE_TTL", "600"))
+PRODUCT_CACHE_STALE_TTL = int(os.getenv("PRODUCT_CACHE_STALE_TTL", "3600"))
+# Kaynak/mağaza bazlı taze kalma süresi (site adında aranır), örn: {"trendyol": 300}
+PRODUCT_CACHE_TTLS = {
+    "fakestore": 3600,
+}
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", "3600"))
+AI_CACHE_STALE_TTL = int(os.getenv("AI_CACHE_STALE_TTL", str(6 * 3600)))
+CACHE_REFRESH_WORKERS = int(os.getenv("CACHE_REFRESH_WORKERS", "4"))
+# Worker içi LRU üst sınırları (L1); asıl saklama paylaşılan cache'tedir.
+PRODUCT_CACHE_LOCAL_ENTRIES = int(os.getenv("PRODUCT_CACHE_LOCAL_ENTRIES", "256"))
+AI_CACHE_LOCAL_ENTRIES = int(os.getenv("AI_CACHE_LOCAL_ENTRIES", "512"))
+# Yerel teklif indeksi (core/offer_index.py, SQLite FTS5): SerpAPI teklifleri
+# indekslenir; sorgu için en az MIN_MATCHES taze (MAX_AGE sn) eşleşme varsa
+# SerpAPI çağrılmaz.
+OFFER_INDEX_ENABLED = os.getenv("OFFER_INDEX_ENABLED", "").lower() == "true"
+OFFER_INDEX_PATH = os.getenv("OFFER_INDEX_PATH", str(BASE_DIR / "offer_index.sqlite3"))
+OFFER_INDEX_MAX_AGE = int(os.getenv("OFFER_INDEX_MAX_AGE", str(6 * 3600)))
+OFFER_INDEX_MIN_MATCHES = int(os.getenv("OFFER_INDEX_MIN_MATCHES", "8"))
+# Sohbet geçmişi (core/conversations.py): session'da yalnızca conversation_id
+# tutulur; en fazla bu kadar mesaj yüklenir, eskileri silinir.
+CHAT_HISTORY_LIMIT = int(os.getenv("CHAT_HISTORY_LIMIT", "50"))
+# Son mesajı bundan eski sohbetler `manage.py prune_conversations` ile silinir
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", "14"))
+# search_ajax: ürün kartları önce, AI yorumu sonra (chunked). İstemci stream=1 gönderir.
+SEARCH_AJAX_STREAMING = os.getenv("SEARCH_AJAX_STREAMING", "true").lower() == "true"
+# Açık ürün aramaları ("iphone 15 pro") LLM'e gitmeden yerel sınıflandırıcıyla
+# çözülür (core/intent.py); güven bu eşiğin altındaysa LLM'e sorulur.
+LOCAL_INTENT_ENABLED = os.getenv("LOCAL_INTENT_ENABLED", "true").lower() == "true"
+LOCAL_INTENT_MIN_CONFIDENCE = float(os.getenv("LOCAL_INTENT_MIN_CONFIDENCE", "0.8"))
+# Yerel sınıflandırıcı emin değilken ürün aramasını LLM analiziyle paralel,
+# tahmini sorguyla başlat (core/speculation.py); LLM sorgusu bu Jaccard
+# benzerliğinde eşleşirse sonuç kullanılır, yoksa atılır.
+SPECULATIVE_FETCH = os.getenv("SPECULATIVE_FETCH", "").lower() == "true"
+SPECULATIVE_MATCH_THRESHOLD = float(os.getenv("SPECULATIVE_MATCH_THRESHOLD", "0.6"))
+# Gemini modelleri (tercih sırası); gemini-1.5-* kullanımdan kalktığı için listede yok.
+GEMINI_MODELS = [m.strip() for m in os.getenv("GEMINI_MODELS", "gemini-2.5-flash,gemini-2.0-flash").split(",") if m.strip()]
+# LLM router (core/llm_router.py): model sağlığı process belleğinde tutulur ve
+# LLM_ROUTER_SYNC_INTERVAL saniyede bir (devre açılınca hemen) paylaşılan cache'le birleştirilir.
+# 429'da ya da üst üste LLM_ROUTER_ERROR_THRESHOLD hatada model cooldown süresince atlanır.
+LLM_ROUTER_SYNC_INTERVAL = float(os.getenv("LLM_ROUTER_SYNC_INTERVAL", "10"))
+LLM_ROUTER_RATE_LIMIT_COOLDOWN = int(os.getenv("LLM_ROUTER_RATE_LIMIT_COOLDOWN", "60"))
+LLM_ROUTER_ERROR_THRESHOLD = int(os.getenv("LLM_ROUTER_ERROR_THRESHOLD", "3"))
+LLM_ROUTER_ERROR_COOLDOWN = int(os.getenv("LLM_ROUTER_ERROR_COOLDOWN", "30"))
+# Geçici hatalarda (bağlantı, 5xx) tekrar sayısı ve jitter'lı üstel bekleme (sn)
+LLM_ROUTER_RETRIES = int(os.getenv("LLM_ROUTER_RETRIES", "1"))
+LLM_ROUTER_BACKOFF = float(os.getenv("LLM_ROUTER_BACKOFF", "0.25"))
+LLM_ROUTER_BACKOFF_MAX = float(os.getenv("LLM_ROUTER_BACKOFF_MAX", "2"))
+# Niyet analizi için hedged LLM çağrıları: aktif sağlayıcı p90'ı içinde yanıt
+# vermezse sıradaki paralel başlar, ilk geçerli JSON kazanır (core/hedging.py).
+LLM_HEDGING = os.getenv("LLM_HEDGING", "").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9"))
+# Yeterli gecikme örneği yokken kullanılan bekleme ve alt sınır (sn)
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "2.0"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.3"))
+# ASGI altında (uvicorn) home/search_ajax/fly için async view'lar; WSGI'da kapalı kalmalı.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "").lower() == "true"
+
+# =====================
+# FLIGHTS
+# =====================
+
+# Uçuş teklifi cache'i (flights/services.py): kalkışa kalan gün sayısına göre TTL.
+# (en fazla gün, sn) çiftleri; daha uzak kalkışlar FLIGHT_CACHE_TTL_MAX kullanır.
+FLIGHT_CACHE_TTLS = [(1, 120), (7, 300), (30, 900)]
+FLIGHT_CACHE_TTL_MAX = int(os.getenv("FLIGHT_CACHE_TTL_MAX", "3600"))
+FLIGHT_CACHE_LOCAL_ENTRIES = int(os.getenv("FLIGHT_CACHE_LOCAL_ENTRIES", "256"))
+# Amadeus istek bütçesi (istek/sn, tüm worker'lar toplamı; test ortamı 10 TPS).
+# Token ve uçuş aramalarının hepsi bu sınırdan geçer (core/rate_limit.py).
+# Paylaşılan cache Redis/Memcached ise worker'lar bütçeyi cache üzerinden
+# paylaşır; değilse her worker AMADEUS_RATE_LIMIT / WEB_CONCURRENCY kullanır.
+# WEB_CONCURRENCY gunicorn/uvicorn worker sayısıyla aynı olmalıdır.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+AMADEUS_RATE_LIMIT = float(os.getenv("AMADEUS_RATE_LIMIT", "10"))
+AMADEUS_RATE_BURST = int(os.getenv("AMADEUS_RATE_BURST", "1"))
+# Esnek tarih fiyat takvimi: tarih ± FARE_CALENDAR_DAYS gün, en fazla WORKERS paralel arama.
+FARE_CALENDAR_DAYS = int(os.getenv("FARE_CALENDAR_DAYS", "3"))
+FARE_CALENDAR_MAX_DAYS = int(os.getenv("FARE_CALENDAR_MAX_DAYS", "7"))
+FARE_CALENDAR_WORKERS = int(os.getenv("FARE_CALENDAR_WORKERS", "4"))
+
+# =====================
+# UPSTREAM HTTP
+# =====================
+
+# Host başına keep-alive havuz boyutu; HTTP/2 için `h2` paketi kurulu olmalı.
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "").lower() == "true"
+# Async view'lar için host başına httpx.AsyncClient bağlantı üst sınırı (event loop başına).
+HTTP_ASYNC_POOL_MAXSIZE = int(os.getenv("HTTP_ASYNC_POOL_MAXSIZE", "200"))
+# Worker açılışında upstream TLS bağlantılarını önceden kur.
+HTTP_PREWARM = os.getenv("HTTP_PREWARM", "").lower() == "true"
+
+# Upstream taban URL'leri; yük testinde stand-in sunuculara (manage.py standins)
+# yönlendirmek için env ile değiştirilebilir.
+SERPAPI_BASE_URL = os.getenv("SERPAPI_BASE_URL", "https://serpapi.com").rstrip("/")
+FAKESTORE_BASE_URL = os.getenv("FAKESTORE_BASE_URL", "https://fakestoreapi.com").rstrip("/")
+AMADEUS_BASE_URL = os.getenv("AMADEUS_BASE_URL", "https://test.api.amadeus.com").rstrip("/")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com").rstrip("/")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai").rstrip("/")
+
+# Upstream record/replay (bkz. core/replay.py): off | record | replay
+UPSTREAM_REPLAY_MODE = os.getenv("UPSTREAM_REPLAY_MODE", "off").lower()
+UPSTREAM_FIXTURE_DIR = Path(os.getenv("UPSTREAM_FIXTURE_DIR", BASE_DIR / "fixtures" / "upstream"))
+# Replay'de yanıt başına yapay gecikme (sn)
+UPSTREAM_REPLAY_LATENCY = float(os.getenv("UPSTREAM_REPLAY_LATENCY", "0"))
@@ -0,0 +1,180 @@
+"""
+Compact flight offer records.
+
+An Amadeus offer is a deep document (itineraries -> segments, travelerPricings
+-> fareDetailsBySegment, ...); we display about a dozen fields of it. Each
+offer is projected once, right after the search, into a FlightOffer holding
+only those fields. Offers for the same physical flight sold under another
+airline's code (codeshares) are collapsed into the cheapest one, and the
+summary line is computed at the same time. Conversation state and the flight
+cache keep to_dict() of the result, templates read flat keys.
+"""
+
+AIRLINE_NAMES = {
+    "TK": "Türk Hava Yolları",
+    "PC": "Pegasus",
+    "XQ": "SunExpress",
+    "VF": "AJet",
+    "AJ": "AnadoluJet",
+    "LH": "Lufthansa",
+    "AF": "Air France",
+    "BA": "British Airways",
+    "KL": "KLM",
+    "EK": "Emirates",
+    "QR": "Qatar Airways",
+    "EY": "Etihad",
+}
+
+
+def _first(items):
+    return items[0] if isinstance(items, list) and items else {}
+
+
+def _parse_total(price):
+    try:
+        return float(price.get("total"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _baggage_text(bags):
+    if not bags:
+        return ""
+    if bags.get("weight"):
+        return f"{bags['weight']}{bags.get('weightUnit', '')}"
+    if bags.get("quantity"):
+        return f"{bags['quantity']} parça"
+    return ""
+
+
+class FlightOffer:
+    # Displayed / stored fields
+    FIELDS = (
+        "id", "airline_code", "airline_name", "flight_number", "origin", "destination",
+        "departure_at", "arrival_at", "departure_time", "arrival_time", "duration",
+        "stops", "cabin", "baggage", "price", "currency",
+    )
+
+    __slots__ = FIELDS + ("price_value", "flight_key", "operated_by_marketer")
+
+    def __init__(self, id="", airline_code="", airline_name="", flight_number="", origin="",
+                 destination="", departure_at="", arrival_at="", departure_time="", arrival_time="",
+                 duration="", stops=0, cabin="", baggage="", price="", currency="",
+                 flight_key=(), operated_by_marketer=True):
+        self.id = id
+        self.airline_code = airline_code
+        self.airline_name = airline_name or AIRLINE_NAMES.get(airline_code, airline_code or "Airline")
+        self.flight_number = flight_number
+        self.origin = origin
+        self.destination = destination
+        self.departure_at = departure_at
+        self.arrival_at = arrival_at
+        self.departure_time = departure_time or departure_at[11:16]
+        self.arrival_time = arrival_time or arrival_at[11:16]
+        self.duration = duration
+        self.stops = stops
+        self.cabin = cabin
+        self.baggage = baggage
+        self.price = price
+        self.currency = currency
+        self.price_value = _parse_total({"total": price})
+        self.flight_key = tuple(flight_key)
+        self.operated_by_marketer = operated_by_marketer
+
+    @classmethod
+    def from_amadeus(cls, offer):
+        itinerary = _first(offer.get("itineraries"))
+        segments = itinerary.get("segments") or []
+        first, last = (segments[0], segments[-1]) if segments else ({}, {})
+        fare = _first(_first(offer.get("travelerPricings")).get("fareDetailsBySegment"))
+        price = offer.get("price") or {}
+        departure = first.get("departure") or {}
+        arrival = last.get("arrival") or {}
+        duration = itinerary.get("duration") or ""
+
+        # Physical flight: who operates each leg, from where, when
+        flight_key = []
+        operated_by_marketer = True
+        for segment in segments:
+            operating = (segment.get("operating") or {}).get("carrierCode") or segment.get("carrierCode", "")
+            operated_by_marketer = operated_by_marketer and operating == segment.get("carrierCode", "")
+            leg_departure = segment.get("departure") or {}
+            flight_key.append((
+                operating, leg_departure.get("iataCode", ""), leg_departure.get("at", ""),
+                (segment.get("arrival") or {}).get("iataCode", ""),
+            ))
+
+        return cls(
+            id=str(offer.get("id", "")),
+            airline_code=(offer.get("validatingAirlineCodes") or [""])[0],
+            flight_number=f"{first.get('carrierCode', '')}{first.get('number', '')}",
+            origin=departure.get("iataCode", ""),
+            destination=arrival.get("iataCode", ""),
+            departure_at=departure.get("at", ""),
+            arrival_at=arrival.get("at", ""),
+            duration=duration[2:] if duration.startswith("PT") else duration,
+            stops=max(0, len(segments) - 1),
+            cabin=fare.get("cabin", ""),
+            baggage=_baggage_text(fare.get("includedCheckedBags")),
+            price=str(price.get("total", "")),
+            currency=price.get("currency", ""),
+            flight_key=flight_key,
+            operated_by_marketer=operated_by_marketer,
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{k: data[k] for k in cls.FIELDS if k in data})
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    def __repr__(self):
+        return f"<FlightOffer {self.flight_number} {self.departure_time} {self.price} {self.currency}>"
+
+
+def dedupe_codeshares(offers):
+    """
+    One offer per physical flight: the cheapest, preferring the operating
+    carrier's own listing on equal price. Keeps the order of first appearance.
+    """
+    best = {}
+    order = []
+    for offer in offers:
+        key = offer.flight_key or ("id", offer.id)
+        current = best.get(key)
+        if current is None:
+            best[key] = offer
+            order.append(key)
+            continue
+        rank = (_sort_price(offer), not offer.operated_by_marketer)
+        if rank < (_sort_price(current), not current.operated_by_marketer):
+            best[key] = offer
+    return [best[key] for key in order]
+
+
+def _sort_price(offer):
+    return offer.price_value if offer.price_value is not None else float("inf")
+
+
+def cheapest(offers):
+    priced = [o for o in offers if o.price_value is not None]
+    return min(priced, key=lambda o: o.price_value) if priced else None
+
+
+def flight_summary(offers):
+    best = cheapest(offers)
+    if best is None:
+        return ""
+    duration = best.duration.replace("H", "s ").replace("M", "dk").strip()
+    stop_text = "direkt" if best.stops == 0 else f"{best.stops} aktarma"
+    return (
+        f"En uygun uçuş {best.departure_time} saatinde, {best.airline_name} ile "
+        f"({stop_text}, {duration}). Fiyat: {best.price_value} {best.currency}"
+    )
+
+
+def project_offers(data):
+    """Amadeus "data" list -> (FlightOffer list without codeshare duplicates, summary)."""
+    offers = dedupe_codeshares([FlightOffer.from_amadeus(o) for o in data if isinstance(o, dict)])
+    return offers, flight_summary(offers)
@@ -1,62 +1,383 @@
+import asyncio
 import logging
-import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date as date_cls, timedelta
+
 from django.conf import settings
+from django.core.cache import cache
+
+from core import deadline, http_clients
+from core.flow import as_async, as_sync, io, task
+from core.rate_limit import RateLimiter
+from core.tiered_cache import TieredCache
+
+from .offers import FlightOffer, cheapest, project_offers
 
 logger = logging.getLogger(__name__)
 
-TOKEN_URL = "https://test.api.amadeus.com/v1/security/oauth2/token"
-FLIGHT_URL = "https://test.api.amadeus.com/v2/shopping/flight-offers"
+TOKEN_URL = f"{http_clients.UPSTREAMS['amadeus']}/v1/security/oauth2/token"
+FLIGHT_URL = f"{http_clients.UPSTREAMS['amadeus']}/v2/shopping/flight-offers"
+
+TOKEN_CACHE_KEY = "amadeus_access_token"
+TOKEN_EXPIRY_MARGIN = 60  # saniye; token süresi bitmeden bu kadar önce yenile
+
 
+TOKEN_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
 
-def get_access_token():
-    """Fetch Amadeus access token. Returns dict with 'access_token' or 'error'."""
-    data = {
+# Every Amadeus request (token and flight offers) goes through this limiter,
+# whatever view, calendar worker or event loop it comes from.
+AMADEUS_LIMITER = RateLimiter(
+    getattr(settings, "AMADEUS_RATE_LIMIT", 10),
+    burst=getattr(settings, "AMADEUS_RATE_BURST", 1),
+    name="amadeus",
+    workers=getattr(settings, "WEB_CONCURRENCY", 1),
+)
+
+# Projected offers per (origin, destination, date, adults), shared by
+# core.views (home, search_ajax) and flights.views. TTL depends on how far
+# away the departure is (see flight_cache_ttl); no stale serving, fares move.
+FLIGHT_CACHE = TieredCache(
+    "flight_offers",
+    ttl=getattr(settings, "FLIGHT_CACHE_TTL_MAX", 3600),
+    max_entries=getattr(settings, "FLIGHT_CACHE_LOCAL_ENTRIES", 256),
+)
+
+
+def _token_request_data():
+    return {
         "grant_type": "client_credentials",
         "client_id": getattr(settings, "AMADEUS_API_KEY", ""),
         "client_secret": getattr(settings, "AMADEUS_API_SECRET", ""),
     }
 
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
+def _parse_token_response(resp):
+    resp.raise_for_status()
+    body = resp.json()
+    token = body.get("access_token")
+    if not token:
+        return {"error": "no_access_token"}
+    return {"access_token": token, "expires_in": body.get("expires_in", 0)}
+
+
+def access_token_flow():
+    """Fetch a fresh Amadeus access token. Returns dict with 'access_token'/'expires_in' or 'error'."""
     try:
-        resp = requests.post(TOKEN_URL, data=data, headers=headers, timeout=10)
-        resp.raise_for_status()
-        body = resp.json()
-        token = body.get("access_token")
-        if not token:
-            return {"error": "no_access_token"}
-        return {"access_token": token}
-    except requests.RequestException as exc:
+        yield io(AMADEUS_LIMITER.throttle, AMADEUS_LIMITER.athrottle)
+        resp = yield io(
+            http_clients.post, http_clients.apost,
+            TOKEN_URL, data=_token_request_data(), headers=TOKEN_HEADERS, timeout=10,
+        )
+        return _parse_token_response(resp)
+    except http_clients.UPSTREAM_ERRORS as exc:
         logger.exception("Failed to fetch access token")
         return {"error": str(exc)}
 
 
-def search_flights(origin, destination, date, adults=1):
+# One flow (core/flow.py), driven sync by WSGI views and async by ASGI views
+get_access_token = as_sync(access_token_flow)
+aget_access_token = as_async(access_token_flow)
+
+
+class AmadeusTokenManager:
+    """
+    Caches the Amadeus token until shortly before it expires.
+
+    The token lives in process memory and in the Django cache, so every
+    worker sharing that cache reuses it. Refresh is single-flight per
+    process: concurrent callers wait on one lock and reuse the new token.
+    aget_token does the same per event loop with an asyncio.Lock.
+    """
+
+    def __init__(self, cache_key=TOKEN_CACHE_KEY, margin=TOKEN_EXPIRY_MARGIN):
+        self.cache_key = cache_key
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._alocks = {}  # id(loop) -> asyncio.Lock
+        self._token = None
+        self._expires_at = 0.0
+
+    def get_token(self, stale=None):
+        """Return {'access_token': ...} or {'error': ...}. `stale` forces a token other than the given one."""
+        token = self._cached_token(stale)
+        if token:
+            return {"access_token": token}
+
+        with self._lock:
+            # Kilidi beklerken başka bir thread yenilemiş olabilir
+            token = self._cached_token(stale)
+            if token:
+                return {"access_token": token}
+
+            return self._store(get_access_token())
+
+    async def aget_token(self, stale=None):
+        """Async variant of get_token; the token cache is shared with the sync path."""
+        token = self._cached_token(stale)
+        if token:
+            return {"access_token": token}
+
+        loop_id = id(asyncio.get_running_loop())
+        lock = self._alocks.get(loop_id)
+        if lock is None:
+            lock = self._alocks[loop_id] = asyncio.Lock()
+        async with lock:
+            token = self._cached_token(stale)
+            if token:
+                return {"access_token": token}
+            return self._store(await aget_access_token())
+
+    def _store(self, token_resp):
+        if token_resp.get("error"):
+            return token_resp
+
+        token = token_resp["access_token"]
+        try:
+            expires_in = float(token_resp.get("expires_in") or 0)
+        except (TypeError, ValueError):
+            expires_in = 0
+        ttl = max(0.0, expires_in - self.margin)
+        self._token = token
+        self._expires_at = time.time() + ttl
+        if ttl >= 1:
+            try:
+                cache.set(self.cache_key, {"access_token": token, "expires_at": self._expires_at}, timeout=int(ttl))
+            except Exception:
+                logger.warning("Could not share Amadeus token through cache")
+        return {"access_token": token}
+
+    def _cached_token(self, stale=None):
+        now = time.time()
+        if self._token and self._expires_at > now and self._token != stale:
+            return self._token
+        try:
+            entry = cache.get(self.cache_key)
+        except Exception:
+            entry = None
+        if entry and entry.get("expires_at", 0) > now and entry.get("access_token") != stale:
+            self._token = entry["access_token"]
+            self._expires_at = entry["expires_at"]
+            return self._token
+        return None
+
+    def clear(self):
+        self._token = None
+        self._expires_at = 0.0
+        try:
+            cache.delete(self.cache_key)
+        except Exception:
+            pass
+
+
+token_manager = AmadeusTokenManager()
+
+
+def _flight_params(origin, destination, date, adults):
+    return {
+        "originLocationCode": origin.strip().upper(),
+        "destinationLocationCode": destination.strip().upper(),
+        "departureDate": date,
+        "adults": adults,
+        "max": 10,
+    }
+
+
+def search_flights_flow(origin, destination, date, adults=1):
     """Search flights via Amadeus. Returns dict with results or error."""
     if not origin or not destination or not date:
         return {"error": "missing_parameters"}
 
-    origin_code = origin.strip().upper()
-    destination_code = destination.strip().upper()
-
-    token_resp = get_access_token()
+    token_resp = yield io(token_manager.get_token, token_manager.aget_token)
     if token_resp.get("error"):
         return {"error": f"token_error: {token_resp.get('error')}"}
 
     token = token_resp.get("access_token")
-    headers = {"Authorization": f"Bearer {token}"}
-    params = {
-        "originLocationCode": origin_code,
-        "destinationLocationCode": destination_code,
-        "departureDate": date,
-        "adults": adults,
-        "max": 10,
-    }
+    params = _flight_params(origin, destination, date, adults)
 
     try:
-        resp = requests.get(FLIGHT_URL, headers=headers, params=params, timeout=10)
+        yield io(AMADEUS_LIMITER.throttle, AMADEUS_LIMITER.athrottle)
+        resp = yield io(
+            http_clients.get, http_clients.aget,
+            FLIGHT_URL, headers={"Authorization": f"Bearer {token}"}, params=params, timeout=10,
+        )
+        if resp.status_code == 401:
+            # Token Amadeus tarafında geçersiz kılınmış: bir kez yenile ve tekrar dene
+            token_resp = yield io(token_manager.get_token, token_manager.aget_token, stale=token)
+            if token_resp.get("error"):
+                return {"error": f"token_error: {token_resp.get('error')}"}
+            token = token_resp.get("access_token")
+            yield io(AMADEUS_LIMITER.throttle, AMADEUS_LIMITER.athrottle)
+            resp = yield io(
+                http_clients.get, http_clients.aget,
+                FLIGHT_URL, headers={"Authorization": f"Bearer {token}"}, params=params, timeout=10,
+            )
         resp.raise_for_status()
         return resp.json()
-    except requests.RequestException as exc:
+    except http_clients.UPSTREAM_ERRORS as exc:
         logger.exception("Flight search failed")
         return {"error": str(exc)}
+
+
+search_flights = as_sync(search_flights_flow)
+asearch_flights = as_async(search_flights_flow)
+
+
+# -------------------------
+# NORMALIZATION & CACHE
+# -------------------------
+def normalize_flight_results(flight_results):
+    """
+    Amadeus response -> {"data": [FlightOffer.to_dict(), ...], "summary": str}.
+    Codeshare duplicates are dropped and the summary is computed here, once per search.
+    """
+    if not isinstance(flight_results, dict):
+        return flight_results
+    data = flight_results.get("data")
+    if not isinstance(data, list):
+        return flight_results
+    offers, summary = project_offers(data)
+    return {"data": [offer.to_dict() for offer in offers], "summary": summary}
+
+
+def flight_cache_key(origin, destination, date, adults=1):
+    return f"flights:{origin.strip().upper()}:{destination.strip().upper()}:{date}:{int(adults)}"
+
+
+def flight_cache_ttl(date, today=None):
+    """
+    Seconds to keep offers for a departure date. Near departures reprice
+    quickly, far ones barely move: settings.FLIGHT_CACHE_TTLS is a list of
+    (max_days_to_departure, ttl) pairs, anything further uses FLIGHT_CACHE_TTL_MAX.
+    """
+    tiers = sorted(getattr(settings, "FLIGHT_CACHE_TTLS", ((1, 120), (7, 300), (30, 900))))
+    try:
+        days = (date_cls.fromisoformat(str(date)) - (today or date_cls.today())).days
+    except ValueError:
+        return tiers[0][1] if tiers else FLIGHT_CACHE.ttl
+    for max_days, ttl in tiers:
+        if days <= max_days:
+            return ttl
+    return FLIGHT_CACHE.ttl
+
+
+def flight_offers_flow(origin, destination, date, adults=1):
+    """
+    Cached, normalized search_flights. Errors are returned but never cached.
+    Hit/miss counts: FLIGHT_CACHE.stats().
+    """
+    if not origin or not destination or not date:
+        return {"error": "missing_parameters"}
+    outcome = {}
+    value = yield io(
+        FLIGHT_CACHE.get_or_set, FLIGHT_CACHE.aget_or_set,
+        flight_cache_key(origin, destination, date, adults),
+        task(_compute_offers_flow, origin, destination, date, adults, outcome),
+        ttl_for=lambda _value: flight_cache_ttl(date),
+    )
+    return _cached_or_error(value, outcome)
+
+
+def _compute_offers_flow(origin, destination, date, adults, outcome):
+    results = yield io(search_flights, asearch_flights, origin, destination, date, adults=adults)
+    result = outcome["result"] = normalize_flight_results(results)
+    return None if result.get("error") else result
+
+
+get_flight_offers = as_sync(flight_offers_flow)
+aget_flight_offers = as_async(flight_offers_flow)
+
+
+def _cached_or_error(value, outcome):
+    if value is not None:
+        logger.debug("Flight cache: %s", "miss" if outcome else "hit")
+        return value
+    # Another caller's search failed (single-flight) or ours did
+    return outcome.get("result") or {"error": "flight_search_failed"}
+
+
+# -------------------------
+# FARE CALENDAR
+# -------------------------
+# Flexible-date search: the cheapest offer for each day in date ± N. Days are
+# fetched concurrently through get_flight_offers, so cached days cost nothing
+# and the rest share AMADEUS_LIMITER with every other Amadeus call. The pool
+# is bounded and shared by all requests.
+_calendar_executor = None
+_calendar_lock = threading.Lock()
+
+
+def _get_calendar_executor():
+    global _calendar_executor
+    if _calendar_executor is None:
+        with _calendar_lock:
+            if _calendar_executor is None:
+                _calendar_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "FARE_CALENDAR_WORKERS", 4),
+                    thread_name_prefix="finda-fares",
+                )
+    return _calendar_executor
+
+
+def calendar_dates(date, days=None, today=None):
+    """date ± days as ISO strings, past days excluded; [] for an invalid date."""
+    days = getattr(settings, "FARE_CALENDAR_DAYS", 3) if days is None else days
+    try:
+        center = date_cls.fromisoformat(str(date))
+    except ValueError:
+        return []
+    today = today or date_cls.today()
+    dates = (center + timedelta(days=offset) for offset in range(-days, days + 1))
+    return [d.isoformat() for d in dates if d >= today]
+
+
+def _calendar_day(day, center, results):
+    entry = {"date": day, "selected": day == center, "price": None, "currency": "", "offer": None}
+    data = results.get("data") if isinstance(results, dict) else None
+    best = cheapest([FlightOffer.from_dict(o) for o in data or []])
+    if best is not None:
+        entry.update(price=best.price, currency=best.currency, offer=best.to_dict())
+    return entry
+
+
+def fare_calendar(origin, destination, date, adults=1, days=None):
+    """
+    [{"date", "selected", "price", "currency", "offer"}, ...] for each day in date ± days.
+    Days without offers, or not finished within the request deadline, have price None.
+    """
+    dates = calendar_dates(date, days)
+    if not origin or not destination or not dates:
+        return []
+    executor = _get_calendar_executor()
+    futures = [
+        executor.submit(deadline.bind(get_flight_offers), origin, destination, day, adults)
+        for day in dates
+    ]
+    wait(futures, timeout=deadline.remaining())
+    return [
+        _calendar_day(day, date, future.result() if future.done() and not future.exception() else None)
+        for day, future in zip(dates, futures)
+    ]
+
+
+async def afare_calendar(origin, destination, date, adults=1, days=None):
+    """Async variant of fare_calendar; concurrency bounded by FARE_CALENDAR_WORKERS."""
+    dates = calendar_dates(date, days)
+    if not origin or not destination or not dates:
+        return []
+    slots = asyncio.Semaphore(getattr(settings, "FARE_CALENDAR_WORKERS", 4))
+
+    async def _day(day):
+        async with slots:
+            return await aget_flight_offers(origin, destination, day, adults)
+
+    tasks = [asyncio.ensure_future(_day(day)) for day in dates]
+    await asyncio.wait(tasks, timeout=deadline.remaining())
+    calendar = []
+    for day, task in zip(dates, tasks):
+        if not task.done():
+            task.cancel()
+        ok = task.done() and not task.cancelled() and task.exception() is None
+        calendar.append(_calendar_day(day, date, task.result() if ok else None))
+    return calendar
@@ -1,3 +1,333 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+import requests
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from flights import services
+
+
+def _response(status=200, body=None):
+    resp = mock.Mock(status_code=status)
+    resp.json.return_value = body or {}
+    resp.raise_for_status.return_value = None
+    return resp
+
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TokenManagerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = services.AmadeusTokenManager(cache_key="test_amadeus_token")
+
+    def test_token_is_reused_until_expiry(self):
+        with mock.patch.object(services.http_clients, "post", return_value=_response(body={"access_token": "t1", "expires_in": 1799})) as post:
+            self.assertEqual(self.manager.get_token(), {"access_token": "t1"})
+            self.assertEqual(self.manager.get_token(), {"access_token": "t1"})
+        self.assertEqual(post.call_count, 1)
+
+    def test_token_shared_through_cache(self):
+        with mock.patch.object(services.http_clients, "post", return_value=_response(body={"access_token": "t1", "expires_in": 1799})) as post:
+            self.manager.get_token()
+            other_worker = services.AmadeusTokenManager(cache_key="test_amadeus_token")
+            self.assertEqual(other_worker.get_token(), {"access_token": "t1"})
+        self.assertEqual(post.call_count, 1)
+
+    def test_refresh_is_single_flight(self):
+        gate = threading.Event()
+
+        def slow_post(*args, **kwargs):
+            gate.wait(1)
+            return _response(body={"access_token": "t1", "expires_in": 1799})
+
+        with mock.patch.object(services.http_clients, "post", side_effect=slow_post) as post:
+            threads = [threading.Thread(target=self.manager.get_token) for _ in range(8)]
+            for t in threads:
+                t.start()
+            gate.set()
+            for t in threads:
+                t.join()
+        self.assertEqual(post.call_count, 1)
+
+    def test_search_retries_once_on_401(self):
+        tokens = iter([
+            _response(body={"access_token": "old", "expires_in": 1799}),
+            _response(body={"access_token": "new", "expires_in": 1799}),
+        ])
+        flights = iter([_response(status=401), _response(body={"data": [{"id": "1"}]})])
+
+        with mock.patch.object(services, "token_manager", self.manager), \
+                mock.patch.object(services.http_clients, "post", side_effect=lambda *a, **k: next(tokens)), \
+                mock.patch.object(services.http_clients, "get", side_effect=lambda *a, **k: next(flights)) as get:
+            result = services.search_flights("IST", "ESB", "2026-11-01")
+
+        self.assertEqual(result, {"data": [{"id": "1"}]})
+        self.assertEqual(get.call_args.kwargs["headers"], {"Authorization": "Bearer new"})
+
+    def test_async_search_shares_the_401_retry(self):
+        import asyncio
+
+        tokens = iter([
+            _response(body={"access_token": "old", "expires_in": 1799}),
+            _response(body={"access_token": "new", "expires_in": 1799}),
+        ])
+        flights = iter([_response(status=401), _response(body={"data": [{"id": "1"}]})])
+
+        async def apost(*args, **kwargs):
+            return next(tokens)
+
+        async def aget(*args, **kwargs):
+            return next(flights)
+
+        with mock.patch.object(services, "token_manager", self.manager), \
+                mock.patch.object(services.http_clients, "apost", side_effect=apost), \
+                mock.patch.object(services.http_clients, "aget", side_effect=aget) as get, \
+                mock.patch.object(services.http_clients, "get") as sync_get:
+            result = asyncio.run(services.asearch_flights("IST", "ESB", "2026-11-01"))
+
+        self.assertEqual(result, {"data": [{"id": "1"}]})
+        self.assertEqual(get.call_args.kwargs["headers"], {"Authorization": "Bearer new"})
+        sync_get.assert_not_called()
+
+
+OFFER = {"id": "1", "validatingAirlineCodes": ["TK"], "price": {"total": "1200.00", "currency": "TRY"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FlightCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        services.FLIGHT_CACHE.clear_local()
+        patcher = mock.patch.object(services.token_manager, "get_token", return_value={"access_token": "t"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_offers_cached_and_normalized(self):
+        body = {"data": [dict(OFFER)], "meta": {"count": 1}, "dictionaries": {"carriers": {}}}
+        with mock.patch.object(services.http_clients, "get", return_value=_response(body=body)) as get:
+            first = services.get_flight_offers("ist", "ESB", "2026-11-01", adults=1)
+            second = services.get_flight_offers("IST", "ESB", "2026-11-01", adults=1)
+
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(first["data"][0]["airline_name"], "Türk Hava Yolları")
+        self.assertNotIn("dictionaries", first)
+        self.assertGreaterEqual(services.FLIGHT_CACHE.stats()["hits_local"], 1)
+
+    def test_errors_are_not_cached(self):
+        with mock.patch.object(services.http_clients, "get", side_effect=requests.ConnectionError("down")):
+            self.assertIn("error", services.get_flight_offers("IST", "ESB", "2026-11-01"))
+        with mock.patch.object(services.http_clients, "get", return_value=_response(body={"data": [dict(OFFER)]})) as get:
+            self.assertEqual(len(services.get_flight_offers("IST", "ESB", "2026-11-01")["data"]), 1)
+        self.assertEqual(get.call_count, 1)
+
+    def test_ttl_scales_with_days_to_departure(self):
+        from datetime import date
+
+        today = date(2026, 10, 1)
+        ttls = [services.flight_cache_ttl(d, today=today) for d in ("2026-10-01", "2026-10-05", "2026-10-20", "2027-01-01")]
+        self.assertEqual(ttls, sorted(ttls))
+        self.assertLess(ttls[0], ttls[-1])
+        self.assertEqual(services.flight_cache_ttl("bozuk", today=today), ttls[0])
+
+    def test_views_share_the_cache(self):
+        from django.test import Client
+
+        form = {"origin": "IST", "destination": "AYT", "date": "2026-12-01", "adults": "1"}
+        with mock.patch.object(services.http_clients, "get", return_value=_response(body={"data": [dict(OFFER)]})) as get:
+            services.get_flight_offers("IST", "AYT", "2026-12-01")
+            Client().post("/fly/", form)
+        self.assertEqual(get.call_count, 1)
+
+
+def _amadeus_offer(offer_id, marketing, number, total, operating=None, dep="2026-11-01T08:30:00"):
+    segment = {
+        "departure": {"iataCode": "IST", "at": dep},
+        "arrival": {"iataCode": "ESB", "at": "2026-11-01T09:45:00"},
+        "carrierCode": marketing,
+        "number": number,
+        "duration": "PT1H15M",
+    }
+    if operating:
+        segment["operating"] = {"carrierCode": operating}
+    return {
+        "id": offer_id,
+        "itineraries": [{"duration": "PT1H15M", "segments": [segment]}],
+        "price": {"currency": "TRY", "total": total, "base": total, "fees": [{"amount": "0.00", "type": "SUPPLIER"}]},
+        "validatingAirlineCodes": [marketing],
+        "travelerPricings": [{
+            "travelerId": "1",
+            "fareDetailsBySegment": [{
+                "segmentId": "1", "cabin": "ECONOMY", "fareBasis": "PV2PXOW",
+                "includedCheckedBags": {"weight": 20, "weightUnit": "KG"},
+            }],
+        }],
+    }
+
+
+class FlightOfferTests(SimpleTestCase):
+    def test_projection_keeps_displayed_fields(self):
+        from flights.offers import FlightOffer
+
+        offer = FlightOffer.from_amadeus(_amadeus_offer("1", "TK", "2124", "1450.00"))
+        self.assertEqual(
+            (offer.airline_name, offer.flight_number, offer.departure_time, offer.arrival_time,
+             offer.origin, offer.destination, offer.duration, offer.stops, offer.cabin, offer.baggage),
+            ("Türk Hava Yolları", "TK2124", "08:30", "09:45", "IST", "ESB", "1H15M", 0, "ECONOMY", "20KG"),
+        )
+        self.assertEqual(FlightOffer.from_dict(offer.to_dict()).to_dict(), offer.to_dict())
+
+    def test_codeshares_collapse_to_cheapest(self):
+        import json
+
+        raw = {"data": [
+            _amadeus_offer("1", "TK", "2124", "1450.00"),
+            _amadeus_offer("2", "VF", "9124", "1400.00", operating="TK"),  # aynı fiziksel uçuş
+            _amadeus_offer("3", "PC", "2010", "1300.00", dep="2026-11-01T11:00:00"),
+        ], "dictionaries": {"carriers": {"TK": "TURKISH AIRLINES"}}}
+        raw_size = len(json.dumps(raw))
+
+        result = services.normalize_flight_results(raw)
+
+        self.assertEqual([o["id"] for o in result["data"]], ["2", "3"])
+        self.assertIn("Pegasus", result["summary"])
+        self.assertIn("1300.0 TRY", result["summary"])
+        self.assertLess(len(json.dumps(result)), raw_size)
+
+    def test_flight_block_renders_projection(self):
+        from django.template.loader import render_to_string
+
+        results = services.normalize_flight_results({"data": [_amadeus_offer("1", "TK", "2124", "1450.00")]})
+        html = render_to_string("partials/result_block.html", {
+            "flight_block": True, "flight_results": results, "flight_ai_summary": results["summary"],
+            "flight_form_data": {},
+        })
+        for text in ("TK2124", "08:30 → 09:45", "IST → ESB", "Bagaj: 20KG", "1450.00 TRY"):
+            self.assertIn(text, html)
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_calls_are_spaced_across_threads(self):
+        import time
+        from core.rate_limit import RateLimiter
+
+        limiter = RateLimiter(20)
+        stamps = []
+        lock = threading.Lock()
+
+        def call():
+            limiter.throttle()
+            with lock:
+                stamps.append(time.monotonic())
+
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stamps.sort()
+        gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+        self.assertGreaterEqual(min(gaps), 0.04)
+
+    def test_wait_beyond_deadline_is_refused(self):
+        from core import deadline
+        from core.rate_limit import RateLimiter
+
+        limiter = RateLimiter(1)
+        limiter.throttle()
+        with override_settings(REQUEST_DEADLINE_MIN_CALL=0.1), deadline.Deadline(0.3):
+            with self.assertRaises(deadline.DeadlineExceeded):
+                limiter.throttle()
+
+
+    def test_local_budget_is_split_across_workers(self):
+        from core.rate_limit import RateLimiter
+
+        limiter = RateLimiter(20, name="amadeus-test", workers=4)
+        limiter.reserve()
+        self.assertAlmostEqual(limiter.reserve(), 0.2, places=2)
+        self.assertFalse(limiter.stats()["shared"])
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_shared_budget_holds_across_processes(self):
+        import time
+        from core.rate_limit import RateLimiter
+
+        cache.clear()
+        # İki ayrı process'teki limiter'lar; paylaşılan (atomik) cache üzerinden
+        workers = [RateLimiter(10, name="amadeus-test", workers=2) for _ in range(2)]
+        starts = []
+        with mock.patch.object(RateLimiter, "_shared_cache", return_value=cache):
+            for i in range(35):
+                now = time.time()
+                starts.append(now + workers[i % 2].reserve())
+        per_second = {}
+        for start in starts:
+            second = int(start + 0.01)  # reserve() saati bizimkinden biraz sonra okur
+            per_second[second] = per_second.get(second, 0) + 1
+        self.assertLessEqual(max(per_second.values()), 10)
+        self.assertGreaterEqual(len(per_second), 4)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, FARE_CALENDAR_WORKERS=4)
+class FareCalendarTests(SimpleTestCase):
+    def setUp(self):
+        from core.rate_limit import RateLimiter
+
+        cache.clear()
+        services.FLIGHT_CACHE.clear_local()
+        self.limiter = RateLimiter(50)
+        for patcher in (
+            mock.patch.object(services.token_manager, "get_token", return_value={"access_token": "t"}),
+            mock.patch.object(services, "AMADEUS_LIMITER", self.limiter),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _slow_get(self, url, params=None, **kwargs):
+        import time
+
+        with self.lock:
+            self.calls.append((time.monotonic(), params["departureDate"]))
+        time.sleep(0.2)
+        day = int(params["departureDate"][-2:])
+        return _response(body={"data": [
+            _amadeus_offer("1", "TK", "2124", f"{1000 + day}.00"),
+            _amadeus_offer("2", "PC", "2010", f"{900 + day}.00", dep=f"{params['departureDate']}T11:00:00"),
+        ]})
+
+    def test_days_fetched_concurrently_within_rate_budget(self):
+        import time
+
+        with mock.patch.object(services.http_clients, "get", side_effect=self._slow_get):
+            services.get_flight_offers("IST", "ESB", "2030-06-10")  # merkez gün önceden cache'te
+            self.calls.clear()
+            started = time.monotonic()
+            calendar = services.fare_calendar("IST", "ESB", "2030-06-10", days=3)
+            elapsed = time.monotonic() - started
+
+        self.assertEqual([d["date"] for d in calendar], [f"2030-06-{n:02d}" for n in range(7, 14)])
+        self.assertEqual(len(self.calls), 6)
+        self.assertNotIn("2030-06-10", [day for _, day in self.calls])
+        self.assertLess(elapsed, 6 * 0.2 * 0.6)
+        stamps = sorted(t for t, _ in self.calls)
+        self.assertGreaterEqual(min(b - a for a, b in zip(stamps, stamps[1:])), 1 / 50 - 0.005)
+        selected = [d for d in calendar if d["selected"]]
+        self.assertEqual(selected[0]["price"], "910.00")
+        self.assertEqual(selected[0]["offer"]["airline_code"], "PC")
+
+    def test_past_days_are_skipped(self):
+        from datetime import date
+
+        self.assertEqual(
+            services.calendar_dates("2026-10-02", days=2, today=date(2026, 10, 1)),
+            ["2026-10-01", "2026-10-02", "2026-10-03", "2026-10-04"],
+        )
+        self.assertEqual(services.calendar_dates("bozuk", days=2), [])
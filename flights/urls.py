@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.urls import path
-from .views import flight_search
+from .views import fare_calendar_view, fare_calendar_view_async, flight_search, flight_search_async
 
 urlpatterns = [
     # This file is included under project urls at path 'fly/',
     # so use empty string here so final route becomes '/fly/'.
-    path("", flight_search, name="flight_search"),
+    path("", flight_search_async if settings.ASYNC_VIEWS else flight_search, name="flight_search"),
+    path("calendar/", fare_calendar_view_async if settings.ASYNC_VIEWS else fare_calendar_view, name="fare_calendar"),
 ]
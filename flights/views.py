@@ -1,42 +1,111 @@
-
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import render
-from django.core.cache import cache
-from .services import search_flights
 
-CACHE_TIMEOUT = 300  # 5 dakika
+from core.deadline import with_deadline
+from .services import afare_calendar, aget_flight_offers, fare_calendar, get_flight_offers
+
+
+def _flight_form(request):
+    """POST'tan (origin, destination, date, adults); eksik alan varsa None."""
+    origin = (request.POST.get("origin") or "").strip().upper()
+    destination = (request.POST.get("destination") or "").strip().upper()
+    date = request.POST.get("date")
+    adults = request.POST.get("adults") or 1
+
+    try:
+        adults = int(adults)
+        if adults < 1:
+            adults = 1
+    except (ValueError, TypeError):
+        adults = 1
+
+    if origin and destination and date:
+        return origin, destination, date, adults
+    return None
+
 
+def _extract_flights(results):
+    # Amadeus: {"data": [offer, ...]}; hata durumunda {"error": ...}
+    data = results.get("data") if isinstance(results, dict) else None
+    return data if isinstance(data, list) else []
+
+
+def _results_context(context, results):
+    context["flight_results"] = results
+    context["flights"] = _extract_flights(results)
+
+
+@with_deadline
 def flight_search(request):
-    """Handle flight search POST and render the shared home template with cache."""
+    """Handle flight search POST and render the shared home template (cached, see services.get_flight_offers)."""
     context = {"show_flight_form": True}
 
     if request.method == "POST":
-        origin = (request.POST.get("origin") or "").strip().upper()
-        destination = (request.POST.get("destination") or "").strip().upper()
-        date = request.POST.get("date")
-        adults = request.POST.get("adults") or 1
-
-        try:
-            adults = int(adults)
-            if adults < 1:
-                adults = 1
-        except (ValueError, TypeError):
-            adults = 1
+        form = _flight_form(request)
+        if form:
+            origin, destination, date, adults = form
+            _results_context(context, get_flight_offers(origin, destination, date, adults=adults))
+        else:
+            context["flights"] = []
+            context["error"] = "Lütfen tüm alanları doldurun."
+
+    return render(request, "home.html", context)
 
-        if origin and destination and date:
-            # Cache key: origin+destination+date+adults
-            cache_key = f"flights_{origin}_{destination}_{date}_{adults}"
-            cached_results = cache.get(cache_key)
 
-            if cached_results:
-                flights = cached_results
-            else:
-                results = search_flights(origin, destination, date, adults=adults)
-                flights = results.get("data", {}).get("flights", [])
-                cache.set(cache_key, flights, CACHE_TIMEOUT)
+@with_deadline
+async def flight_search_async(request):
+    """Async (ASGI) variant of flight_search; Amadeus is called on the event loop."""
+    context = {"show_flight_form": True}
 
-            context["flights"] = flights
+    if request.method == "POST":
+        form = _flight_form(request)
+        if form:
+            origin, destination, date, adults = form
+            _results_context(context, await aget_flight_offers(origin, destination, date, adults=adults))
         else:
             context["flights"] = []
             context["error"] = "Lütfen tüm alanları doldurun."
 
-    return render(request, "home.html", context)
+    return await sync_to_async(render)(request, "home.html", context)
+
+
+def _calendar_params(request):
+    """GET'ten (origin, destination, date, adults, days); eksik alan varsa None."""
+    origin = (request.GET.get("origin") or "").strip().upper()
+    destination = (request.GET.get("destination") or "").strip().upper()
+    date = request.GET.get("date")
+    if not (origin and destination and date):
+        return None
+    limit = getattr(settings, "FARE_CALENDAR_MAX_DAYS", 7)
+    try:
+        adults = max(1, int(request.GET.get("adults") or 1))
+        days = min(limit, max(0, int(request.GET.get("days") or getattr(settings, "FARE_CALENDAR_DAYS", 3))))
+    except (TypeError, ValueError):
+        return None
+    return origin, destination, date, adults, days
+
+
+def _calendar_response(params, calendar):
+    origin, destination, date, adults, days = params
+    return JsonResponse({"origin": origin, "destination": destination, "date": date, "days": calendar})
+
+
+@with_deadline
+def fare_calendar_view(request):
+    """GET /fly/calendar/?origin=IST&destination=ESB&date=2026-11-01&days=3 -> cheapest offer per day."""
+    params = _calendar_params(request)
+    if params is None:
+        return JsonResponse({"error": "missing_parameters"}, status=400)
+    origin, destination, date, adults, days = params
+    return _calendar_response(params, fare_calendar(origin, destination, date, adults=adults, days=days))
+
+
+@with_deadline
+async def fare_calendar_view_async(request):
+    params = _calendar_params(request)
+    if params is None:
+        return JsonResponse({"error": "missing_parameters"}, status=400)
+    origin, destination, date, adults, days = params
+    return _calendar_response(params, await afare_calendar(origin, destination, date, adults=adults, days=days))